@@ -0,0 +1,11 @@
+-- Migration 3 : Anti-rebond des règles (hystérésis, maintien, cooldown)
+-- À appliquer après 002_add_sensors_equipments.sql
+
+BEGIN;
+
+-- Anti-rebond (NULL = désactivé)
+ALTER TABLE automation_rules ADD COLUMN IF NOT EXISTS hysteresis DOUBLE PRECISION;
+ALTER TABLE automation_rules ADD COLUMN IF NOT EXISTS min_hold_seconds INTEGER;
+ALTER TABLE automation_rules ADD COLUMN IF NOT EXISTS cooldown_seconds INTEGER;
+
+COMMIT;
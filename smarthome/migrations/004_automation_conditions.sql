@@ -0,0 +1,23 @@
+-- Migration 4 : Conditions composées ET/OU (automation_conditions)
+-- À appliquer après 003_automation_rule_debounce.sql
+
+BEGIN;
+
+-- Règles : condition simple optionnelle (NULL si arbre de conditions)
+ALTER TABLE automation_rules ALTER COLUMN sensor_id DROP NOT NULL;
+ALTER TABLE automation_rules ALTER COLUMN condition_operator DROP NOT NULL;
+ALTER TABLE automation_rules ALTER COLUMN condition_value DROP NOT NULL;
+
+-- Arbres de conditions ET/OU
+CREATE TABLE IF NOT EXISTS automation_conditions (
+    id SERIAL PRIMARY KEY,
+    rule_id INTEGER NOT NULL REFERENCES automation_rules(id) ON DELETE CASCADE,
+    parent_id INTEGER REFERENCES automation_conditions(id) ON DELETE CASCADE,
+    node_type VARCHAR(10) NOT NULL,
+    sensor_id INTEGER REFERENCES sensors(id),
+    operator VARCHAR(10),
+    value DOUBLE PRECISION,
+    position INTEGER NOT NULL DEFAULT 0
+);
+
+COMMIT;
@@ -0,0 +1,25 @@
+-- Migration 5 : Programmations horaires et temporisées (automation_schedules)
+-- À appliquer après 004_automation_conditions.sql
+
+BEGIN;
+
+-- Déclencheurs horaires ('cron') et temporisés ('delay')
+CREATE TABLE IF NOT EXISTS automation_schedules (
+    id SERIAL PRIMARY KEY,
+    house_id INTEGER NOT NULL REFERENCES houses(id),
+    name VARCHAR(200) NOT NULL,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    trigger_type VARCHAR(10) NOT NULL,
+    cron_expression VARCHAR(100),
+    sensor_id INTEGER REFERENCES sensors(id),
+    condition_operator VARCHAR(10),
+    condition_value DOUBLE PRECISION,
+    delay_seconds INTEGER,
+    equipment_id INTEGER NOT NULL REFERENCES equipments(id),
+    action_state VARCHAR(50) NOT NULL,
+    next_run_at TIMESTAMP,
+    last_run_at TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc')
+);
+
+COMMIT;
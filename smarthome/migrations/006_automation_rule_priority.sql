@@ -0,0 +1,9 @@
+-- Migration 6 : Priorité des règles (conflits sur un équipement)
+-- À appliquer après 005_automation_schedules.sql
+
+BEGIN;
+
+-- Conflit sur un même équipement : la priorité la plus haute l'emporte
+ALTER TABLE automation_rules ADD COLUMN IF NOT EXISTS priority INTEGER NOT NULL DEFAULT 0;
+
+COMMIT;
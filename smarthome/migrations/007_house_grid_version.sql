@@ -0,0 +1,9 @@
+-- Migration 7 : Version des grilles (houses.grid_version)
+-- À appliquer après 006_automation_rule_priority.sql
+
+BEGIN;
+
+-- Incrémentée à chaque modification de la grille (caches, PATCH, snapshots)
+ALTER TABLE houses ADD COLUMN IF NOT EXISTS grid_version INTEGER NOT NULL DEFAULT 1;
+
+COMMIT;
@@ -0,0 +1,19 @@
+-- Migration 8 : Historique des cases occupées (position_visits)
+-- À appliquer après 007_house_grid_version.sql
+
+BEGIN;
+
+-- Séjours des utilisateurs sur les cases (carte d'occupation)
+CREATE TABLE IF NOT EXISTS position_visits (
+    id SERIAL PRIMARY KEY,
+    house_id INTEGER NOT NULL REFERENCES houses(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    entered_at TIMESTAMP NOT NULL,
+    left_at TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_position_visits_house_entered
+    ON position_visits (house_id, entered_at);
+
+COMMIT;
@@ -0,0 +1,23 @@
+-- Migration 9 : Placements des capteurs/équipements sur les cases (cell_placements)
+-- À appliquer après 008_position_visits.sql
+
+BEGIN;
+
+-- Copie indexée des couches sensors/equipments de houses.grid
+-- (remplie ensuite par : python -m smarthome.tornado_app.migrate_grids --placements)
+CREATE TABLE IF NOT EXISTS cell_placements (
+    id SERIAL PRIMARY KEY,
+    house_id INTEGER NOT NULL REFERENCES houses(id) ON DELETE CASCADE,
+    row INTEGER NOT NULL,
+    col INTEGER NOT NULL,
+    sensor_id INTEGER REFERENCES sensors(id) ON DELETE CASCADE,
+    equipment_id INTEGER REFERENCES equipments(id) ON DELETE CASCADE,
+    CONSTRAINT ck_cell_placements_target
+        CHECK ((sensor_id IS NULL) <> (equipment_id IS NULL))
+);
+CREATE INDEX IF NOT EXISTS ix_cell_placements_house_cell
+    ON cell_placements (house_id, row, col);
+CREATE INDEX IF NOT EXISTS ix_cell_placements_sensor ON cell_placements (sensor_id);
+CREATE INDEX IF NOT EXISTS ix_cell_placements_equipment ON cell_placements (equipment_id);
+
+COMMIT;
@@ -0,0 +1,9 @@
+-- Migration 10 : Index du dernier événement par maison (snapshots)
+-- À appliquer après 009_cell_placements.sql
+
+BEGIN;
+
+-- Dernier événement d'une maison (snapshots, rattrapage)
+CREATE INDEX IF NOT EXISTS ix_event_history_house_id ON event_history (house_id, id);
+
+COMMIT;
@@ -1,7 +1,9 @@
+import asyncio
 import os
+import signal
 import tornado.ioloop
 import tornado.web
-from .config import get_settings
+from .config import get_automation_workers, get_settings
 from .handlers.sensors import (
     SensorsListHandler,
     SensorDetailHandler,
@@ -17,12 +19,18 @@ from .handlers.equipments import (
 )
 from .handlers.automation import (
     AutomationRulesHandler,
+    AutomationMetricsHandler,
     PresenceHandler,
     SensorToEquipmentStatusHandler,
 )
 from .handlers.automation_rules import (
     AutomationRulesListHandler,
     AutomationRuleDetailHandler,
+    AutomationRuleBacktestHandler,
+)
+from .handlers.automation_schedules import (
+    AutomationSchedulesListHandler,
+    AutomationScheduleDetailHandler,
 )
 from .handlers.users_api import (
     RegisterAPIHandler,
@@ -33,13 +41,17 @@ from .handlers.users_api import (
     UploadProfileImageHandler,
 )
 from .handlers.auth_jwt_api import LoginJWTHandler, RegisterJWTHandler
+from .handlers.batch import BatchHandler
 from .handlers.houses_api import (
     HousesAPIHandler,
     HouseDetailAPIHandler,
+    HouseGridAPIHandler,
     RoomsAPIHandler,
     RoomDetailAPIHandler,
 )
 from .handlers.grid_editor import EditHouseInsideHandler
+from .handlers.grid_tiles import GridTileHandler
+from .handlers.house_snapshot import HouseSnapshotHandler
 from .handlers.websocket import RealtimeHandler
 from .handlers.house_members import (
     HouseMembersHandler,
@@ -57,7 +69,12 @@ from .handlers.event_history import (
     EventCleanupHandler,
 )
 from .handlers.user_positions import UserPositionHandler
+from .handlers.simulation import OccupantSimulationHandler
+from .handlers.occupancy import OccupancyHeatmapHandler
 from .handlers.weather import WeatherHandler, ValidateAddressHandler
+from .services.scheduler import AutomationScheduler
+from .services.automation_workers import AutomationWorkerPool
+from .services.live_positions import LivePositions
 
 
 class RedirectHandler(tornado.web.RequestHandler):
@@ -119,6 +136,8 @@ def make_app():
             (r"/houses/edit_inside/([0-9]+)", EditHouseInsideHandler),
             # WebSocket pour les mises à jour en temps réel
             (r"/ws/realtime", RealtimeHandler),
+            # API REST - Plusieurs appels en une requête
+            (r"/api/batch", BatchHandler),
             # API REST - Capteurs
             (r"/api/sensors", SensorsListHandler),
             (r"/api/sensors/([0-9]+)", SensorDetailHandler),
@@ -133,8 +152,18 @@ def make_app():
             (r"/api/sono", SoundSystemHandler),
             # API REST - Automatisation B2B
             (r"/api/automation/trigger", AutomationRulesHandler),
+            (r"/api/automation/metrics", AutomationMetricsHandler),
             (r"/api/automation/rules", AutomationRulesListHandler),
             (r"/api/automation/rules/([0-9]+)", AutomationRuleDetailHandler),
+            (
+                r"/api/automation/rules/([0-9]+)/backtest",
+                AutomationRuleBacktestHandler,
+            ),
+            (r"/api/automation/schedules", AutomationSchedulesListHandler),
+            (
+                r"/api/automation/schedules/([0-9]+)",
+                AutomationScheduleDetailHandler,
+            ),
             (r"/api/presence", PresenceHandler),
             (r"/api/status", SensorToEquipmentStatusHandler),
             # API REST - Authentification et utilisateurs
@@ -152,6 +181,9 @@ def make_app():
             # API REST - Maisons et pièces
             (r"/api/houses", HousesAPIHandler),
             (r"/api/houses/([0-9]+)", HouseDetailAPIHandler),
+            (r"/api/houses/([0-9]+)/grid", HouseGridAPIHandler),
+            (r"/api/houses/([0-9]+)/grid/tiles", GridTileHandler),
+            (r"/api/houses/([0-9]+)/snapshot", HouseSnapshotHandler),
             (r"/api/houses/([0-9]+)/rooms", RoomsAPIHandler),
             (r"/api/rooms/([0-9]+)", RoomDetailAPIHandler),
             # API REST - Membres de maison
@@ -169,6 +201,8 @@ def make_app():
             (r"/api/event-types", EventTypesHandler),
             # API REST - Positions des utilisateurs
             (r"/api/houses/([0-9]+)/positions", UserPositionHandler),
+            (r"/api/houses/([0-9]+)/simulation", OccupantSimulationHandler),
+            (r"/api/houses/([0-9]+)/occupancy-heatmap", OccupancyHeatmapHandler),
             # API REST - Météo
             (r"/api/weather/([0-9]+)", WeatherHandler),
             (r"/api/weather/validate-address", ValidateAddressHandler),
@@ -220,8 +254,35 @@ def main():
         print("   Your IP is likely: 10.192.138.9")
         print("=" * 60)
 
+    # Charger les programmations (cron / temporisations) persistées
+    tornado.ioloop.IOLoop.current().add_callback(AutomationScheduler.start)
+
+    # Évaluation des règles dans des processus séparés (optionnel)
+    workers = get_automation_workers()
+    if workers > 0:
+        tornado.ioloop.IOLoop.current().add_callback(
+            AutomationWorkerPool.start, workers
+        )
+
+    # Écrire les positions en mémoire avant l'arrêt
+    loop = tornado.ioloop.IOLoop.current().asyncio_loop
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, lambda: asyncio.ensure_future(shutdown()))
+
     tornado.ioloop.IOLoop.current().start()
 
 
+async def shutdown():
+    """Arrêt propre: persister les positions, arrêter les workers puis l'IOLoop."""
+    print("🛑 Arrêt du serveur...")
+    await LivePositions.flush_all()
+    if AutomationWorkerPool.enabled():
+        # join() bloquant: hors de l'IOLoop
+        await asyncio.get_running_loop().run_in_executor(
+            None, AutomationWorkerPool.stop
+        )
+    tornado.ioloop.IOLoop.current().stop()
+
+
 if __name__ == "__main__":
     main()
@@ -35,3 +35,22 @@ def get_database_url():
     host = os.getenv("DB_HOST", "localhost")
     port = os.getenv("DB_PORT", "5432")
     return f"postgresql+asyncpg://{user}:{password}@{host}:{port}/{name}"
+
+
+def get_admin_user_ids():
+    # Comptes autorisés sur les endpoints d'administration (ex: "1,4")
+    raw = os.getenv("ADMIN_USER_IDS", "")
+    return {int(v) for v in raw.split(",") if v.strip().isdigit()}
+
+
+def get_grid_strict_layers():
+    # Toutes les grilles sont au format en couches (après migrate_grids)
+    return os.getenv("GRID_STRICT_LAYERS", "False").lower() == "true"
+
+
+def get_automation_workers():
+    # Processus workers d'automatisation (0: évaluation dans le processus web)
+    try:
+        return max(0, int(os.getenv("AUTOMATION_WORKERS", "0")))
+    except ValueError:
+        return 0
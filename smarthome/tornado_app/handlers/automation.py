@@ -4,9 +4,11 @@ Automation logic based on sensor data.
 """
 
 from sqlalchemy import select
-from ..models import Sensor, Equipment, EventHistory
+from ..models import AutomationRule, Sensor, Equipment
 from ..database import async_session_maker
-from datetime import datetime
+from ..config import get_admin_user_ids
+from ..services.automation_engine import AutomationEngine
+from ..services.automation_metrics import AutomationMetrics, SORT_KEYS
 from .base import BaseAPIHandler
 
 
@@ -24,105 +26,10 @@ class AutomationRulesHandler(BaseAPIHandler):
         - Execute equipment actions
         - Log to event history
         """
-        actions_taken = []
-
         # DATABASE QUERY: Opération sur la base de données
         async with async_session_maker() as session:
-            from ..models import AutomationRule
-
-            # Fetch all active automation rules
-            result = await session.execute(
-                select(AutomationRule).where(AutomationRule.is_active == True)  # noqa
-            )
-            rules = result.scalars().all()
-
-            for rule in rules:
-                # Get the sensor for this rule
-                sensor = await session.get(Sensor, rule.sensor_id)
-                if not sensor or not sensor.is_active or sensor.value is None:
-                    continue
-
-                # Evaluate condition
-                condition_met = False
-                if rule.condition_operator == ">":
-                    condition_met = sensor.value > rule.condition_value
-                elif rule.condition_operator == "<":
-                    condition_met = sensor.value < rule.condition_value
-                elif rule.condition_operator == ">=":
-                    condition_met = sensor.value >= rule.condition_value
-                elif rule.condition_operator == "<=":
-                    condition_met = sensor.value <= rule.condition_value
-                elif rule.condition_operator == "==":
-                    condition_met = sensor.value == rule.condition_value
-                elif rule.condition_operator == "!=":
-                    condition_met = sensor.value != rule.condition_value
-
-                # Execute action if condition is met
-                if condition_met:
-                    equipment = await session.get(Equipment, rule.equipment_id)
-                    if equipment and equipment.is_active:
-                        if equipment.state != rule.action_state:
-                            old_state = equipment.state
-                            equipment.state = rule.action_state
-                            equipment.last_update = datetime.utcnow()
-                            rule.last_triggered = datetime.utcnow()
-
-                            # Log to event history
-                            event = EventHistory(
-                                house_id=equipment.house_id,
-                                user_id=None,  # Automatic action
-                                event_type="automation_triggered",
-                                entity_type="automation_rule",
-                                entity_id=rule.id,
-                                description=(
-                                    f"Rule '{rule.name}' triggered: "
-                                    f"{equipment.name} {old_state} → "
-                                    f"{rule.action_state}"
-                                ),
-                                event_metadata={
-                                    "rule_name": rule.name,
-                                    "sensor_id": sensor.id,
-                                    "sensor_name": sensor.name,
-                                    "sensor_value": sensor.value,
-                                    "condition": (
-                                        f"{rule.condition_operator} "
-                                        f"{rule.condition_value}"
-                                    ),
-                                    "equipment_id": equipment.id,
-                                    "equipment_name": equipment.name,
-                                    "old_state": old_state,
-                                    "new_state": rule.action_state,
-                                },
-                            )
-                            session.add(event)
-
-                            actions_taken.append(
-                                {
-                                    "action": f"set_{rule.action_state}",
-                                    "equipment_id": equipment.id,
-                                    "equipment_name": equipment.name,
-                                    "reason": (
-                                        f"Rule: {rule.name} "
-                                        f"({sensor.name} {sensor.value} "
-                                        f"{rule.condition_operator} "
-                                        f"{rule.condition_value})"
-                                    ),
-                                    "rule_id": rule.id,
-                                    "rule_name": rule.name,
-                                }
-                            )
-
-                            # Broadcast equipment update via WebSocket
-                            from .websocket import RealtimeHandler
-
-                            # WEBSOCKET BROADCAST: Diffusion temps réel aux clients WebSocket
-                            RealtimeHandler.broadcast_equipment_update(
-                                equipment.id,
-                                equipment.type,
-                                equipment.state,
-                                equipment.is_active,
-                                equipment.house_id,
-                            )
+            # Hystérésis, maintien et cooldown gérés par le moteur
+            actions_taken = await AutomationEngine.evaluate_all(session)
 
             # Commit all changes
             await session.commit()
@@ -136,6 +43,54 @@ class AutomationRulesHandler(BaseAPIHandler):
         )
 
 
+class AutomationMetricsHandler(BaseAPIHandler):
+    """
+    GET /api/automation/metrics?top=10&sort=time|evaluations|triggers
+    Métriques du moteur (administrateurs uniquement).
+    ?format=prometheus renvoie l'exposition texte Prometheus.
+    """
+
+    async def get(self):
+        """Règles les plus coûteuses, files par maison, latence"""
+        user = self.get_current_user()
+        if user["id"] not in get_admin_user_ids():
+            self.write_error_json("Accès réservé aux administrateurs", 403)
+            return
+
+        if self.get_argument("format", None) == "prometheus":
+            self.set_header("Content-Type", "text/plain; version=0.0.4")
+            self.write(AutomationMetrics.prometheus())
+            return
+
+        sort = self.get_argument("sort", "time")
+        if sort not in SORT_KEYS:
+            self.write_error_json(f"sort doit être l'un de: {list(SORT_KEYS)}", 400)
+            return
+        try:
+            top = max(1, min(int(self.get_argument("top", "10")), 100))
+        except ValueError:
+            self.write_error_json("top doit être un entier", 400)
+            return
+
+        metrics = AutomationMetrics.snapshot(top, sort)
+        rule_ids = [r["rule_id"] for r in metrics["hottest_rules"]]
+        if rule_ids:
+            # DATABASE QUERY: Opération sur la base de données
+            async with async_session_maker() as session:
+                result = await session.execute(
+                    select(
+                        AutomationRule.id, AutomationRule.name, AutomationRule.house_id
+                    ).where(AutomationRule.id.in_(rule_ids))
+                )
+                names = {row.id: row for row in result.all()}
+            for entry in metrics["hottest_rules"]:
+                row = names.get(entry["rule_id"])
+                entry["rule_name"] = row.name if row else None
+                entry["house_id"] = row.house_id if row else None
+
+        self.write_json(metrics)
+
+
 class PresenceHandler(BaseAPIHandler):
     """GET /api/presence - État de tous les capteurs de présence"""
 
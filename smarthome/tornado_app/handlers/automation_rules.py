@@ -3,16 +3,179 @@ API handlers for automation rules.
 """
 
 import json
-from sqlalchemy import select
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, and_
 from sqlalchemy.orm import selectinload
-from ..models import AutomationRule, Sensor, Equipment
+from ..models import (
+    AutomationCondition,
+    AutomationRule,
+    Equipment,
+    EventHistory,
+    Sensor,
+)
 from ..database import async_session_maker
+from ..services.automation_engine import AutomationEngine
+from ..services.backtest import backtest_rule, rule_sensor_ids
+from ..services.condition_network import (
+    build_condition_rows,
+    rows_to_tree,
+    tree_sensor_ids,
+    validate_condition_tree,
+)
+from ..utils.pagination import page_items, paginate
+from ..utils.projection import Field, Projection, no_value
 from .base import BaseAPIHandler
 
+# Paramètres anti-rebond optionnels: champ -> type
+DEBOUNCE_FIELDS = {
+    "hysteresis": float,
+    "min_hold_seconds": int,
+    "cooldown_seconds": int,
+}
+
+
+def parse_debounce_fields(data):
+    """
+    Extraire et valider les paramètres anti-rebond présents dans `data`.
+
+    Returns:
+        dict champ -> valeur (None pour désactiver)
+
+    Raises:
+        ValueError: si une valeur est négative ou non numérique
+    """
+    values = {}
+    for field, cast in DEBOUNCE_FIELDS.items():
+        if field not in data:
+            continue
+        raw = data[field]
+        if raw is None or raw == "":
+            values[field] = None
+            continue
+        try:
+            value = cast(raw)
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} doit être numérique")
+        if value < 0:
+            raise ValueError(f"{field} doit être positif")
+        values[field] = value
+    return values
+
+
+def parse_priority(raw) -> int:
+    """
+    Priorité d'une règle (0 par défaut, la plus haute l'emporte).
+
+    Raises:
+        ValueError: si la valeur n'est pas un entier
+    """
+    if raw is None or raw == "":
+        return 0
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        raise ValueError("priority doit être un entier")
+
+
+async def check_condition_sensors(session, tree, house_id):
+    """Vérifier que tous les capteurs de l'arbre existent dans la maison."""
+    sensor_ids = tree_sensor_ids(tree)
+    result = await session.execute(
+        select(Sensor.id).where(
+            Sensor.id.in_(sensor_ids), Sensor.house_id == house_id
+        )
+    )
+    return set(result.scalars().all()) == sensor_ids
+
+
+def automation_event(handler, house_id, entity_type, entity_id, action, description):
+    """
+    Événement 'automation_modified' (création, modification, suppression
+    d'une règle ou d'une programmation). Il fait aussi avancer la version
+    des snapshots de la maison (rattrapage des clients).
+    """
+    return EventHistory(
+        house_id=house_id,
+        user_id=handler.get_current_user()["id"],
+        event_type="automation_modified",
+        entity_type=entity_type,
+        entity_id=entity_id,
+        description=description,
+        event_metadata={"action": action},
+        ip_address=handler.request.remote_ip,
+    )
+
+
+def _reference(item_id, name, item_type):
+    """Capteur ou équipement lié à une règle (jointure externe)."""
+    if item_id is None:
+        return None
+    return {"id": item_id, "name": name, "type": item_type}
+
+
+# Champs de GET /api/automation/rules (?fields=)
+RULE_FIELDS = Projection(
+    AutomationRule,
+    {
+        "id": Field(AutomationRule.id),
+        "name": Field(AutomationRule.name),
+        "description": Field(AutomationRule.description),
+        "is_active": Field(AutomationRule.is_active),
+        "sensor": Field(
+            Sensor.id,
+            Sensor.name,
+            Sensor.type,
+            build=_reference,
+            joins=((Sensor, Sensor.id == AutomationRule.sensor_id),),
+        ),
+        "condition_operator": Field(AutomationRule.condition_operator),
+        "condition_value": Field(AutomationRule.condition_value),
+        # Rempli après coup (une requête pour toutes les règles)
+        "conditions": Field(build=no_value),
+        "equipment": Field(
+            Equipment.id,
+            Equipment.name,
+            Equipment.type,
+            build=_reference,
+            joins=((Equipment, Equipment.id == AutomationRule.equipment_id),),
+        ),
+        "action_state": Field(AutomationRule.action_state),
+        "hysteresis": Field(AutomationRule.hysteresis),
+        "min_hold_seconds": Field(AutomationRule.min_hold_seconds),
+        "cooldown_seconds": Field(AutomationRule.cooldown_seconds),
+        "priority": Field(AutomationRule.priority),
+        "created_at": Field(AutomationRule.created_at),
+        "last_triggered": Field(AutomationRule.last_triggered),
+    },
+)
+
+
+async def attach_conditions(session, rules):
+    """Remplir "conditions" des règles sérialisées (une requête pour toutes)."""
+    if not rules:
+        return
+    result = await session.execute(
+        select(
+            AutomationCondition.id,
+            AutomationCondition.rule_id,
+            AutomationCondition.parent_id,
+            AutomationCondition.node_type,
+            AutomationCondition.sensor_id,
+            AutomationCondition.operator,
+            AutomationCondition.value,
+            AutomationCondition.position,
+        ).where(AutomationCondition.rule_id.in_([r["id"] for r in rules]))
+    )
+    by_rule = {}
+    for row in result.all():
+        by_rule.setdefault(row.rule_id, []).append(row)
+    for rule in rules:
+        rule["conditions"] = rows_to_tree(by_rule.get(rule["id"]))
+
 
 class AutomationRulesListHandler(BaseAPIHandler):
     """
-    GET /api/automation/rules?house_id=X - List rules
+    GET /api/automation/rules?house_id=X - List rules (?fields=, ?cursor=&limit=)
     POST /api/automation/rules - Create a rule
     """
 
@@ -24,54 +187,33 @@ class AutomationRulesListHandler(BaseAPIHandler):
             self.write_error_json("house_id requis", 400)
             return
 
+        fields = self.requested_fields(RULE_FIELDS.names, RULE_FIELDS.default)
+        if fields is None:
+            return
+        page = self.page_params()
+        if page is None:
+            return
+        after, limit = page
+
         # DATABASE QUERY: Opération sur la base de données
         async with async_session_maker() as session:
+            projected = RULE_FIELDS.query(fields)
             result = await session.execute(
-                select(AutomationRule)
-                .options(
-                    selectinload(AutomationRule.sensor),
-                    selectinload(AutomationRule.equipment),
+                paginate(
+                    projected.statement.where(
+                        AutomationRule.house_id == int(house_id)
+                    ),
+                    AutomationRule.id,
+                    after,
+                    limit,
                 )
-                .where(AutomationRule.house_id == int(house_id))
             )
-            rules = result.scalars().all()
+            rules, next_cursor = page_items(projected.to_json(result.all()), limit)
 
-            self.write_json(
-                {
-                    "rules": [
-                        {
-                            "id": r.id,
-                            "name": r.name,
-                            "description": r.description,
-                            "is_active": r.is_active,
-                            "sensor": (
-                                {
-                                    "id": r.sensor.id,
-                                    "name": r.sensor.name,
-                                    "type": r.sensor.type,
-                                }
-                                if r.sensor
-                                else None
-                            ),
-                            "condition_operator": r.condition_operator,
-                            "condition_value": r.condition_value,
-                            "equipment": (
-                                {
-                                    "id": r.equipment.id,
-                                    "name": r.equipment.name,
-                                    "type": r.equipment.type,
-                                }
-                                if r.equipment
-                                else None
-                            ),
-                            "action_state": r.action_state,
-                            "created_at": r.created_at,
-                            "last_triggered": r.last_triggered,
-                        }
-                        for r in rules
-                    ]
-                }
-            )
+            if "conditions" in fields:
+                await attach_conditions(session, rules)
+
+            self.write_json({"rules": rules, "next_cursor": next_cursor})
 
     async def post(self):
         """Create a new automation rule."""
@@ -81,56 +223,89 @@ class AutomationRulesListHandler(BaseAPIHandler):
             self.write_error_json("Invalid JSON", 400)
             return
 
-        required = [
-            "house_id",
-            "name",
-            "sensor_id",
-            "condition_operator",
-            "condition_value",
-            "equipment_id",
-            "action_state",
-        ]
+        required = ["house_id", "name", "equipment_id", "action_state"]
+        # Condition simple, sauf si un arbre de conditions est fourni
+        conditions = data.get("conditions")
+        if conditions is None:
+            required += ["sensor_id", "condition_operator", "condition_value"]
 
         for field in required:
             if field not in data:
                 self.write_error_json(f"Champ requis: {field}", 400)
                 return
 
+        try:
+            debounce = parse_debounce_fields(data)
+            priority = parse_priority(data.get("priority"))
+            if conditions is not None:
+                validate_condition_tree(conditions)
+        except ValueError as e:
+            self.write_error_json(str(e), 400)
+            return
+
         # DATABASE QUERY: Opération sur la base de données
         async with async_session_maker() as session:
             try:
                 # Convertir les IDs en entiers
                 house_id = int(data["house_id"])
-                sensor_id = int(data["sensor_id"])
                 equipment_id = int(data["equipment_id"])
 
                 # Check that le capteur et l'équipement existent
-                sensor = await session.get(Sensor, sensor_id)
                 equipment = await session.get(Equipment, equipment_id)
-
-                if not sensor:
-                    self.write_error_json("Capteur introuvable", 404)
-                    return
-
                 if not equipment:
                     self.write_error_json("Équipement introuvable", 404)
                     return
 
-                rule = AutomationRule(
-                    house_id=house_id,
-                    name=data["name"],
-                    description=data.get("description"),
-                    sensor_id=sensor_id,
-                    condition_operator=data["condition_operator"],
-                    condition_value=float(data["condition_value"]),
-                    equipment_id=equipment_id,
-                    action_state=data["action_state"],
-                    is_active=data.get("is_active", True),
-                )
+                if conditions is not None:
+                    if not await check_condition_sensors(session, conditions, house_id):
+                        self.write_error_json("Capteur introuvable", 404)
+                        return
+                    rule = AutomationRule(
+                        house_id=house_id,
+                        name=data["name"],
+                        description=data.get("description"),
+                        equipment_id=equipment_id,
+                        action_state=data["action_state"],
+                        is_active=data.get("is_active", True),
+                        conditions=build_condition_rows(conditions),
+                        priority=priority,
+                        **debounce,
+                    )
+                else:
+                    sensor_id = int(data["sensor_id"])
+                    sensor = await session.get(Sensor, sensor_id)
+                    if not sensor:
+                        self.write_error_json("Capteur introuvable", 404)
+                        return
+                    rule = AutomationRule(
+                        house_id=house_id,
+                        name=data["name"],
+                        description=data.get("description"),
+                        sensor_id=sensor_id,
+                        condition_operator=data["condition_operator"],
+                        condition_value=float(data["condition_value"]),
+                        equipment_id=equipment_id,
+                        action_state=data["action_state"],
+                        is_active=data.get("is_active", True),
+                        priority=priority,
+                        **debounce,
+                    )
 
                 session.add(rule)
+                await session.flush()
+                session.add(
+                    automation_event(
+                        self,
+                        rule.house_id,
+                        "automation_rule",
+                        rule.id,
+                        "create",
+                        f"Règle créée: {rule.name}",
+                    )
+                )
                 await session.commit()
                 await session.refresh(rule)
+                AutomationEngine.reset_rule(rule.id, rule.house_id)
 
                 # Broadcast via WebSocket
                 from .websocket import RealtimeHandler
@@ -169,6 +344,7 @@ class AutomationRuleDetailHandler(BaseAPIHandler):
                 .options(
                     selectinload(AutomationRule.sensor),
                     selectinload(AutomationRule.equipment),
+                    selectinload(AutomationRule.conditions),
                 )
                 .where(AutomationRule.id == int(rule_id))
             )
@@ -184,19 +360,28 @@ class AutomationRuleDetailHandler(BaseAPIHandler):
                     "name": rule.name,
                     "description": rule.description,
                     "is_active": rule.is_active,
-                    "sensor": {
-                        "id": rule.sensor.id,
-                        "name": rule.sensor.name,
-                        "type": rule.sensor.type,
-                    },
+                    "sensor": (
+                        {
+                            "id": rule.sensor.id,
+                            "name": rule.sensor.name,
+                            "type": rule.sensor.type,
+                        }
+                        if rule.sensor
+                        else None
+                    ),
                     "condition_operator": rule.condition_operator,
                     "condition_value": rule.condition_value,
+                    "conditions": rows_to_tree(rule.conditions),
                     "equipment": {
                         "id": rule.equipment.id,
                         "name": rule.equipment.name,
                         "type": rule.equipment.type,
                     },
                     "action_state": rule.action_state,
+                    "hysteresis": rule.hysteresis,
+                    "min_hold_seconds": rule.min_hold_seconds,
+                    "cooldown_seconds": rule.cooldown_seconds,
+                    "priority": rule.priority,
                     "created_at": rule.created_at,
                     "last_triggered": rule.last_triggered,
                 }
@@ -210,9 +395,25 @@ class AutomationRuleDetailHandler(BaseAPIHandler):
             self.write_error_json("Invalid JSON", 400)
             return
 
+        conditions = data.get("conditions")
+        try:
+            debounce = parse_debounce_fields(data)
+            if "priority" in data:
+                priority = parse_priority(data["priority"])
+            if conditions is not None:
+                validate_condition_tree(conditions)
+        except ValueError as e:
+            self.write_error_json(str(e), 400)
+            return
+
         # DATABASE QUERY: Opération sur la base de données
         async with async_session_maker() as session:
-            rule = await session.get(AutomationRule, int(rule_id))
+            result = await session.execute(
+                select(AutomationRule)
+                .options(selectinload(AutomationRule.conditions))
+                .where(AutomationRule.id == int(rule_id))
+            )
+            rule = result.scalar_one_or_none()
 
             if not rule:
                 self.write_error_json("Règle introuvable", 404)
@@ -225,11 +426,27 @@ class AutomationRuleDetailHandler(BaseAPIHandler):
                 rule.description = data["description"]
             if "is_active" in data:
                 rule.is_active = data["is_active"]
-            if "sensor_id" in data:
+            if conditions is not None:
+                # Remplacer l'arbre: la règle devient composée
+                if not await check_condition_sensors(session, conditions, rule.house_id):
+                    self.write_error_json("Capteur introuvable", 404)
+                    return
+                rule.conditions = build_condition_rows(conditions)
+                rule.sensor_id = None
+                rule.condition_operator = None
+                rule.condition_value = None
+            elif "sensor_id" in data:
+                if rule.sensor_id is None:
+                    # Règle composée qui redevient simple: condition complète
+                    for field in ("condition_operator", "condition_value"):
+                        if data.get(field) is None:
+                            self.write_error_json(f"Champ requis: {field}", 400)
+                            return
                 # Check that le capteur existe
                 sensor = await session.get(Sensor, int(data["sensor_id"]))
                 if sensor:
                     rule.sensor_id = int(data["sensor_id"])
+                    rule.conditions = []
             if "condition_operator" in data:
                 rule.condition_operator = data["condition_operator"]
             if "condition_value" in data:
@@ -241,8 +458,23 @@ class AutomationRuleDetailHandler(BaseAPIHandler):
                     rule.equipment_id = int(data["equipment_id"])
             if "action_state" in data:
                 rule.action_state = data["action_state"]
-
+            if "priority" in data:
+                rule.priority = priority
+            for field, value in debounce.items():
+                setattr(rule, field, value)
+
+            session.add(
+                automation_event(
+                    self,
+                    rule.house_id,
+                    "automation_rule",
+                    rule.id,
+                    "update",
+                    f"Règle modifiée: {rule.name}",
+                )
+            )
             await session.commit()
+            AutomationEngine.reset_rule(rule.id, rule.house_id)
 
             # Broadcast via WebSocket
             from .websocket import RealtimeHandler
@@ -267,8 +499,19 @@ class AutomationRuleDetailHandler(BaseAPIHandler):
             rule_id = rule.id
             house_id = rule.house_id
 
+            session.add(
+                automation_event(
+                    self,
+                    house_id,
+                    "automation_rule",
+                    rule_id,
+                    "delete",
+                    f"Règle supprimée: {rule.name}",
+                )
+            )
             await session.delete(rule)
             await session.commit()
+            AutomationEngine.reset_rule(rule_id, house_id)
 
             # Broadcast via WebSocket
             from .websocket import RealtimeHandler
@@ -279,3 +522,84 @@ class AutomationRuleDetailHandler(BaseAPIHandler):
             )
 
             self.write_json({"message": "Rule deleted"})
+
+
+class AutomationRuleBacktestHandler(BaseAPIHandler):
+    """
+    POST /api/automation/rules/{id}/backtest?from=&to= - Simuler une règle
+    sur l'historique des capteurs (sans effet de bord)
+    """
+
+    DEFAULT_DAYS = 7
+
+    async def post(self, rule_id):
+        """Rejouer les relevés de la période dans le moteur d'automatisation."""
+        current_user = self.get_current_user()
+        if not current_user:
+            return self.write_error_json("Not authenticated", 401)
+
+        try:
+            end = self._parse_date(self.get_argument("to", None)) or datetime.utcnow()
+            start = self._parse_date(self.get_argument("from", None)) or (
+                end - timedelta(days=self.DEFAULT_DAYS)
+            )
+        except ValueError:
+            return self.write_error_json("from/to doivent être au format ISO 8601", 400)
+        if start >= end:
+            return self.write_error_json("from doit précéder to", 400)
+
+        # DATABASE QUERY: Opération sur la base de données
+        async with async_session_maker() as session:
+            from ..utils.permissions import can_view_house
+
+            result = await session.execute(
+                select(AutomationRule)
+                .options(
+                    selectinload(AutomationRule.conditions),
+                    selectinload(AutomationRule.equipment),
+                )
+                .where(AutomationRule.id == int(rule_id))
+            )
+            rule = result.scalar_one_or_none()
+
+            if not rule:
+                return self.write_error_json("Règle introuvable", 404)
+
+            if not await can_view_house(session, current_user["id"], rule.house_id):
+                return self.write_error_json("Access denied", 403)
+
+            # Règles actives qui pilotent le même équipement à partir des
+            # mêmes capteurs: elles font évoluer l'état simulé
+            result = await session.execute(
+                select(AutomationRule)
+                .options(selectinload(AutomationRule.conditions))
+                .where(
+                    and_(
+                        AutomationRule.equipment_id == rule.equipment_id,
+                        AutomationRule.id != rule.id,
+                        AutomationRule.is_active == True,  # noqa: E712
+                    )
+                )
+            )
+            sensor_ids = rule_sensor_ids(rule)
+            companions = [
+                r for r in result.scalars().all() if rule_sensor_ids(r) <= sensor_ids
+            ]
+
+            initial_state = self.get_argument("initial_state", None)
+            if initial_state is None and rule.equipment:
+                initial_state = rule.equipment.state
+
+            report = await backtest_rule(
+                session, rule, companions, start, end, initial_state
+            )
+            self.write_json(report)
+
+    @staticmethod
+    def _parse_date(value):
+        if not value:
+            return None
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
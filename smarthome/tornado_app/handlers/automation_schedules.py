@@ -0,0 +1,268 @@
+"""
+API handlers for scheduled automations (cron and delay triggers).
+"""
+
+import json
+from sqlalchemy import select
+from ..models import AutomationSchedule, Sensor, Equipment
+from ..database import async_session_maker
+from ..services.condition_network import OPERATORS
+from ..services.scheduler import AutomationScheduler, CronExpression
+from .automation_rules import automation_event
+from .base import BaseAPIHandler
+
+TRIGGER_TYPES = ("cron", "delay")
+
+
+def validate_schedule(data):
+    """
+    Valider les champs de déclenchement d'une programmation.
+
+    Raises:
+        ValueError: si la configuration est incomplète ou invalide
+    """
+    trigger_type = data.get("trigger_type")
+    if trigger_type not in TRIGGER_TYPES:
+        raise ValueError(f"trigger_type doit être l'un de: {TRIGGER_TYPES}")
+
+    if trigger_type == "cron":
+        if not data.get("cron_expression"):
+            raise ValueError("Champ requis: cron_expression")
+        CronExpression(data["cron_expression"])
+        return
+
+    for field in ("sensor_id", "condition_operator", "condition_value", "delay_seconds"):
+        if data.get(field) is None:
+            raise ValueError(f"Champ requis: {field}")
+    if data["condition_operator"] not in OPERATORS:
+        raise ValueError(f"Opérateur invalide: {data['condition_operator']}")
+    try:
+        float(data["condition_value"])
+    except (TypeError, ValueError):
+        raise ValueError("condition_value doit être un nombre") from None
+    try:
+        int(data["sensor_id"])
+    except (TypeError, ValueError):
+        raise ValueError("sensor_id doit être un entier") from None
+    if int(data["delay_seconds"]) < 0:
+        raise ValueError("delay_seconds doit être positif")
+
+
+def schedule_to_dict(schedule):
+    return {
+        "id": schedule.id,
+        "house_id": schedule.house_id,
+        "name": schedule.name,
+        "is_active": schedule.is_active,
+        "trigger_type": schedule.trigger_type,
+        "cron_expression": schedule.cron_expression,
+        "sensor_id": schedule.sensor_id,
+        "condition_operator": schedule.condition_operator,
+        "condition_value": schedule.condition_value,
+        "delay_seconds": schedule.delay_seconds,
+        "equipment_id": schedule.equipment_id,
+        "action_state": schedule.action_state,
+        "next_run_at": schedule.next_run_at,
+        "last_run_at": schedule.last_run_at,
+        "created_at": schedule.created_at,
+    }
+
+
+class AutomationSchedulesListHandler(BaseAPIHandler):
+    """
+    GET /api/automation/schedules?house_id=X - List schedules
+    POST /api/automation/schedules - Create a schedule
+    """
+
+    async def get(self):
+        """List all schedules for a house."""
+        house_id = self.get_argument("house_id", None)
+
+        if not house_id:
+            self.write_error_json("house_id requis", 400)
+            return
+
+        # DATABASE QUERY: Opération sur la base de données
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(AutomationSchedule).where(
+                    AutomationSchedule.house_id == int(house_id)
+                )
+            )
+            schedules = result.scalars().all()
+
+            self.write_json({"schedules": [schedule_to_dict(s) for s in schedules]})
+
+    async def post(self):
+        """Create a new schedule."""
+        try:
+            data = json.loads(self.request.body)
+        except json.JSONDecodeError:
+            self.write_error_json("Invalid JSON", 400)
+            return
+
+        for field in ("house_id", "name", "equipment_id", "action_state"):
+            if field not in data:
+                self.write_error_json(f"Champ requis: {field}", 400)
+                return
+
+        try:
+            validate_schedule(data)
+        except (TypeError, ValueError) as e:
+            self.write_error_json(str(e), 400)
+            return
+
+        # DATABASE QUERY: Opération sur la base de données
+        async with async_session_maker() as session:
+            equipment = await session.get(Equipment, int(data["equipment_id"]))
+            if not equipment:
+                self.write_error_json("Équipement introuvable", 404)
+                return
+
+            is_delay = data["trigger_type"] == "delay"
+            if is_delay and not await session.get(Sensor, int(data["sensor_id"])):
+                self.write_error_json("Capteur introuvable", 404)
+                return
+
+            schedule = AutomationSchedule(
+                house_id=int(data["house_id"]),
+                name=data["name"],
+                is_active=data.get("is_active", True),
+                trigger_type=data["trigger_type"],
+                cron_expression=None if is_delay else data["cron_expression"],
+                sensor_id=int(data["sensor_id"]) if is_delay else None,
+                condition_operator=data["condition_operator"] if is_delay else None,
+                condition_value=float(data["condition_value"]) if is_delay else None,
+                delay_seconds=int(data["delay_seconds"]) if is_delay else None,
+                equipment_id=int(data["equipment_id"]),
+                action_state=data["action_state"],
+            )
+            session.add(schedule)
+            await session.flush()
+            session.add(
+                automation_event(
+                    self,
+                    schedule.house_id,
+                    "automation_schedule",
+                    schedule.id,
+                    "create",
+                    f"Programmation créée: {schedule.name}",
+                )
+            )
+
+            AutomationScheduler.register(schedule)
+            await session.commit()
+
+            self.write_json(
+                {"message": "Schedule created", "schedule": schedule_to_dict(schedule)},
+                201,
+            )
+
+
+class AutomationScheduleDetailHandler(BaseAPIHandler):
+    """
+    GET /api/automation/schedules/{id} - Détails d'une programmation
+    PUT /api/automation/schedules/{id} - Modifier une programmation
+    DELETE /api/automation/schedules/{id} - Supprimer une programmation
+    """
+
+    async def get(self, schedule_id):
+        """Récupérer les détails d'une programmation"""
+        # DATABASE QUERY: Opération sur la base de données
+        async with async_session_maker() as session:
+            schedule = await session.get(AutomationSchedule, int(schedule_id))
+
+            if not schedule:
+                self.write_error_json("Programmation introuvable", 404)
+                return
+
+            self.write_json(schedule_to_dict(schedule))
+
+    async def put(self, schedule_id):
+        """Modifier une programmation"""
+        try:
+            data = json.loads(self.request.body)
+        except json.JSONDecodeError:
+            self.write_error_json("Invalid JSON", 400)
+            return
+
+        # DATABASE QUERY: Opération sur la base de données
+        async with async_session_maker() as session:
+            schedule = await session.get(AutomationSchedule, int(schedule_id))
+
+            if not schedule:
+                self.write_error_json("Programmation introuvable", 404)
+                return
+
+            merged = schedule_to_dict(schedule)
+            merged.update(data)
+            try:
+                validate_schedule(merged)
+            except (TypeError, ValueError) as e:
+                self.write_error_json(str(e), 400)
+                return
+
+            # Mise à jour des champs
+            for field in ("name", "is_active", "action_state", "trigger_type"):
+                if field in data:
+                    setattr(schedule, field, data[field])
+            if "equipment_id" in data:
+                equipment = await session.get(Equipment, int(data["equipment_id"]))
+                if equipment:
+                    schedule.equipment_id = equipment.id
+
+            if schedule.trigger_type == "cron":
+                schedule.cron_expression = merged["cron_expression"]
+                schedule.sensor_id = None
+                schedule.condition_operator = None
+                schedule.condition_value = None
+                schedule.delay_seconds = None
+            else:
+                schedule.cron_expression = None
+                schedule.sensor_id = int(merged["sensor_id"])
+                schedule.condition_operator = merged["condition_operator"]
+                schedule.condition_value = float(merged["condition_value"])
+                schedule.delay_seconds = int(merged["delay_seconds"])
+
+            # Recalculer l'échéance avec la nouvelle configuration
+            schedule.next_run_at = None
+            AutomationScheduler.register(schedule)
+            session.add(
+                automation_event(
+                    self,
+                    schedule.house_id,
+                    "automation_schedule",
+                    schedule.id,
+                    "update",
+                    f"Programmation modifiée: {schedule.name}",
+                )
+            )
+            await session.commit()
+
+            self.write_json({"message": "Schedule updated"})
+
+    async def delete(self, schedule_id):
+        """Supprimer une programmation"""
+        # DATABASE QUERY: Opération sur la base de données
+        async with async_session_maker() as session:
+            schedule = await session.get(AutomationSchedule, int(schedule_id))
+
+            if not schedule:
+                self.write_error_json("Programmation introuvable", 404)
+                return
+
+            AutomationScheduler.unregister(schedule.id)
+            session.add(
+                automation_event(
+                    self,
+                    schedule.house_id,
+                    "automation_schedule",
+                    schedule.id,
+                    "delete",
+                    f"Programmation supprimée: {schedule.name}",
+                )
+            )
+            await session.delete(schedule)
+            await session.commit()
+
+            self.write_json({"message": "Schedule deleted"})
@@ -21,9 +21,13 @@ class BaseAPIHandler(tornado.web.RequestHandler):
         self.set_header("Content-Type", "application/json")
         self.set_header("Access-Control-Allow-Origin", "*")
         self.set_header(
-            "Access-Control-Allow-Methods", "GET, POST, PUT, DELETE, OPTIONS"
+            "Access-Control-Allow-Methods", "GET, POST, PUT, PATCH, DELETE, OPTIONS"
         )
-        self.set_header("Access-Control-Allow-Headers", "Content-Type, Authorization")
+        self.set_header(
+            "Access-Control-Allow-Headers", "Content-Type, Authorization, If-None-Match"
+        )
+        # Lisible par un client d'une autre origine (renvoyé dans If-None-Match)
+        self.set_header("Access-Control-Expose-Headers", "Etag")
 
     def options(self, *args):
         self.set_status(204)
@@ -70,6 +74,83 @@ class BaseAPIHandler(tornado.web.RequestHandler):
             "username": username.decode() if username else None,
         }
 
+    def etag_matches(self, etag):
+        """
+        Poser l'ETag de la réponse; si le client a déjà cette version
+        (If-None-Match), répondre 304 et retourner True.
+        """
+        self.set_header("Etag", etag)
+        if self.check_etag_header():
+            self.set_status(304)
+            return True
+        return False
+
+    def grid_format(self):
+        """
+        Format de transport de la grille demandé (?grid_format=full|rle).
+        Répond 400 et retourne None si le format est inconnu.
+        """
+        from ..utils.grid_layers import GRID_FORMAT_FULL, GRID_FORMATS
+
+        grid_format = self.get_argument("grid_format", GRID_FORMAT_FULL)
+        if grid_format not in GRID_FORMATS:
+            self.write_error_json(
+                f"Unknown grid_format (expected one of {', '.join(GRID_FORMATS)})"
+            )
+            return None
+        return grid_format
+
+    def requested_fields(self, allowed, default, views=None):
+        """
+        Champs de réponse demandés: ?fields=a,b (sous-ensemble de `allowed`)
+        ou ?view=nom (voir `views`), sinon `default`. "id" est toujours
+        inclus. Répond 400 et retourne None si un champ ou une vue est inconnu.
+
+        Returns:
+            tuple des champs, dans l'ordre de `allowed`
+        """
+        raw = self.get_argument("fields", None)
+        view = self.get_argument("view", None)
+        if raw:
+            wanted = {name.strip() for name in raw.split(",") if name.strip()}
+            unknown = wanted.difference(allowed)
+            if unknown:
+                self.write_error_json(
+                    f"Unknown fields: {', '.join(sorted(unknown))}"
+                )
+                return None
+        elif view:
+            if not views or view not in views:
+                self.write_error_json(f"Unknown view: {view}")
+                return None
+            wanted = set(views[view])
+        else:
+            wanted = set(default)
+        wanted.add("id")
+        return tuple(name for name in allowed if name in wanted)
+
+    def page_params(self):
+        """
+        Pagination demandée (?cursor=&limit=), voir utils/pagination.
+        Répond 400 et retourne None si le curseur ou la taille est invalide.
+
+        Returns:
+            (dernier id de la page précédente ou None, taille de page)
+        """
+        from ..utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor
+
+        cursor = self.get_argument("cursor", None)
+        try:
+            limit = int(self.get_argument("limit", DEFAULT_PAGE_SIZE))
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            self.write_error_json(str(e) if cursor else "limit must be an integer")
+            return None
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            self.write_error_json(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+            return None
+        return after, limit
+
     def write_json(self, data, status=200):
         self.set_status(status)
         self.write(json.dumps(data, default=str))
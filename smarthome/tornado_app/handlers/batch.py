@@ -0,0 +1,156 @@
+"""Batch API handler (plusieurs appels REST en un aller-retour)."""
+
+import asyncio
+import json
+
+from tornado.concurrent import Future
+from tornado.httputil import HTTPConnection, HTTPHeaders, HTTPServerRequest
+
+from .base import BaseAPIHandler
+
+MAX_BATCH_REQUESTS = 20
+# Sous-requêtes GET exécutées en même temps (chacune prend une connexion du pool)
+BATCH_CONCURRENCY = 4
+BATCH_METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE")
+# En-têtes de la requête batch transmis à chaque sous-requête (authentification)
+FORWARDED_HEADERS = ("Authorization", "Cookie")
+
+
+def _done():
+    future = Future()
+    future.set_result(None)
+    return future
+
+
+class _CapturedResponse(HTTPConnection):
+    """Connexion en mémoire: garde la réponse d'un handler au lieu de l'envoyer."""
+
+    def __init__(self, context):
+        # Lu par HTTPServerRequest (remote_ip, protocole)
+        self.context = context
+        self.status = None
+        self.reason = None
+        self.chunks = []
+        self.finished = Future()
+
+    def set_close_callback(self, callback):
+        pass
+
+    def write_headers(self, start_line, headers, chunk=None):
+        self.status = start_line.code
+        self.reason = start_line.reason
+        return self.write(chunk) if chunk else _done()
+
+    def write(self, chunk):
+        self.chunks.append(chunk)
+        return _done()
+
+    def finish(self):
+        if not self.finished.done():
+            self.finished.set_result(None)
+
+    def to_json(self):
+        body = b"".join(self.chunks).decode("utf-8", "replace")
+        try:
+            body = json.loads(body) if body else None
+        except ValueError:
+            # Page d'erreur HTML par défaut de Tornado (404 de routage, 500)
+            if self.status >= 400:
+                body = {"error": self.reason}
+        return {"status": self.status, "body": body}
+
+
+def _parse_item(item):
+    """
+    Returns:
+        (méthode, chemin, corps JSON encodé ou None)
+
+    Raises:
+        ValueError: sous-requête invalide
+    """
+    if not isinstance(item, dict):
+        raise ValueError("Each request must be an object")
+    method = str(item.get("method", "GET")).upper()
+    path = item.get("path")
+    if method not in BATCH_METHODS:
+        raise ValueError(f"Unsupported method: {method}")
+    if not isinstance(path, str) or not path.startswith("/api/"):
+        raise ValueError("path must start with /api/")
+    if path.split("?", 1)[0].rstrip("/") == "/api/batch":
+        raise ValueError("Nested batch requests are not allowed")
+    body = item.get("body")
+    return method, path, None if body is None else json.dumps(body).encode()
+
+
+class BatchHandler(BaseAPIHandler):
+    """
+    POST /api/batch
+    Corps: [{"method": "GET", "path": "/api/...", "body": {...}}, ...]
+
+    Chaque sous-requête est traitée en mémoire par le handler de app.py
+    correspondant (mêmes vérifications d'accès). Les GET consécutifs
+    s'exécutent en parallèle; une écriture attend les requêtes qui la
+    précèdent et passe avant celles qui la suivent.
+    """
+
+    async def post(self):
+        try:
+            items = json.loads(self.request.body)
+        except json.JSONDecodeError:
+            self.write_error_json("Invalid JSON")
+            return
+        if not isinstance(items, list) or not items:
+            self.write_error_json("Expected a non-empty array of requests")
+            return
+        if len(items) > MAX_BATCH_REQUESTS:
+            self.write_error_json(f"At most {MAX_BATCH_REQUESTS} requests per batch")
+            return
+
+        responses = [None] * len(items)
+        semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+        async def run(index, request):
+            async with semaphore:
+                responses[index] = await self._dispatch(*request)
+
+        pending_reads = []
+        for index, item in enumerate(items):
+            try:
+                request = _parse_item(item)
+            except ValueError as e:
+                responses[index] = {"status": 400, "body": {"error": str(e)}}
+                continue
+            if request[0] == "GET":
+                pending_reads.append(run(index, request))
+                continue
+            # Écriture: les lectures qui la précèdent d'abord, puis elle seule
+            await asyncio.gather(*pending_reads)
+            pending_reads = []
+            await run(index, request)
+        await asyncio.gather(*pending_reads)
+
+        self.write_json({"responses": responses})
+
+    async def _dispatch(self, method, path, body):
+        """Exécuter une sous-requête et retourner {status, body}."""
+        headers = HTTPHeaders()
+        for name in FORWARDED_HEADERS:
+            if name in self.request.headers:
+                headers[name] = self.request.headers[name]
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+
+        context = getattr(self.request.connection, "context", None)
+        connection = _CapturedResponse(context)
+        request = HTTPServerRequest(
+            method=method,
+            uri=path,
+            headers=headers,
+            body=body or b"",
+            host=self.request.host,
+            connection=connection,
+        )
+        # Routage et exécution comme pour une requête HTTP reçue
+        self.application(request)
+        await connection.finished
+        return connection.to_json()
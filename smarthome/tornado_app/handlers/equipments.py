@@ -2,12 +2,33 @@ import json
 from sqlalchemy import select
 from ..models import Equipment, EventHistory
 from ..database import async_session_maker
+from ..utils.cell_placements import detach_from_grid, placement_cells
+from ..utils.grid_cache import invalidate_grid_json
+from ..utils.pagination import page_items, paginate
+from ..utils.projection import Field, Projection, isoformat
 from datetime import datetime
 from .base import BaseAPIHandler
 
 
+# Champs de GET /api/equipments (?fields=)
+EQUIPMENT_FIELDS = Projection(
+    Equipment,
+    {
+        "id": Field(Equipment.id),
+        "house_id": Field(Equipment.house_id),
+        "room_id": Field(Equipment.room_id),
+        "name": Field(Equipment.name),
+        "type": Field(Equipment.type),
+        "state": Field(Equipment.state),
+        "is_active": Field(Equipment.is_active),
+        "allowed_roles": Field(Equipment.allowed_roles),
+        "last_update": Field(Equipment.last_update, build=isoformat),
+    },
+)
+
+
 class EquipmentsListHandler(BaseAPIHandler):
-    """GET /api/equipments - List all equipments
+    """GET /api/equipments - List all equipments (?fields=, ?cursor=&limit=)
     POST /api/equipments - Create an equipment"""
 
     async def get(self):
@@ -18,10 +39,20 @@ class EquipmentsListHandler(BaseAPIHandler):
         room_id = self.get_argument("room_id", None)
         house_id = self.get_argument("house_id", None)
         equipment_type = self.get_argument("type", None)
+        fields = self.requested_fields(
+            EQUIPMENT_FIELDS.names, EQUIPMENT_FIELDS.default
+        )
+        if fields is None:
+            return
+        page = self.page_params()
+        if page is None:
+            return
+        after, limit = page
 
-        # DATABASE QUERY: Récupérer tous les équipements (optionnel: filtrés par room/house/type)
+        # DATABASE QUERY: Récupérer une page d'équipements (optionnel: filtrés par room/house/type)
         async with async_session_maker() as session:
-            query = select(Equipment)
+            projected = EQUIPMENT_FIELDS.query(fields)
+            query = projected.statement
             if room_id:
                 query = query.where(Equipment.room_id == int(room_id))
             elif house_id:
@@ -29,25 +60,16 @@ class EquipmentsListHandler(BaseAPIHandler):
             if equipment_type:
                 query = query.where(Equipment.type == equipment_type)
 
-            result = await session.execute(query)
-            equipments = result.scalars().all()
-
-            equipments_data = [
-                {
-                    "id": e.id,
-                    "house_id": e.house_id,
-                    "room_id": e.room_id,
-                    "name": e.name,
-                    "type": e.type,
-                    "state": e.state,
-                    "is_active": e.is_active,
-                    "allowed_roles": e.allowed_roles,
-                    "last_update": e.last_update.isoformat() if e.last_update else None,
-                }
-                for e in equipments
-            ]
+            result = await session.execute(
+                paginate(query, Equipment.id, after, limit)
+            )
+            equipments_data, next_cursor = page_items(
+                projected.to_json(result.all()), limit
+            )
 
-            self.write_json({"equipments": equipments_data})
+            self.write_json(
+                {"equipments": equipments_data, "next_cursor": next_cursor}
+            )
 
     async def post(self):
         """Create a new equipment."""
@@ -156,6 +178,8 @@ class EquipmentDetailHandler(BaseAPIHandler):
                 self.write_error_json("Equipment not found", 404)
                 return
 
+            cells = await placement_cells(session, "equipments", equipment.id)
+
             self.write_json(
                 {
                     "id": equipment.id,
@@ -170,6 +194,7 @@ class EquipmentDetailHandler(BaseAPIHandler):
                         if equipment.last_update
                         else None
                     ),
+                    "cells": [[row, col] for row, col in cells],
                 }
             )
 
@@ -350,12 +375,19 @@ class EquipmentDetailHandler(BaseAPIHandler):
 
             equipment_id = equipment.id
             house_id = equipment.house_id
-            
+
+            # Retirer l'équipement de ses cases seulement (placements indexés)
+            detached = await detach_from_grid(
+                session, house_id, "equipments", equipment_id
+            )
             await session.delete(equipment)
             await session.commit()
 
             # Broadcast via WebSocket
             from .websocket import RealtimeHandler
+            if detached:
+                invalidate_grid_json(house_id)
+                RealtimeHandler.broadcast_grid_patch(house_id, *detached)
             RealtimeHandler.broadcast_equipment_crud(
                 "delete",
                 {"id": equipment_id},
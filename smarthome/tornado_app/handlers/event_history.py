@@ -21,6 +21,8 @@ class EventHistoryHandler(BaseAPIHandler):
         - event_type: filtrer par type d'événement
         - days: événements des N derniers jours
         - user_id: filtrer par utilisateur
+        - after_id: événements postérieurs à cet id, du plus ancien au plus
+          récent (rattrapage après un snapshot, voir house_snapshot)
         """
         current_user = self.get_current_user()
         if not current_user:
@@ -37,6 +39,7 @@ class EventHistoryHandler(BaseAPIHandler):
         event_type = self.get_argument("event_type", None)
         days = self.get_argument("days", None)
         filter_user_id = self.get_argument("user_id", None)
+        after_id = self.get_argument("after_id", None)
 
         # DATABASE QUERY: Opération sur la base de données
         async with async_session_maker() as session:
@@ -79,9 +82,14 @@ class EventHistoryHandler(BaseAPIHandler):
                 query = query.where(EventHistory.created_at >= cutoff_date)
 
             # Options de chargement et tri
+            if after_id:
+                query = query.where(EventHistory.id > int(after_id)).order_by(
+                    EventHistory.id
+                )
+            else:
+                query = query.order_by(desc(EventHistory.created_at))
             query = (
                 query.options(selectinload(EventHistory.user))
-                .order_by(desc(EventHistory.created_at))
                 .limit(limit)
                 .offset(offset)
             )
@@ -99,6 +107,8 @@ class EventHistoryHandler(BaseAPIHandler):
                 )
             if days:
                 count_query = count_query.where(EventHistory.created_at >= cutoff_date)
+            if after_id:
+                count_query = count_query.where(EventHistory.id > int(after_id))
 
             count_result = await session.execute(count_query)
             total = len(count_result.scalars().all())
@@ -144,6 +154,7 @@ class EventTypesHandler(BaseAPIHandler):
             "sensor_reading": "Lecture de capteur",
             "member_action": "Action de membre",
             "automation_triggered": "Automatisation déclenchée",
+            "automation_modified": "Automatisation modifiée",
             "house_modified": "Maison modifiée",
         }
 
@@ -152,6 +163,7 @@ class EventTypesHandler(BaseAPIHandler):
             "sensor": "Capteur",
             "member": "Membre",
             "automation_rule": "Règle d'automatisation",
+            "automation_schedule": "Programmation",
             "house": "Maison",
             "room": "Pièce",
         }
@@ -295,6 +307,7 @@ EVENT_CLEANUP_CONFIG = {
         "member_action",  # Actions des membres (important)
         "house_modified",  # Modifications maison (important)
         "automation_triggered",  # Automatisations (moyennement important)
+        "automation_modified",  # Règles et programmations modifiées
     ],
     "low_priority_types": [
         "sensor_reading",  # Lectures de capteurs (moins important)
@@ -1,8 +1,15 @@
 import tornado.web
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, update
+from sqlalchemy.orm import defer, selectinload
 from ..database import async_session_maker
 from ..models import House
+from ..utils.cell_placements import (
+    check_overlay_ids,
+    grid_overlays,
+    replace_placements,
+)
+from ..utils.grid_cache import grid_marker, invalidate_grid_json, load_grid_jsons
+from ..utils.grid_layers import CompactGrid
 
 
 class EditHouseInsideHandler(tornado.web.RequestHandler):
@@ -34,7 +41,7 @@ class EditHouseInsideHandler(tornado.web.RequestHandler):
 
             result = await session.execute(
                 select(House)
-                .options(selectinload(House.rooms))
+                .options(defer(House.grid), selectinload(House.rooms))
                 .where(House.id == int(house_id))
             )
             house = result.scalar_one_or_none()
@@ -44,7 +51,15 @@ class EditHouseInsideHandler(tornado.web.RequestHandler):
                 self.write("<h1>404 - Maison introuvable</h1>")
                 return
 
-            self.render("edit_house_inside.html", house=house, error=None)
+            # Grille déjà sérialisée (cache par grid_version)
+            grids = await load_grid_jsons(session, [(house.id, house.grid_version)])
+
+            self.render(
+                "edit_house_inside.html",
+                house=house,
+                grid_json=grids[grid_marker(house.id)],
+                error=None,
+            )
 
     async def post(self, house_id):
         user_id = self.get_current_user()
@@ -82,14 +97,25 @@ class EditHouseInsideHandler(tornado.web.RequestHandler):
             import json
 
             try:
-                grid = json.loads(grid_data)
-                house.grid = grid
+                compact = CompactGrid.from_json(json.loads(grid_data))
+                await check_overlay_ids(session, house.id, grid_overlays(compact))
+                grid = compact.to_layers()
+                # Version incrémentée en SQL (pas de lecture puis écriture)
+                version = await session.scalar(
+                    update(House)
+                    .where(House.id == house.id)
+                    .values(grid=grid, grid_version=House.grid_version + 1)
+                    .returning(House.grid_version)
+                    .execution_options(synchronize_session=False)
+                )
+                await replace_placements(session, house.id, compact)
                 await session.commit()
+                invalidate_grid_json(int(house_id))
                 
                 # Broadcast grid update via WebSocket
                 from .websocket import RealtimeHandler
-                RealtimeHandler.broadcast_grid_update(int(house_id), grid)
-            except json.JSONDecodeError:
+                RealtimeHandler.broadcast_grid_update(int(house_id), grid, version)
+            except (json.JSONDecodeError, ValueError):
                 self.set_status(400)
                 self.write("<h1>400 - Données de grille invalides</h1>")
                 return
@@ -0,0 +1,72 @@
+"""Grid tile handlers (viewport loading of very large floor plans)."""
+
+from sqlalchemy import select
+
+from ..database import async_session_maker
+from ..models import House
+from ..utils.grid_tiles import MAX_ZOOM, TILE_SIZE, load_grid_tiles
+from ..utils.permissions import get_user_house_permission, PermissionLevel
+from .base import BaseAPIHandler
+
+
+class GridTileHandler(BaseAPIHandler):
+    """
+    GET /api/houses/{id}/grid/tiles?x=&y=&z=
+    Tuile (x, y) de la grille au niveau z (0 = pleine résolution).
+    """
+
+    async def get(self, house_id):
+        house_id = int(house_id)
+        user_id = self.get_current_user()["id"]
+
+        try:
+            x = int(self.get_argument("x"))
+            y = int(self.get_argument("y"))
+            z = int(self.get_argument("z", "0"))
+        except ValueError:
+            self.write_error_json("x, y et z doivent être des entiers")
+            return
+        if not 0 <= z <= MAX_ZOOM:
+            self.write_error_json(f"z doit être entre 0 et {MAX_ZOOM}")
+            return
+
+        # DATABASE QUERY: Opération sur la base de données
+        async with async_session_maker() as session:
+            perm = await get_user_house_permission(session, user_id, house_id)
+            if perm == PermissionLevel.NONE:
+                self.write_error_json("Access denied", 403)
+                return
+
+            version = await session.scalar(
+                select(House.grid_version).where(House.id == house_id)
+            )
+            if version is None:
+                self.write_error_json("House not found", 404)
+                return
+            try:
+                tiles = await load_grid_tiles(session, house_id, version)
+            except ValueError:
+                self.write_error_json("House has no grid", 404)
+                return
+
+        tile = tiles.tile(x, y, z)
+        if tile is None:
+            self.write_error_json("Tile out of range", 404)
+            return
+        # ETag = empreinte du contenu et dimensions de la grille (le reste du
+        # corps en dépend): inchangé si la tuile n'a pas bougé. Pas de
+        # grid_version dans le corps, qui change à chaque édition
+        if self.etag_matches(f'"{tile["hash"]}-{tiles.rows}x{tiles.cols}"'):
+            return
+
+        tiles_x, tiles_y = tiles.count(z)
+        self.write_json(
+            {
+                **tile,
+                "tile_size": TILE_SIZE,
+                "rows": tiles.rows,
+                "cols": tiles.cols,
+                "tiles_x": tiles_x,
+                "tiles_y": tiles_y,
+            }
+        )
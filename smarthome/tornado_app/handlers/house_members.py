@@ -3,18 +3,40 @@
 import json
 from datetime import datetime
 from sqlalchemy import select, and_
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import aliased, selectinload
 from ..models import HouseMember, House, User, EventHistory
 from ..database import async_session_maker
 from ..utils.permissions import can_manage_house
+from ..utils.projection import Field, Projection, isoformat
 from .base import BaseAPIHandler
 
+_Inviter = aliased(User)
+_MEMBER_USER = ((User, User.id == HouseMember.user_id),)
+_MEMBER_INVITER = ((_Inviter, _Inviter.id == HouseMember.invited_by),)
+
+# Champs de GET /api/houses/{id}/members (?fields=)
+MEMBER_FIELDS = Projection(
+    HouseMember,
+    {
+        "id": Field(HouseMember.id),
+        "user_id": Field(HouseMember.user_id),
+        "username": Field(User.username, joins=_MEMBER_USER),
+        "email": Field(User.email, joins=_MEMBER_USER),
+        "role": Field(HouseMember.role),
+        "status": Field(HouseMember.status),
+        "invited_at": Field(HouseMember.invited_at, build=isoformat),
+        "accepted_at": Field(HouseMember.accepted_at, build=isoformat),
+        "invited_by": Field(HouseMember.invited_by),
+        "inviter_username": Field(_Inviter.username, joins=_MEMBER_INVITER),
+    },
+)
+
 
 class HouseMembersHandler(BaseAPIHandler):
     """Handler for house member management."""
 
     async def get(self, house_id):
-        """List all members of a house."""
+        """List all members of a house (?fields=)."""
         current_user = self.get_current_user()
         if not current_user:
             self.set_status(401)
@@ -23,6 +45,9 @@ class HouseMembersHandler(BaseAPIHandler):
 
         house_id = int(house_id)
         user_id = current_user["id"]
+        fields = self.requested_fields(MEMBER_FIELDS.names, MEMBER_FIELDS.default)
+        if fields is None:
+            return
 
         # DATABASE QUERY: Opération sur la base de données
         async with async_session_maker() as session:
@@ -49,38 +74,14 @@ class HouseMembersHandler(BaseAPIHandler):
                 self.write({"error": "Access denied"})
                 return
 
-            # Retrieve all members
-            query = (
-                select(HouseMember)
-                .where(HouseMember.house_id == house_id)
-                .options(
-                    selectinload(HouseMember.user), selectinload(HouseMember.inviter)
+            # Retrieve all members (colonnes demandées seulement)
+            projected = MEMBER_FIELDS.query(fields)
+            result = await session.execute(
+                projected.statement.where(HouseMember.house_id == house_id).order_by(
+                    HouseMember.invited_at.desc()
                 )
-                .order_by(HouseMember.invited_at.desc())
             )
-
-            result = await session.execute(query)
-            members = result.scalars().all()
-
-            members_data = []
-            for member in members:
-                member_info = {
-                    "id": member.id,
-                    "user_id": member.user_id,
-                    "username": member.user.username if member.user else None,
-                    "email": member.user.email if member.user else None,
-                    "role": member.role,
-                    "status": member.status,
-                    "invited_at": member.invited_at.isoformat(),
-                    "accepted_at": (
-                        member.accepted_at.isoformat() if member.accepted_at else None
-                    ),
-                    "invited_by": member.invited_by,
-                    "inviter_username": (
-                        member.inviter.username if member.inviter else None
-                    ),
-                }
-                members_data.append(member_info)
+            members_data = projected.to_json(result.all())
 
             self.write({"members": members_data})
 
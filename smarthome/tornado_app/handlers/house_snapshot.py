@@ -0,0 +1,223 @@
+"""House snapshot handler (chargement de la page maison en une requête)."""
+
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import and_, func, select
+
+from ..database import async_session_maker
+from ..models import (
+    AutomationRule,
+    Equipment,
+    EventHistory,
+    House,
+    HouseMember,
+    Room,
+    Sensor,
+    User,
+)
+from ..services.live_positions import LivePositions
+from ..utils.grid_cache import (
+    grid_etag,
+    grid_marker,
+    json_with_grids,
+    load_grid_jsons,
+)
+from .automation_rules import RULE_FIELDS, attach_conditions
+from .base import BaseAPIHandler
+from .equipments import EQUIPMENT_FIELDS
+from .house_members import MEMBER_FIELDS
+from .sensors import SENSOR_FIELDS
+from .weather import weather_for_address
+
+# Au-delà, le snapshot part sans météo (le client la charge ensuite)
+WEATHER_TIMEOUT_SECONDS = 2.0
+
+MANAGER_ROLES = ("proprietaire", "administrateur")
+
+
+async def _weather_or_none(address):
+    try:
+        return await asyncio.wait_for(
+            weather_for_address(address), WEATHER_TIMEOUT_SECONDS
+        )
+    except (asyncio.TimeoutError, ValueError):
+        return None
+
+
+async def _projected(session, projection, statement_filter, order_by):
+    """Liste complète (champs par défaut) d'une projection de liste."""
+    projected = projection.query(projection.default)
+    result = await session.execute(
+        projected.statement.where(statement_filter).order_by(order_by)
+    )
+    return projected.to_json(result.all())
+
+
+class HouseSnapshotHandler(BaseAPIHandler):
+    """
+    GET /api/houses/{id}/snapshot?grid_format=full|rle
+    Tout ce qu'affiche la page maison (maison, grille, pièces, capteurs,
+    équipements, règles, membres, positions, météo) en une réponse.
+    L'ETag suit grid_version et le dernier événement de l'historique.
+    """
+
+    async def get(self, house_id):
+        house_id = int(house_id)
+        user_id = self.get_current_user()["id"]
+        grid_format = self.grid_format()
+        if grid_format is None:
+            return
+
+        # DATABASE QUERY: toutes les lectures dans une seule transaction en
+        # lecture seule REPEATABLE READ: les listes voient le même état de la
+        # base que la version du snapshot
+        async with async_session_maker() as session:
+            await session.connection(
+                execution_options={
+                    "isolation_level": "REPEATABLE READ",
+                    "postgresql_readonly": True,
+                }
+            )
+
+            # Maison, rôle de l'utilisateur et dernier événement en une requête
+            result = await session.execute(
+                select(
+                    House.name,
+                    House.address,
+                    House.length,
+                    House.width,
+                    House.grid_version,
+                    House.user_id,
+                    HouseMember.role,
+                    select(func.max(EventHistory.id))
+                    .where(EventHistory.house_id == House.id)
+                    .scalar_subquery()
+                    .label("last_event_id"),
+                )
+                .outerjoin(
+                    HouseMember,
+                    and_(
+                        HouseMember.house_id == House.id,
+                        HouseMember.user_id == user_id,
+                        HouseMember.status == "accepted",
+                    ),
+                )
+                .where(House.id == house_id)
+            )
+            house = result.one_or_none()
+            if house is None:
+                self.write_error_json("House not found", 404)
+                return
+            user_role = "proprietaire" if house.user_id == user_id else house.role
+            if user_role is None:
+                self.write_error_json("Access denied", 403)
+                return
+
+            # Rattrapage (If-None-Match): 304 si ni la grille (grid_version,
+            # y compris PATCH) ni l'historique n'ont changé depuis ce snapshot
+            etag = grid_etag(
+                "snapshot",
+                grid_format,
+                user_role,
+                house.grid_version,
+                house.last_event_id or 0,
+            )
+            if self.etag_matches(etag):
+                return
+
+            # Météo (API externe) pendant les lectures en base
+            weather = (
+                asyncio.ensure_future(_weather_or_none(house.address))
+                if house.address
+                else None
+            )
+
+            result = await session.execute(
+                select(Room.id, Room.name, Room.house_id)
+                .where(Room.house_id == house_id)
+                .order_by(Room.id)
+            )
+            rooms = [dict(room._mapping) for room in result.all()]
+            sensors = await _projected(
+                session, SENSOR_FIELDS, Sensor.house_id == house_id, Sensor.id
+            )
+            equipments = await _projected(
+                session, EQUIPMENT_FIELDS, Equipment.house_id == house_id, Equipment.id
+            )
+            rules = await _projected(
+                session,
+                RULE_FIELDS,
+                AutomationRule.house_id == house_id,
+                AutomationRule.id,
+            )
+            await attach_conditions(session, rules)
+            members = await _projected(
+                session,
+                MEMBER_FIELDS,
+                HouseMember.house_id == house_id,
+                HouseMember.invited_at.desc(),
+            )
+
+            # Positions actives en mémoire (pas de lecture de user_positions)
+            live = dict(await LivePositions.house(session, house_id))
+            users = {}
+            if live:
+                result = await session.execute(
+                    select(User.id, User.username, User.profile_image).where(
+                        User.id.in_(list(live))
+                    )
+                )
+                users = {row.id: row for row in result.all()}
+
+            versions = [(house_id, house.grid_version)]
+            grids = await load_grid_jsons(session, versions, grid_format)
+
+        data = {
+            "snapshot": {
+                # Rattrapage: grid_patch à partir de grid_version + 1,
+                # /history?after_id=last_event_id pour le reste
+                "grid_version": house.grid_version,
+                "last_event_id": house.last_event_id or 0,
+                "taken_at": datetime.utcnow().isoformat(),
+            },
+            "house": {
+                "id": house_id,
+                "name": house.name,
+                "address": house.address,
+                "length": house.length,
+                "width": house.width,
+                "grid": grid_marker(house_id),
+                "grid_version": house.grid_version,
+                "user_role": user_role,
+                "rooms": rooms,
+            },
+            "sensors": sensors,
+            "equipments": equipments,
+            "rules": rules,
+            "members": members,
+            "positions": [
+                {
+                    "user_id": position_user_id,
+                    "username": users[position_user_id].username,
+                    "profile_image": users[position_user_id].profile_image,
+                    "x": position.x,
+                    "y": position.y,
+                    "last_update": position.last_update.isoformat(),
+                }
+                for position_user_id, position in live.items()
+                if position_user_id in users
+            ],
+            # Demandes d'accès en attente (badge), pour les gestionnaires
+            "access_requests_count": (
+                sum(
+                    1
+                    for member in members
+                    if member["status"] == "pending" and member["invited_by"] is None
+                )
+                if user_role in MANAGER_ROLES
+                else None
+            ),
+            "weather": await weather if weather else None,
+        }
+        self.write(json_with_grids(data, grids))
@@ -3,17 +3,76 @@ REST API for house and room management.
 """
 
 import json
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import defer, load_only, selectinload
 from ..models import House, Room, EventHistory
 from ..database import async_session_maker
+from ..services.live_positions import LivePositions
+from ..services.occupancy_heatmap import OccupancyHeatmap
+from ..services.occupant_simulator import OccupantSimulator
+from ..services.presence import PresenceTracker
+from ..utils.cell_placements import (
+    cell_overlays,
+    check_overlay_ids,
+    grid_overlays,
+    grid_patch_expression,
+    replace_placements,
+    update_cell_placements,
+)
+from ..utils.grid_cache import (
+    grid_etag,
+    grid_marker,
+    invalidate_grid_json,
+    json_with_grids,
+    load_grid_jsons,
+)
+from ..utils.grid_index import invalidate_grid_index
+from ..utils.grid_layers import (
+    STRICT_LAYERS,
+    CompactGrid,
+    apply_cell_changes,
+    normalize_cell_changes,
+)
+from ..utils.grid_paths import invalidate_grid_paths
+from ..utils.grid_tiles import invalidate_grid_tiles
 from ..utils.permissions import can_manage_house
 from .base import BaseAPIHandler
 
 
+# Champs de GET /api/houses (?fields=a,b ou ?view=summary)
+HOUSE_LIST_FIELDS = (
+    "id",
+    "name",
+    "address",
+    "length",
+    "width",
+    "grid",
+    "grid_version",
+    "role",
+    "is_owner",
+    "rooms",
+    "rooms_count",
+)
+HOUSE_LIST_DEFAULT = HOUSE_LIST_FIELDS[:-1]
+HOUSE_LIST_VIEWS = {
+    "full": HOUSE_LIST_DEFAULT,
+    # Tableau de bord: ni grille ni pièces (la colonne grid n'est pas lue)
+    "summary": (
+        "name",
+        "address",
+        "length",
+        "width",
+        "grid_version",
+        "role",
+        "is_owner",
+        "rooms_count",
+    ),
+}
+
+
 class HousesAPIHandler(BaseAPIHandler):
     """
-    GET /api/houses - List all user's houses
+    GET /api/houses - List all user's houses (?view=summary, ?fields=)
     POST /api/houses - Create a new house
     """
 
@@ -21,74 +80,89 @@ class HousesAPIHandler(BaseAPIHandler):
         current_user = self.get_current_user()
         if not current_user:
             return self.write_error_json("Not authenticated", 401)
+        fields = self.requested_fields(
+            HOUSE_LIST_FIELDS, HOUSE_LIST_DEFAULT, HOUSE_LIST_VIEWS
+        )
+        if fields is None:
+            return
+        grid_format = self.grid_format()
+        if grid_format is None:
+            return
 
         # DATABASE QUERY: Récupérer les maisons possédées et partagées de l'utilisateur
         async with async_session_maker() as session:
-            from sqlalchemy import and_
+            from sqlalchemy import and_, or_
             from ..models import HouseMember
 
-            # Retrieve houses owned by the user
-            owned_result = await session.execute(
-                select(House)
-                .where(House.user_id == current_user["id"])
-                .options(selectinload(House.rooms))
-            )
-            owned_houses = owned_result.scalars().all()
-
-            # Retrieve houses where user is an accepted member
-            member_result = await session.execute(
-                select(HouseMember)
-                .where(
+            user_id = current_user["id"]
+            # Maisons possédées et partagées en une seule requête, sans la
+            # colonne grid (les grilles viennent du cache de sérialisation)
+            query = (
+                select(House, HouseMember.role)
+                .outerjoin(
+                    HouseMember,
                     and_(
-                        HouseMember.user_id == current_user["id"],
+                        HouseMember.house_id == House.id,
+                        HouseMember.user_id == user_id,
                         HouseMember.status == "accepted",
+                    ),
+                )
+                .where(or_(House.user_id == user_id, HouseMember.id.is_not(None)))
+                .options(
+                    load_only(
+                        House.user_id,
+                        House.name,
+                        House.address,
+                        House.length,
+                        House.width,
+                        House.grid_version,
                     )
                 )
-                .options(selectinload(HouseMember.house))
+                .order_by(House.user_id != user_id, House.id)
             )
-            memberships = member_result.scalars().all()
-
-            houses_list = []
-
-            # Add owned houses
-            for h in owned_houses:
-                houses_list.append(
-                    {
-                        "id": h.id,
-                        "name": h.name,
-                        "address": h.address,
-                        "length": h.length,
-                        "width": h.width,
-                        "grid": h.grid,
-                        "role": "proprietaire",
-                        "is_owner": True,
-                        "rooms": [{"id": r.id, "name": r.name} for r in h.rooms],
-                    }
+            if "rooms" in fields:
+                query = query.options(selectinload(House.rooms).load_only(Room.name))
+            result = await session.execute(query)
+            rows = result.all()
+
+            rooms_count = {}
+            if "rooms_count" in fields and rows:
+                count_result = await session.execute(
+                    select(Room.house_id, func.count(Room.id))
+                    .where(Room.house_id.in_([house.id for house, _ in rows]))
+                    .group_by(Room.house_id)
                 )
+                rooms_count = dict(count_result.all())
 
-            # Add shared houses
-            for membership in memberships:
-                if membership.house:
-                    # Load rooms
-                    await session.refresh(membership.house, ["rooms"])
-                    houses_list.append(
-                        {
-                            "id": membership.house.id,
-                            "name": membership.house.name,
-                            "address": membership.house.address,
-                            "length": membership.house.length,
-                            "width": membership.house.width,
-                            "grid": membership.house.grid,
-                            "role": membership.role,
-                            "is_owner": False,
-                            "rooms": [
-                                {"id": r.id, "name": r.name}
-                                for r in membership.house.rooms
-                            ],
-                        }
-                    )
-
-            self.write_json({"houses": houses_list})
+            houses_list = []
+            for house, member_role in rows:
+                is_owner = house.user_id == user_id
+                values = {
+                    "id": house.id,
+                    "name": house.name,
+                    "address": house.address,
+                    "length": house.length,
+                    "width": house.width,
+                    "grid_version": house.grid_version,
+                    "role": "proprietaire" if is_owner else member_role,
+                    "is_owner": is_owner,
+                }
+                if "grid" in fields:
+                    values["grid"] = grid_marker(house.id)
+                if "rooms" in fields:
+                    values["rooms"] = [{"id": r.id, "name": r.name} for r in house.rooms]
+                if "rooms_count" in fields:
+                    values["rooms_count"] = rooms_count.get(house.id, 0)
+                houses_list.append({name: values[name] for name in fields})
+
+            data = {"houses": houses_list}
+            versions = []
+            if "grid" in fields:
+                versions = [(house.id, house.grid_version) for house, _ in rows]
+            if self.etag_matches(grid_etag(data, versions, grid_format)):
+                return
+            grids = await load_grid_jsons(session, versions, grid_format)
+            self.write(json_with_grids(data, grids))
 
     async def post(self):
         current_user = self.get_current_user()
@@ -123,14 +197,7 @@ class HousesAPIHandler(BaseAPIHandler):
         async with async_session_maker() as session:
             # Create a grid with automatic wall borders
             # Actual grid: (length+2) x (width+2) for borders
-            grid = []
-            for i in range(length + 2):
-                row = []
-                for j in range(width + 2):
-                    # Border = wall (1), interior = empty (0)
-                    is_border = i == 0 or i == length + 1 or j == 0 or j == width + 1
-                    row.append(1 if is_border else 0)
-                grid.append(row)
+            grid = CompactGrid.walled(length + 2, width + 2).to_layers()
 
             new_house = House(
                 user_id=current_user["id"],
@@ -171,6 +238,7 @@ class HousesAPIHandler(BaseAPIHandler):
                     "length": new_house.length,
                     "width": new_house.width,
                     "grid": new_house.grid,
+                    "grid_version": new_house.grid_version,
                     "message": "House created successfully",
                 },
                 201,
@@ -188,6 +256,9 @@ class HouseDetailAPIHandler(BaseAPIHandler):
         current_user = self.get_current_user()
         if not current_user:
             return self.write_error_json("Not authenticated", 401)
+        grid_format = self.grid_format()
+        if grid_format is None:
+            return
 
         # DATABASE QUERY: Récupérer les détails d'une maison avec vérification des permissions
         async with async_session_maker() as session:
@@ -202,7 +273,7 @@ class HouseDetailAPIHandler(BaseAPIHandler):
             result = await session.execute(
                 select(House)
                 .where(House.id == house_id)
-                .options(selectinload(House.rooms))
+                .options(defer(House.grid), selectinload(House.rooms))
             )
             house = result.scalar_one_or_none()
 
@@ -214,21 +285,26 @@ class HouseDetailAPIHandler(BaseAPIHandler):
                 session, current_user["id"], house_id
             )
 
-            self.write_json(
-                {
-                    "id": house.id,
-                    "name": house.name,
-                    "address": house.address,
-                    "length": house.length,
-                    "width": house.width,
-                    "grid": house.grid,
-                    "user_role": user_role,
-                    "rooms": [
-                        {"id": r.id, "name": r.name, "house_id": r.house_id}
-                        for r in house.rooms
-                    ],
-                }
-            )
+            data = {
+                "id": house.id,
+                "name": house.name,
+                "address": house.address,
+                "length": house.length,
+                "width": house.width,
+                "grid": grid_marker(house.id),
+                "grid_version": house.grid_version,
+                "user_role": user_role,
+                "rooms": [
+                    {"id": r.id, "name": r.name, "house_id": r.house_id}
+                    for r in house.rooms
+                ],
+            }
+            versions = [(house.id, house.grid_version)]
+            # 304 sans lire ni sérialiser la grille
+            if self.etag_matches(grid_etag(data, versions, grid_format)):
+                return
+            grids = await load_grid_jsons(session, versions, grid_format)
+            self.write(json_with_grids(data, grids))
 
     async def put(self, house_id):
         current_user = self.get_current_user()
@@ -286,7 +362,23 @@ class HouseDetailAPIHandler(BaseAPIHandler):
                 except (ValueError, TypeError):
                     pass
             if "grid" in data:
-                house.grid = data["grid"]
+                try:
+                    grid = CompactGrid.from_json(data["grid"])
+                    await check_overlay_ids(session, house_id, grid_overlays(grid))
+                except ValueError as e:
+                    return self.write_error_json(f"Invalid grid: {e}", 400)
+                # Version incrémentée en SQL: deux écritures concurrentes ne
+                # peuvent pas produire la même grid_version
+                await session.execute(
+                    update(House)
+                    .where(House.id == house_id)
+                    .values(
+                        grid=grid.to_layers(), grid_version=House.grid_version + 1
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                await replace_placements(session, house_id, grid)
+                invalidate_grid_json(house_id)
 
             await session.commit()
             await session.refresh(house)
@@ -299,6 +391,7 @@ class HouseDetailAPIHandler(BaseAPIHandler):
                     "length": house.length,
                     "width": house.width,
                     "grid": house.grid,
+                    "grid_version": house.grid_version,
                     "message": "House updated successfully",
                 }
             )
@@ -326,6 +419,14 @@ class HouseDetailAPIHandler(BaseAPIHandler):
                 # - rooms et leurs sensors/equipments (cascade SQLAlchemy)
                 await session.delete(house)
                 await session.commit()
+                invalidate_grid_index(int(house_id))
+                PresenceTracker.invalidate(int(house_id))
+                LivePositions.forget_house(int(house_id))
+                OccupantSimulator.forget_house(int(house_id))
+                OccupancyHeatmap.invalidate(int(house_id))
+                invalidate_grid_paths(int(house_id))
+                invalidate_grid_json(int(house_id))
+                invalidate_grid_tiles(int(house_id))
 
                 self.write_json({"message": "House deleted successfully"})
             except Exception as e:
@@ -334,6 +435,108 @@ class HouseDetailAPIHandler(BaseAPIHandler):
                 return self.write_error_json(f"Cannot delete house: {str(e)}", 500)
 
 
+# Au-delà, la modification passe par PUT /api/houses/{id}
+MAX_GRID_CHANGES = 256
+
+
+class HouseGridAPIHandler(BaseAPIHandler):
+    """
+    PATCH /api/houses/{id}/grid - Modifier des cases de la grille
+    Body: {"version": N, "changes": [{"row", "col", "base"?, "sensors"?, "equipments"?}]}
+    Refusé (409) si la grille n'est plus à la version N.
+    """
+
+    async def patch(self, house_id):
+        current_user = self.get_current_user()
+        if not current_user:
+            return self.write_error_json("Not authenticated", 401)
+
+        try:
+            data = json.loads(self.request.body)
+            expected = int(data["version"])
+            changes = data["changes"]
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+            return self.write_error_json("Body must contain version and changes", 400)
+        if isinstance(changes, list) and len(changes) > MAX_GRID_CHANGES:
+            return self.write_error_json(
+                f"Too many changes (max {MAX_GRID_CHANGES}), use PUT", 400
+            )
+
+        house_id = int(house_id)
+        # DATABASE QUERY: Modifier des cases de la grille (version attendue)
+        async with async_session_maker() as session:
+            if not await can_manage_house(session, current_user["id"], house_id):
+                return self.write_error_json("Access denied", 403)
+
+            # Dimensions et format sans charger la grille
+            result = await session.execute(
+                select(
+                    House.grid_version,
+                    func.jsonb_array_length(House.grid),
+                    func.jsonb_array_length(House.grid[0]),
+                    func.jsonb_typeof(House.grid[0][0]),
+                ).where(House.id == house_id)
+            )
+            row = result.one_or_none()
+            if row is None:
+                return self.write_error_json("House not found", 404)
+            version, rows, cols, cell_type = row
+            if version != expected:
+                return self._conflict(version)
+
+            try:
+                cells = normalize_cell_changes(changes, rows or 0, cols or 0)
+                await check_overlay_ids(session, house_id, cell_overlays(cells))
+            except ValueError as e:
+                return self.write_error_json(str(e), 400)
+
+            if STRICT_LAYERS or cell_type == "object":
+                grid = grid_patch_expression(cells)
+            else:
+                # Grille legacy: conversion en couches lors de la première modification
+                house = await session.get(House, house_id)
+                compact = apply_cell_changes(CompactGrid.from_json(house.grid), cells)
+                grid = compact.to_layers()
+
+            # La version attendue est vérifiée dans l'UPDATE lui-même
+            result = await session.execute(
+                update(House)
+                .where(House.id == house_id, House.grid_version == expected)
+                .values(grid=grid, grid_version=expected + 1)
+                .returning(House.grid_version)
+                .execution_options(synchronize_session=False)
+            )
+            new_version = result.scalar_one_or_none()
+            if new_version is None:
+                await session.rollback()
+                current = await session.scalar(
+                    select(House.grid_version).where(House.id == house_id)
+                )
+                return self._conflict(current)
+            await update_cell_placements(session, house_id, cells)
+            await session.commit()
+        invalidate_grid_json(house_id)
+
+        patch = [
+            {"row": r, "col": c, **fields} for (r, c), fields in cells.items()
+        ]
+        # WEBSOCKET BROADCAST: cases modifiées uniquement
+        from .websocket import RealtimeHandler
+
+        RealtimeHandler.broadcast_grid_patch(house_id, new_version, patch)
+
+        self.write_json({"grid_version": new_version, "changes": len(patch)})
+
+    def _conflict(self, current_version):
+        self.write_json(
+            {
+                "error": "Grid version mismatch",
+                "grid_version": current_version,
+            },
+            409,
+        )
+
+
 class RoomsAPIHandler(BaseAPIHandler):
     """
     GET /api/houses/{house_id}/rooms - Liste les pièces d'une maison
@@ -0,0 +1,59 @@
+"""Occupancy analytics handlers."""
+
+from datetime import datetime, timedelta, timezone
+
+from ..database import async_session_maker
+from ..models import House
+from ..services.occupancy_heatmap import OccupancyHeatmap
+from ..utils.permissions import get_user_house_permission, PermissionLevel
+from .base import BaseAPIHandler
+
+DEFAULT_PERIOD = timedelta(hours=24)
+
+
+def parse_datetime(raw: str) -> datetime:
+    """Date ISO 8601 convertie en UTC naïf (comme les colonnes DateTime)."""
+    value = datetime.fromisoformat(raw)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class OccupancyHeatmapHandler(BaseAPIHandler):
+    """
+    GET /api/houses/{id}/occupancy-heatmap?from=&to=
+    Temps passé par case et par pièce (défaut: dernières 24 h).
+    """
+
+    async def get(self, house_id):
+        house_id = int(house_id)
+        user_id = self.get_current_user()["id"]
+
+        try:
+            raw_to = self.get_argument("to", None)
+            raw_from = self.get_argument("from", None)
+            if raw_to:
+                end = parse_datetime(raw_to)
+            else:
+                # Arrondi à la minute: les requêtes successives partagent le cache
+                end = datetime.utcnow().replace(second=0, microsecond=0)
+                end += timedelta(minutes=1)
+            start = parse_datetime(raw_from) if raw_from else end - DEFAULT_PERIOD
+        except ValueError as e:
+            self.write_error_json(f"Invalid date: {e}")
+            return
+        if start >= end:
+            self.write_error_json("from doit précéder to")
+            return
+
+        # DATABASE QUERY: Opération sur la base de données
+        async with async_session_maker() as session:
+            perm = await get_user_house_permission(session, user_id, house_id)
+            if perm == PermissionLevel.NONE:
+                self.write_error_json("Access denied", 403)
+                return
+
+            house = await session.get(House, house_id)
+            heatmap = await OccupancyHeatmap.get(session, house, start, end)
+
+        self.write_json(heatmap)
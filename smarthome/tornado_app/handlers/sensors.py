@@ -2,13 +2,35 @@ import json
 from sqlalchemy import select
 from ..models import Sensor, EventHistory
 from ..database import async_session_maker
+from ..utils.cell_placements import detach_from_grid, placement_cells
+from ..utils.grid_cache import invalidate_grid_json
+from ..utils.pagination import page_items, paginate
+from ..utils.projection import Field, Projection, isoformat
+from ..services.automation_engine import AutomationEngine
 from datetime import datetime
 from .websocket import RealtimeHandler
 from .base import BaseAPIHandler
 
 
+# Champs de GET /api/sensors (?fields=)
+SENSOR_FIELDS = Projection(
+    Sensor,
+    {
+        "id": Field(Sensor.id),
+        "house_id": Field(Sensor.house_id),
+        "room_id": Field(Sensor.room_id),
+        "name": Field(Sensor.name),
+        "type": Field(Sensor.type),
+        "value": Field(Sensor.value),
+        "unit": Field(Sensor.unit),
+        "is_active": Field(Sensor.is_active),
+        "last_update": Field(Sensor.last_update, build=isoformat),
+    },
+)
+
+
 class SensorsListHandler(BaseAPIHandler):
-    """GET /api/sensors - List all sensors
+    """GET /api/sensors - List all sensors (?fields=, ?cursor=&limit=)
     POST /api/sensors - Create a sensor"""
 
     async def get(self):
@@ -18,34 +40,29 @@ class SensorsListHandler(BaseAPIHandler):
         """
         room_id = self.get_argument("room_id", None)
         house_id = self.get_argument("house_id", None)
+        fields = self.requested_fields(SENSOR_FIELDS.names, SENSOR_FIELDS.default)
+        if fields is None:
+            return
+        page = self.page_params()
+        if page is None:
+            return
+        after, limit = page
 
-        # DATABASE QUERY: Récupérer tous les capteurs (optionnel: filtrés par room_id ou house_id)
+        # DATABASE QUERY: Récupérer une page de capteurs (optionnel: filtrés par room_id ou house_id)
         async with async_session_maker() as session:
-            query = select(Sensor)
+            projected = SENSOR_FIELDS.query(fields)
+            query = projected.statement
             if room_id:
                 query = query.where(Sensor.room_id == int(room_id))
             elif house_id:
                 query = query.where(Sensor.house_id == int(house_id))
 
-            result = await session.execute(query)
-            sensors = result.scalars().all()
-
-            sensors_data = [
-                {
-                    "id": s.id,
-                    "house_id": s.house_id,
-                    "room_id": s.room_id,
-                    "name": s.name,
-                    "type": s.type,
-                    "value": s.value,
-                    "unit": s.unit,
-                    "is_active": s.is_active,
-                    "last_update": s.last_update.isoformat() if s.last_update else None,
-                }
-                for s in sensors
-            ]
+            result = await session.execute(paginate(query, Sensor.id, after, limit))
+            sensors_data, next_cursor = page_items(
+                projected.to_json(result.all()), limit
+            )
 
-            self.write_json({"sensors": sensors_data})
+            self.write_json({"sensors": sensors_data, "next_cursor": next_cursor})
 
     async def post(self):
         """Create a new sensor."""
@@ -163,6 +180,8 @@ class SensorDetailHandler(BaseAPIHandler):
                 self.write_error_json("Sensor not found", 404)
                 return
 
+            cells = await placement_cells(session, "sensors", sensor.id)
+
             self.write_json(
                 {
                     "id": sensor.id,
@@ -176,6 +195,7 @@ class SensorDetailHandler(BaseAPIHandler):
                     "last_update": (
                         sensor.last_update.isoformat() if sensor.last_update else None
                     ),
+                    "cells": [[row, col] for row, col in cells],
                 }
             )
 
@@ -264,6 +284,10 @@ class SensorDetailHandler(BaseAPIHandler):
                 RealtimeHandler.broadcast_sensor_update(
                     sensor.id, sensor.value, sensor.is_active, sensor.house_id
                 )
+
+                # Réévaluer les règles qui dépendent de ce capteur
+                await AutomationEngine.evaluate_sensor(session, sensor)
+                await session.commit()
             
             # Si changement de nom ou unit, broadcaster pour mise à jour complète
             if "name" in changes or "unit" in changes:
@@ -328,12 +352,17 @@ class SensorDetailHandler(BaseAPIHandler):
 
             sensor_id = sensor.id
             house_id = sensor.house_id
-            
+
+            # Retirer le capteur de ses cases seulement (placements indexés)
+            detached = await detach_from_grid(session, house_id, "sensors", sensor_id)
             await session.delete(sensor)
             await session.commit()
 
             # Broadcast via WebSocket
             from .websocket import RealtimeHandler
+            if detached:
+                invalidate_grid_json(house_id)
+                RealtimeHandler.broadcast_grid_patch(house_id, *detached)
             RealtimeHandler.broadcast_sensor_crud(
                 "delete",
                 {"id": sensor_id},
@@ -405,6 +434,11 @@ class SensorValueHandler(BaseAPIHandler):
                 sensor.id, sensor.value, sensor.is_active, sensor.house_id
             )
 
+            # Réévaluer les règles qui dépendent de ce capteur
+            if old_value != data["value"]:
+                await AutomationEngine.evaluate_sensor(session, sensor)
+                await session.commit()
+
             self.write_json(
                 {
                     "id": sensor.id,
@@ -0,0 +1,122 @@
+"""Occupant simulation handlers (server-side virtual occupants)."""
+
+import json
+
+from ..database import async_session_maker
+from ..models import House
+from ..services.occupant_simulator import (
+    DEFAULT_SPEED,
+    MAX_OCCUPANTS,
+    MAX_SPEED,
+    MIN_SPEED,
+    OccupantSimulator,
+)
+from ..utils.permissions import get_user_house_permission, PermissionLevel
+from .base import BaseAPIHandler
+
+
+def parse_speed(raw):
+    """Vitesse en cases par seconde, bornée à [MIN_SPEED, MAX_SPEED]."""
+    speed = float(raw)
+    if not MIN_SPEED <= speed <= MAX_SPEED:
+        raise ValueError(f"speed doit être entre {MIN_SPEED} et {MAX_SPEED}")
+    return speed
+
+
+class OccupantSimulationHandler(BaseAPIHandler):
+    """
+    GET    /api/houses/{id}/simulation - État de la simulation
+    POST   /api/houses/{id}/simulation - Démarrer {"occupants", "speed", "broadcast", "seed"}
+    PUT    /api/houses/{id}/simulation - Changer la vitesse {"speed"}
+    DELETE /api/houses/{id}/simulation - Arrêter
+    """
+
+    async def _check_permission(self, session, house_id, level):
+        user_id = self.get_current_user()["id"]
+        perm = await get_user_house_permission(session, user_id, house_id)
+        if perm < level:
+            self.write_error_json("Access denied", 403)
+            return False
+        return True
+
+    async def get(self, house_id):
+        house_id = int(house_id)
+        # DATABASE QUERY: Opération sur la base de données
+        async with async_session_maker() as session:
+            if not await self._check_permission(
+                session, house_id, PermissionLevel.VIEW
+            ):
+                return
+
+        status = OccupantSimulator.status(house_id)
+        self.write_json(status or {"house_id": house_id, "running": False})
+
+    async def post(self, house_id):
+        house_id = int(house_id)
+        try:
+            data = json.loads(self.request.body or b"{}")
+            occupants = int(data.get("occupants", 10))
+            speed = parse_speed(data.get("speed", DEFAULT_SPEED))
+            broadcast = bool(data.get("broadcast", True))
+            seed = data.get("seed")
+        except (json.JSONDecodeError, TypeError, ValueError) as e:
+            self.write_error_json(f"Invalid data: {e}")
+            return
+        if not 1 <= occupants <= MAX_OCCUPANTS:
+            self.write_error_json(f"occupants doit être entre 1 et {MAX_OCCUPANTS}")
+            return
+
+        # DATABASE QUERY: Opération sur la base de données
+        async with async_session_maker() as session:
+            if not await self._check_permission(
+                session, house_id, PermissionLevel.MANAGE
+            ):
+                return
+            house = await session.get(House, house_id)
+            try:
+                status = await OccupantSimulator.start(
+                    session, house, occupants, speed, broadcast, seed
+                )
+            except ValueError as e:
+                self.write_error_json(str(e))
+                return
+
+        self.write_json(status, 201)
+
+    async def put(self, house_id):
+        house_id = int(house_id)
+        try:
+            data = json.loads(self.request.body)
+            speed = parse_speed(data["speed"])
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+            self.write_error_json(f"Invalid data: {e}")
+            return
+
+        # DATABASE QUERY: Opération sur la base de données
+        async with async_session_maker() as session:
+            if not await self._check_permission(
+                session, house_id, PermissionLevel.MANAGE
+            ):
+                return
+
+        status = OccupantSimulator.set_speed(house_id, speed)
+        if status is None:
+            self.write_error_json("No simulation running", 404)
+            return
+        self.write_json(status)
+
+    async def delete(self, house_id):
+        house_id = int(house_id)
+        # DATABASE QUERY: Opération sur la base de données
+        async with async_session_maker() as session:
+            if not await self._check_permission(
+                session, house_id, PermissionLevel.MANAGE
+            ):
+                return
+            status = await OccupantSimulator.stop(session, house_id)
+            await session.commit()
+
+        if status is None:
+            self.write_error_json("No simulation running", 404)
+            return
+        self.write_json(status)
@@ -2,10 +2,13 @@
 
 import json
 from datetime import datetime
-from sqlalchemy import select, and_
+from sqlalchemy import select
 
 from ..database import async_session_maker
-from ..models import UserPosition, House, User, Sensor, AutomationRule
+from ..models import House, User
+from ..services.live_positions import LivePositions
+from ..services.presence import PresenceTracker, apply_presence_flips
+from ..utils.grid_index import get_grid_index
 from ..utils.permissions import get_user_house_permission, PermissionLevel
 from .websocket import RealtimeHandler
 from .base import BaseAPIHandler
@@ -31,30 +34,28 @@ class UserPositionHandler(BaseAPIHandler):
                 self.write_error_json("Access denied", 403)
                 return
 
-            # Get all active positions for this house
-            query = (
-                select(UserPosition, User)
-                .join(User, UserPosition.user_id == User.id)
-                .where(
-                    and_(
-                        UserPosition.house_id == house_id,
-                        UserPosition.is_active == True,  # noqa: E712
+            # Positions actives en mémoire (pas de lecture de user_positions)
+            live = dict(await LivePositions.house(session, house_id))
+            users = {}
+            if live:
+                result = await session.execute(
+                    select(User.id, User.username, User.profile_image).where(
+                        User.id.in_(list(live))
                     )
                 )
-            )
-            result = await session.execute(query)
-            rows = result.all()
+                users = {row.id: row for row in result.all()}
 
             positions = [
                 {
-                    "user_id": position.user_id,
-                    "username": user.username,
-                    "profile_image": user.profile_image,
+                    "user_id": position_user_id,
+                    "username": users[position_user_id].username,
+                    "profile_image": users[position_user_id].profile_image,
                     "x": position.x,
                     "y": position.y,
                     "last_update": position.last_update.isoformat(),
                 }
-                for position, user in rows
+                for position_user_id, position in live.items()
+                if position_user_id in users
             ]
 
             self.write({"positions": positions})
@@ -93,9 +94,10 @@ class UserPositionHandler(BaseAPIHandler):
 
             # Validate position within grid bounds
             # (use actual grid size, not house.width/length)
-            if house.grid:
-                grid_height = len(house.grid)
-                grid_width = len(house.grid[0]) if grid_height > 0 else 0
+            index = get_grid_index(house)
+            if index.rows:
+                grid_height = index.rows
+                grid_width = index.cols
             else:
                 grid_height = house.length  # type: ignore
                 grid_width = house.width  # type: ignore
@@ -106,27 +108,8 @@ class UserPositionHandler(BaseAPIHandler):
                 )
                 return
 
-            # Check if position exists for this user/house
-            query = select(UserPosition).where(
-                and_(UserPosition.house_id == house_id, UserPosition.user_id == user_id)
-            )
-            result = await session.execute(query)
-            position = result.scalar_one_or_none()
-
-            if position:
-                # Update existing position
-                position.x = x  # type: ignore
-                position.y = y  # type: ignore
-                position.is_active = True  # type: ignore
-                position.last_update = datetime.utcnow()  # type: ignore
-            else:
-                # Create new position
-                position = UserPosition(
-                    house_id=house_id, user_id=user_id, x=x, y=y, is_active=True
-                )
-                session.add(position)
-
-            await session.commit()
+            # Position en mémoire, écrite en base périodiquement
+            await LivePositions.update_many(session, house_id, {user_id: (x, y)})
 
             # Get user info for broadcast
             user = await session.get(User, user_id)
@@ -136,7 +119,7 @@ class UserPositionHandler(BaseAPIHandler):
 
             # DÉTECTION AUTOMATIQUE DE PRÉSENCE
             # Trouver la pièce où se trouve l'utilisateur
-            await self._update_presence_sensors(session, house, x, y, house_id)
+            await self._update_presence_sensors(session, house, x, y, user_id)
             await session.commit()
 
             # Broadcast position update via WebSocket
@@ -187,15 +170,11 @@ class UserPositionHandler(BaseAPIHandler):
                 self.write_error_json("Access denied", 403)
                 return
 
-            # Find and deactivate position
-            query = select(UserPosition).where(
-                and_(UserPosition.house_id == house_id, UserPosition.user_id == user_id)
-            )
-            result = await session.execute(query)
-            position = result.scalar_one_or_none()
-
-            if position:
-                position.is_active = False  # type: ignore
+            # Retirer la position; le départ est écrit tout de suite
+            live = await LivePositions.house(session, house_id)
+            if user_id in live:
+                await LivePositions.update_many(session, house_id, {user_id: None})
+                await LivePositions.persist(session, house_id)
                 await session.commit()
 
                 # Broadcast deactivation
@@ -217,79 +196,14 @@ class UserPositionHandler(BaseAPIHandler):
 
             self.write({"success": True})
 
-    async def _update_presence_sensors(self, session, house, x, y, house_id):
+    async def _update_presence_sensors(self, session, house, x, y, user_id):
         """
         Met à jour automatiquement les capteurs de présence
         en fonction de la position de l'utilisateur.
-        Détecte la présence sur les CASES où sont placés les capteurs.
+        Seuls les capteurs des cases quittée et atteinte sont réévalués.
         """
-        # Retrieve toutes les positions actives dans cette maison
-        query = select(UserPosition).where(
-            and_(
-                UserPosition.house_id == house_id,
-                UserPosition.is_active == True,  # noqa: E712
-            )
-        )
-        result = await session.execute(query)
-        all_positions = result.scalars().all()
-
-        # Grouper les positions par cellule
-        users_per_cell = {}
-        for pos in all_positions:
-            cell_key = (pos.x, pos.y)
-            if cell_key not in users_per_cell:
-                users_per_cell[cell_key] = 0
-            users_per_cell[cell_key] += 1
-
-        # Retrieve tous les capteurs de présence
-        query = select(Sensor).where(
-            and_(Sensor.house_id == house_id, Sensor.type == "presence")
-        )
-        result = await session.execute(query)
-        presence_sensors = result.scalars().all()
-
-        # Pour chaque capteur, compter les utilisateurs sur ses cases
-        if house.grid:
-            for sensor in presence_sensors:
-                # Trouver toutes les cases où ce capteur est placé
-                sensor_cells = []
-                for row_idx, row in enumerate(house.grid):
-                    for col_idx, cell in enumerate(row):
-                        # Check if le capteur est dans cette cellule
-                        if isinstance(cell, dict):
-                            cell_sensors = cell.get("sensors", [])
-                            if sensor.id in cell_sensors:
-                                sensor_cells.append((col_idx, row_idx))
-
-                # Compter les utilisateurs sur ces cases
-                user_count = 0
-                for cell_pos in sensor_cells:
-                    user_count += users_per_cell.get(cell_pos, 0)
-
-                # Mettre à jour la valeur du capteur
-                new_value = 1.0 if user_count > 0 else 0.0
-
-                # Mettre à jour uniquement si changement
-                if sensor.value != new_value:
-                    old_value = sensor.value
-                    sensor.value = new_value
-                    sensor.last_update = datetime.utcnow()
-
-                    print(
-                        f"[Presence] Sensor {sensor.id} ({sensor.name}) "
-                        f"on {len(sensor_cells)} cell(s): "
-                        f"{old_value} → {new_value} "
-                        f"({user_count} user(s) detected)"
-                    )
-
-                    # Broadcaster la mise à jour du capteur via WebSocket
-                    # WEBSOCKET BROADCAST: Diffusion temps réel aux clients WebSocket
-                    RealtimeHandler.broadcast_sensor_update(
-                        sensor.id, sensor.value, sensor.is_active, sensor.house_id
-                    )
-
-                    # Déclencher les règles d'automatisation pour ce capteur
-                    await self._trigger_automation_for_sensor(session, sensor)
+        flips = await PresenceTracker.move(session, house, user_id, x, y)
+        await apply_presence_flips(session, flips)
 
     async def _update_presence_sensors_on_leave(
         self, session, house_id, leaving_user_id
@@ -303,154 +217,5 @@ class UserPositionHandler(BaseAPIHandler):
         if not house:
             return
 
-        # Retrieve toutes les positions actives restantes
-        query = select(UserPosition).where(
-            and_(
-                UserPosition.house_id == house_id,
-                UserPosition.is_active == True,  # noqa: E712
-                UserPosition.user_id != leaving_user_id,
-            )
-        )
-        result = await session.execute(query)
-        remaining_positions = result.scalars().all()
-
-        # Grouper par cellule
-        users_per_cell = {}
-        for pos in remaining_positions:
-            cell_key = (pos.x, pos.y)
-            if cell_key not in users_per_cell:
-                users_per_cell[cell_key] = 0
-            users_per_cell[cell_key] += 1
-
-        # Retrieve tous les capteurs de présence
-        query = select(Sensor).where(
-            and_(Sensor.house_id == house_id, Sensor.type == "presence")
-        )
-        result = await session.execute(query)
-        presence_sensors = result.scalars().all()
-
-        # Pour chaque capteur, compter les utilisateurs sur ses cases
-        if house.grid:
-            for sensor in presence_sensors:
-                # Trouver toutes les cases où ce capteur est placé
-                sensor_cells = []
-                for row_idx, row in enumerate(house.grid):
-                    for col_idx, cell in enumerate(row):
-                        if isinstance(cell, dict):
-                            cell_sensors = cell.get("sensors", [])
-                            if sensor.id in cell_sensors:
-                                sensor_cells.append((col_idx, row_idx))
-
-                # Compter les utilisateurs sur ces cases
-                user_count = 0
-                for cell_pos in sensor_cells:
-                    user_count += users_per_cell.get(cell_pos, 0)
-
-                # Mettre à jour la valeur
-                new_value = 1.0 if user_count > 0 else 0.0
-
-                if sensor.value != new_value:
-                    sensor.value = new_value
-                    sensor.last_update = datetime.utcnow()
-
-                    print(
-                        f"[Presence] Sensor {sensor.id} updated "
-                        f"after user left: {new_value}"
-                    )
-
-                    # Broadcaster
-                    # WEBSOCKET BROADCAST: Diffusion temps réel aux clients WebSocket
-                    RealtimeHandler.broadcast_sensor_update(
-                        sensor.id, sensor.value, sensor.is_active, sensor.house_id
-                    )
-
-                    # Déclencher automatisations
-                    await self._trigger_automation_for_sensor(session, sensor)
-
-    async def _trigger_automation_for_sensor(self, session, sensor):
-        """
-        Déclenche les règles d'automatisation liées à un capteur spécifique.
-        """
-        from ..models import Equipment, EventHistory
-
-        # Retrieve les règles actives pour ce capteur
-        query = select(AutomationRule).where(
-            and_(
-                AutomationRule.sensor_id == sensor.id,
-                AutomationRule.is_active == True,  # noqa: E712
-            )
-        )
-        result = await session.execute(query)
-        rules = result.scalars().all()
-
-        for rule in rules:
-            # Évaluer la condition
-            condition_met = False
-            if sensor.value is not None:
-                if rule.condition_operator == ">":
-                    condition_met = sensor.value > rule.condition_value
-                elif rule.condition_operator == "<":
-                    condition_met = sensor.value < rule.condition_value
-                elif rule.condition_operator == ">=":
-                    condition_met = sensor.value >= rule.condition_value
-                elif rule.condition_operator == "<=":
-                    condition_met = sensor.value <= rule.condition_value
-                elif rule.condition_operator == "==":
-                    condition_met = sensor.value == rule.condition_value
-                elif rule.condition_operator == "!=":
-                    condition_met = sensor.value != rule.condition_value
-
-            if condition_met:
-                # Appliquer l'action
-                equipment = await session.get(Equipment, rule.equipment_id)
-                if equipment and equipment.is_active:
-                    if equipment.state != rule.action_state:
-                        old_state = equipment.state
-                        equipment.state = rule.action_state
-                        equipment.last_update = datetime.utcnow()
-                        rule.last_triggered = datetime.utcnow()
-
-                        print(
-                            f"[Automation] Rule '{rule.name}' triggered: "
-                            f"{equipment.name} {old_state} → "
-                            f"{rule.action_state}"
-                        )
-
-                        # Enregistrer dans l'historique
-                        event = EventHistory(
-                            house_id=equipment.house_id,
-                            user_id=None,
-                            event_type="automation_triggered",
-                            entity_type="automation_rule",
-                            entity_id=rule.id,
-                            description=(
-                                f"Règle '{rule.name}' déclenchée: "
-                                f"{equipment.name} {old_state} → "
-                                f"{rule.action_state}"
-                            ),
-                            event_metadata={
-                                "rule_name": rule.name,
-                                "sensor_id": sensor.id,
-                                "sensor_name": sensor.name,
-                                "sensor_value": sensor.value,
-                                "condition": (
-                                    f"{rule.condition_operator} "
-                                    f"{rule.condition_value}"
-                                ),
-                                "equipment_id": equipment.id,
-                                "equipment_name": equipment.name,
-                                "old_state": old_state,
-                                "new_state": rule.action_state,
-                            },
-                        )
-                        session.add(event)
-
-                        # Broadcaster la mise à jour de l'équipement
-                        # WEBSOCKET BROADCAST: Diffusion temps réel aux clients WebSocket
-                        RealtimeHandler.broadcast_equipment_update(
-                            equipment.id,
-                            equipment.type,
-                            equipment.state,
-                            equipment.is_active,
-                            equipment.house_id,
-                        )
+        flips = await PresenceTracker.leave(session, house, leaving_user_id)
+        await apply_presence_flips(session, flips)
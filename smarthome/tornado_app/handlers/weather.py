@@ -10,6 +10,52 @@ from ..services.weather_service import WeatherService
 from .base import BaseAPIHandler
 
 
+async def weather_for_address(address):
+    """
+    Météo courante de la ville d'une adresse (géocodage puis prévision).
+
+    Returns:
+        dict météo avec "location", ou None si la prévision est indisponible
+
+    Raises:
+        ValueError: adresse impossible à géocoder
+    """
+    # Extract city name from address
+    # Ex: "Campus, 97157 Pointe-à-Pitre, Guadeloupe"
+    # -> "Pointe-à-Pitre"
+    address_parts = address.split(",")
+    # By default, use the complete address
+    city_name = address
+
+    # Find the part containing a city
+    # (usually before country)
+    if len(address_parts) >= 2:
+        # Take the second-to-last part
+        city_name = address_parts[-2].strip()
+        # Enlever les codes postaux
+        city_name = re.sub(r"\b\d{5}\b", "", city_name).strip()
+
+    # Get coordinates
+    coords = await WeatherService.get_coordinates(city_name)
+    if not coords:
+        raise ValueError(f"Could not geocode address: {city_name}")
+
+    # Get weather
+    weather = await WeatherService.get_weather(coords["latitude"], coords["longitude"])
+    if not weather:
+        return None
+
+    # Add location
+    weather["location"] = {
+        "city": coords.get("name", ""),
+        "admin1": coords.get("admin1", ""),
+        "country_code": coords.get("country_code", ""),
+        "latitude": coords["latitude"],
+        "longitude": coords["longitude"],
+    }
+    return weather
+
+
 class WeatherHandler(BaseAPIHandler):
     """GET /api/weather/{house_id} - Get weather for a house."""
 
@@ -27,47 +73,15 @@ class WeatherHandler(BaseAPIHandler):
                 self.write_error_json("No address defined for this house", 400)
                 return
 
-            # Extract city name from address
-            # Ex: "Campus, 97157 Pointe-à-Pitre, Guadeloupe"
-            # -> "Pointe-à-Pitre"
-            address_parts = house.address.split(",")
-            # By default, use the complete address
-            city_name = house.address
-
-            # Find the part containing a city
-            # (usually before country)
-            if len(address_parts) >= 2:
-                # Take the second-to-last part
-                if len(address_parts) >= 2:
-                    city_name = address_parts[-2].strip()
-                else:
-                    city_name = address_parts[-1].strip()
-                # Enlever les codes postaux
-                city_name = re.sub(r"\b\d{5}\b", "", city_name).strip()
-
-            # Get coordinates
-            coords = await WeatherService.get_coordinates(city_name)
-            if not coords:
-                self.write_error_json(f"Could not geocode address: {city_name}", 400)
+            try:
+                weather = await weather_for_address(house.address)
+            except ValueError as e:
+                self.write_error_json(str(e), 400)
                 return
-
-            # Get weather
-            weather = await WeatherService.get_weather(
-                coords["latitude"], coords["longitude"]
-            )
             if not weather:
                 self.write_error_json("Could not fetch weather data", 500)
                 return
 
-            # Add location
-            weather["location"] = {
-                "city": coords.get("name", ""),
-                "admin1": coords.get("admin1", ""),
-                "country_code": coords.get("country_code", ""),
-                "latitude": coords["latitude"],
-                "longitude": coords["longitude"],
-            }
-
             self.write_json(weather)
 
 
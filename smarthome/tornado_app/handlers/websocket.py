@@ -6,6 +6,12 @@ import json
 import tornado.websocket
 from typing import Set
 
+from ..database import async_session_maker
+from ..services.position_stream import PositionStream
+from ..utils.grid_layers import GRID_FORMAT_FULL, GRID_FORMATS, encode_grid
+from ..utils.grid_tiles import changes_by_tile, tiles_in_viewport
+from ..utils.permissions import get_user_house_permission, PermissionLevel
+
 
 class RealtimeHandler(tornado.websocket.WebSocketHandler):
     """
@@ -32,24 +38,98 @@ class RealtimeHandler(tornado.websocket.WebSocketHandler):
             return
 
         self.user_id = user_id
+        # Format des grilles diffusées (/ws/realtime?grid_format=rle)
+        self.grid_format = self.get_argument("grid_format", GRID_FORMAT_FULL)
+        if self.grid_format not in GRID_FORMATS:
+            self.grid_format = GRID_FORMAT_FULL
+        # Maisons dans lesquelles ce client envoie des positions (accès vérifié)
+        self.position_houses = set()
+        # house_id -> zone de grille affichée (row0, col0, row1, col1)
+        self.grid_viewports = {}
         RealtimeHandler.clients.add(self)
         print(
             f"[WebSocket] Client connecté (user_id={user_id}). "
             f"Total clients: {len(RealtimeHandler.clients)}"
         )
 
-    def on_message(self, message):
-        """Message reçu du client (optionnel, pour ping/pong)"""
+    async def on_message(self, message):
+        """Message reçu du client (ping/pong, positions)"""
         try:
             data = json.loads(message)
-            if data.get("type") == "ping":
-                self.write_message(json.dumps({"type": "pong"}))
         except json.JSONDecodeError:
-            pass
+            return
+
+        msg_type = data.get("type")
+        if msg_type == "ping":
+            self.write_message(json.dumps({"type": "pong"}))
+        elif msg_type in ("position", "position_leave"):
+            await self._on_position(data)
+        elif msg_type == "grid_viewport":
+            await self._on_grid_viewport(data)
+
+    async def _on_position(self, data):
+        """
+        Position envoyée par le client: mise en attente, traitée au
+        prochain tick avec les autres positions de la maison.
+        """
+        try:
+            house_id = int(data["house_id"])
+            if data["type"] == "position":
+                x, y = int(data["x"]), int(data["y"])
+        except (KeyError, TypeError, ValueError):
+            self.write_message(json.dumps({"type": "error", "message": "Invalid data"}))
+            return
+
+        if house_id not in self.position_houses:
+            # DATABASE QUERY: Vérifier l'accès à la maison (une fois par connexion)
+            async with async_session_maker() as session:
+                perm = await get_user_house_permission(session, self.user_id, house_id)
+            if perm == PermissionLevel.NONE:
+                self.write_message(json.dumps({"type": "error", "message": "Access denied"}))
+                return
+            self.position_houses.add(house_id)
+
+        if data["type"] == "position":
+            PositionStream.submit(house_id, self.user_id, x, y)
+        else:
+            PositionStream.leave(house_id, self.user_id)
+            self.position_houses.discard(house_id)
+
+    async def _on_grid_viewport(self, data):
+        """
+        Zone de la grille affichée par le client: il ne reçoit plus que les
+        modifications qui y tombent, regroupées par tuile. viewport null
+        rétablit les messages de grille complets.
+        """
+        try:
+            house_id = int(data["house_id"])
+            viewport = data.get("viewport")
+            if viewport is not None:
+                row, col = int(viewport["row"]), int(viewport["col"])
+                rows, cols = int(viewport["rows"]), int(viewport["cols"])
+        except (KeyError, TypeError, ValueError):
+            self.write_message(json.dumps({"type": "error", "message": "Invalid data"}))
+            return
+
+        if viewport is None:
+            self.grid_viewports.pop(house_id, None)
+            return
+
+        if house_id not in self.grid_viewports:
+            # DATABASE QUERY: Vérifier l'accès à la maison (à l'abonnement)
+            async with async_session_maker() as session:
+                perm = await get_user_house_permission(session, self.user_id, house_id)
+            if perm == PermissionLevel.NONE:
+                self.write_message(json.dumps({"type": "error", "message": "Access denied"}))
+                return
+        self.grid_viewports[house_id] = (row, col, row + rows, col + cols)
 
     def on_close(self):
         """Connexion fermée"""
         RealtimeHandler.clients.discard(self)
+        # Les positions envoyées par ce client ne sont plus actives
+        for house_id in getattr(self, "position_houses", ()):
+            PositionStream.leave(house_id, self.user_id)
         print(
             f"[WebSocket] Client déconnecté. "
             f"Total clients: {len(RealtimeHandler.clients)}"
@@ -141,20 +221,22 @@ class RealtimeHandler(tornado.websocket.WebSocketHandler):
             cls.clients.discard(client)
 
     @classmethod
-    def broadcast_grid_update(cls, house_id: int, grid: list):
+    def broadcast_equipment_batch_update(cls, house_id: int, equipments: list):
         """
-        Diffuser une mise à jour de la grille (plan) à tous les clients connectés
+        Diffuser en un seul message les équipements modifiés par une
+        évaluation d'automatisation (liste de {id, type, state, is_active})
         """
         message = json.dumps(
             {
-                "type": "grid_update",
+                "type": "equipment_batch_update",
                 "house_id": house_id,
-                "data": {"grid": grid},
+                "data": {"equipments": equipments},
             }
         )
 
         print(
-            f"[WebSocket] Broadcasting grid update: house_id={house_id}"
+            f"[WebSocket] Broadcasting equipment batch update: "
+            f"house_id={house_id}, count={len(equipments)}"
         )
         dead_clients = set()
 
@@ -169,6 +251,135 @@ class RealtimeHandler(tornado.websocket.WebSocketHandler):
         for client in dead_clients:
             cls.clients.discard(client)
 
+    @classmethod
+    def broadcast_positions_batch(cls, house_id: int, positions: list, left: list):
+        """
+        Diffuser en un seul message les positions d'une maison traitées
+        pendant un tick (déplacements et départs)
+        """
+        message = json.dumps(
+            {
+                "type": "user_positions_batch",
+                "house_id": house_id,
+                "data": {"positions": positions, "left": left},
+            }
+        )
+        dead_clients = set()
+
+        for client in cls.clients:
+            try:
+                client.write_message(message)
+            except Exception as e:
+                print(f"[WebSocket] Error sending to client: {e}")
+                dead_clients.add(client)
+
+        # Nettoyer les clients morts
+        for client in dead_clients:
+            cls.clients.discard(client)
+
+    @classmethod
+    def broadcast_grid_update(cls, house_id: int, grid: list, grid_version=None):
+        """
+        Diffuser une mise à jour de la grille (plan) à tous les clients connectés,
+        chacun dans le format de grille demandé à la connexion
+        """
+        # Un message par format, encodé seulement si un client le demande
+        messages = {}
+
+        print(
+            f"[WebSocket] Broadcasting grid update: house_id={house_id}"
+        )
+        dead_clients = set()
+
+        rows = len(grid) if grid else 0
+        cols = len(grid[0]) if rows else 0
+
+        for client in cls.clients:
+            viewport = getattr(client, "grid_viewports", {}).get(house_id)
+            if viewport is not None:
+                # Client en mode tuiles: tuiles visibles à recharger (ETag)
+                row0, col0, row1, col1 = viewport
+                message = json.dumps(
+                    {
+                        "type": "grid_tile_update",
+                        "house_id": house_id,
+                        "data": {
+                            "grid_version": grid_version,
+                            "tiles": tiles_in_viewport(
+                                (row0, col0, min(row1, rows), min(col1, cols))
+                            ),
+                        },
+                    }
+                )
+                try:
+                    client.write_message(message)
+                except Exception as e:
+                    print(f"[WebSocket] Error sending to client: {e}")
+                    dead_clients.add(client)
+                continue
+
+            grid_format = getattr(client, "grid_format", GRID_FORMAT_FULL)
+            if grid_format not in messages:
+                messages[grid_format] = json.dumps(
+                    {
+                        "type": "grid_update",
+                        "house_id": house_id,
+                        "data": {
+                            "grid": encode_grid(grid, grid_format),
+                            "grid_version": grid_version,
+                        },
+                    }
+                )
+            try:
+                client.write_message(messages[grid_format])
+            except Exception as e:
+                print(f"[WebSocket] Error sending to client: {e}")
+                dead_clients.add(client)
+
+        # Nettoyer les clients morts
+        for client in dead_clients:
+            cls.clients.discard(client)
+
+    @classmethod
+    def broadcast_grid_patch(cls, house_id: int, grid_version: int, changes: list):
+        """
+        Diffuser uniquement les cases modifiées de la grille et la nouvelle
+        version (PATCH /api/houses/{id}/grid). Les clients abonnés à une zone
+        ne reçoivent que les cases de cette zone, par tuile.
+        """
+        message = json.dumps(
+            {
+                "type": "grid_patch",
+                "house_id": house_id,
+                "data": {"grid_version": grid_version, "changes": changes},
+            }
+        )
+        dead_clients = set()
+
+        for client in cls.clients:
+            viewport = getattr(client, "grid_viewports", {}).get(house_id)
+            payload = message
+            if viewport is not None:
+                tiles = changes_by_tile(changes, viewport)
+                if not tiles:
+                    continue
+                payload = json.dumps(
+                    {
+                        "type": "grid_tile_patch",
+                        "house_id": house_id,
+                        "data": {"grid_version": grid_version, "tiles": tiles},
+                    }
+                )
+            try:
+                client.write_message(payload)
+            except Exception as e:
+                print(f"[WebSocket] Error sending to client: {e}")
+                dead_clients.add(client)
+
+        # Nettoyer les clients morts
+        for client in dead_clients:
+            cls.clients.discard(client)
+
     @classmethod
     def broadcast_equipment_crud(cls, action: str, equipment_data: dict, house_id: int):
         """
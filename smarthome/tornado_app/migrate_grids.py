@@ -0,0 +1,232 @@
+"""
+Migration hors ligne des grilles legacy (tableaux d'entiers) vers le
+format en couches.
+
+    python -m smarthome.tornado_app.migrate_grids [--batch-size 200] [--dry-run]
+    python -m smarthome.tornado_app.migrate_grids --placements
+
+Les maisons legacy sont lues par lots (pagination par id), converties puis
+réécrites avec un UPDATE groupé par lot; chaque lot est validé séparément.
+Une maison convertie ne correspond plus au filtre legacy: relancer la
+commande reprend là où elle s'est arrêtée (--after ID pour forcer un point
+de départ). grid_version est incrémentée et l'UPDATE vérifie la version
+lue, de sorte qu'une modification concurrente n'est jamais écrasée.
+
+Une fois toutes les grilles converties, GRID_STRICT_LAYERS=true permet aux
+fonctions de grid_layers d'ignorer les vérifications legacy.
+
+--placements remplit la table cell_placements à partir des couches des
+grilles existantes (à lancer une fois après la création de la table).
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import Integer, column, func, select, update, values
+from sqlalchemy.dialects.postgresql import JSONB
+
+from .database import async_session_maker, engine
+from .models import House
+from .utils.cell_placements import replace_placements
+from .utils.grid_layers import CompactGrid
+
+DEFAULT_BATCH_SIZE = 200
+
+# Grille legacy: la première case est un nombre et non un objet
+LEGACY_FILTER = func.jsonb_typeof(House.grid[0][0]) == "number"
+
+houses = House.__table__
+
+
+def update_grids(params):
+    """
+    UPDATE unique d'un lot (UPDATE ... FROM VALUES), gardé par la version
+    lue; RETURNING donne les maisons réellement écrites (le rowcount d'un
+    executemany n'est pas fiable avec asyncpg).
+    """
+    converted = values(
+        column("house_id", Integer),
+        column("old_version", Integer),
+        column("new_grid", JSONB),
+        column("new_version", Integer),
+        name="converted",
+    ).data(
+        [
+            (p["house_id"], p["old_version"], p["new_grid"], p["new_version"])
+            for p in params
+        ]
+    )
+    return (
+        update(houses)
+        .where(
+            houses.c.id == converted.c.house_id,
+            houses.c.grid_version == converted.c.old_version,
+        )
+        .values(grid=converted.c.new_grid, grid_version=converted.c.new_version)
+        .returning(houses.c.id)
+    )
+
+
+async def count_legacy(session, after: int = 0) -> int:
+    return await session.scalar(
+        select(func.count()).select_from(House).where(LEGACY_FILTER, House.id > after)
+    )
+
+
+async def migrate(batch_size: int = DEFAULT_BATCH_SIZE, after: int = 0, dry_run=False):
+    """Convertir toutes les grilles legacy; retourne le nombre de maisons écrites."""
+    async with async_session_maker() as session:
+        total = await count_legacy(session, after)
+    print(f"[Grids] {total} grille(s) legacy à convertir")
+    if not total:
+        return 0
+
+    done = 0
+    failed = 0
+    conflicts = 0
+    started = time.monotonic()
+    last_id = after
+    while True:
+        # DATABASE QUERY: un lot de maisons legacy, par id croissant
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(House.id, House.grid, House.grid_version)
+                .where(LEGACY_FILTER, House.id > last_id)
+                .order_by(House.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+
+            params = []
+            for house_id, grid, version in rows:
+                try:
+                    layers = CompactGrid.from_json(grid).to_layers()
+                except ValueError as e:
+                    failed += 1
+                    print(f"[Grids] Maison {house_id} ignorée: {e}")
+                    continue
+                params.append(
+                    {
+                        "house_id": house_id,
+                        "old_version": version,
+                        "new_grid": layers,
+                        "new_version": (version or 0) + 1,
+                    }
+                )
+
+            written = len(params)
+            if params and not dry_run:
+                # Un seul UPDATE pour tout le lot
+                result = await session.execute(update_grids(params))
+                written_ids = set(result.scalars().all())
+                await session.commit()
+                written = len(written_ids)
+                skipped = [
+                    p["house_id"] for p in params if p["house_id"] not in written_ids
+                ]
+                if skipped:
+                    conflicts += len(skipped)
+                    print(
+                        f"[Grids] Modifiées pendant la migration (ignorées): "
+                        f"{', '.join(map(str, skipped))}"
+                    )
+
+        done += written
+        last_id = rows[-1][0]
+        seen = done + failed + conflicts
+        elapsed = time.monotonic() - started
+        print(
+            f"[Grids] {seen}/{total} "
+            f"({100 * seen // total}%) - dernier id {last_id} - "
+            f"{done / elapsed if elapsed else 0:.0f} maisons/s"
+        )
+
+    action = "à convertir (dry-run)" if dry_run else "converties"
+    print(
+        f"[Grids] {done} grille(s) {action}, {failed} en erreur, "
+        f"{conflicts} modifiée(s) pendant la migration"
+    )
+    if conflicts:
+        print("[Grids] Relancer la commande pour traiter les grilles ignorées")
+    if not dry_run and not failed:
+        async with async_session_maker() as session:
+            if not await count_legacy(session):
+                print("[Grids] Plus aucune grille legacy: GRID_STRICT_LAYERS=true possible")
+    return done
+
+
+async def backfill_placements(batch_size: int = DEFAULT_BATCH_SIZE, after: int = 0):
+    """Reconstruire cell_placements depuis les grilles en couches."""
+    layered = func.jsonb_typeof(House.grid[0][0]) == "object"
+    async with async_session_maker() as session:
+        total = await session.scalar(
+            select(func.count()).select_from(House).where(layered, House.id > after)
+        )
+    print(f"[Placements] {total} maison(s) à traiter")
+
+    done = 0
+    last_id = after
+    while True:
+        # DATABASE QUERY: un lot de grilles en couches, par id croissant
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(House.id, House.grid)
+                .where(layered, House.id > last_id)
+                .order_by(House.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            for house_id, grid in rows:
+                try:
+                    compact = CompactGrid.from_json(grid)
+                except ValueError as e:
+                    print(f"[Placements] Maison {house_id} ignorée: {e}")
+                    continue
+                # Grilles anciennes: peuvent citer des ids supprimés
+                await replace_placements(
+                    session, house_id, compact, skip_unknown=True
+                )
+            await session.commit()
+
+        done += len(rows)
+        last_id = rows[-1][0]
+        print(f"[Placements] {done}/{total} - dernier id {last_id}")
+    return done
+
+
+async def main_async(args):
+    try:
+        if args.placements:
+            await backfill_placements(args.batch_size, args.after)
+            return
+        await migrate(args.batch_size, args.after, args.dry_run)
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convertir les grilles legacy au format en couches"
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument(
+        "--after", type=int, default=0, help="reprendre après cet id de maison"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="convertir sans écrire en base"
+    )
+    parser.add_argument(
+        "--placements",
+        action="store_true",
+        help="remplir cell_placements depuis les grilles existantes",
+    )
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
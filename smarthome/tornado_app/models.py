@@ -1,4 +1,14 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    Boolean,
+    ForeignKey,
+    DateTime,
+    Float,
+    Index,
+    CheckConstraint,
+)
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import DeclarativeBase, relationship
 from datetime import datetime
@@ -29,6 +39,8 @@ class House(Base):
     length = Column(Integer, nullable=False)
     width = Column(Integer, nullable=False)
     grid = Column(JSONB, nullable=False)
+    # Incrémentée à chaque modification de la grille (caches, index)
+    grid_version = Column(Integer, default=1, server_default="1", nullable=False)
 
     user = relationship("User", back_populates="houses")
     rooms = relationship("Room", back_populates="house", cascade="all, delete-orphan")
@@ -126,23 +138,40 @@ class AutomationRule(Base):
     description = Column(String(500), nullable=True)  # Description
     is_active = Column(Boolean, default=True, nullable=False)
 
-    # Condition (capteur)
-    sensor_id = Column(Integer, ForeignKey("sensors.id"), nullable=False)
-    condition_operator = Column(String(10), nullable=False)
+    # Condition simple (capteur)
+    # NULL si la règle utilise un arbre de conditions (voir AutomationCondition)
+    sensor_id = Column(Integer, ForeignKey("sensors.id"), nullable=True)
+    condition_operator = Column(String(10), nullable=True)
     # Opérateurs: '>', '<', '>=', '<=', '==', '!='
-    condition_value = Column(Float, nullable=False)
+    condition_value = Column(Float, nullable=True)
 
     # Action (équipement)
     equipment_id = Column(Integer, ForeignKey("equipments.id"), nullable=False)
     action_state = Column(String(50), nullable=False)
     # États: 'on', 'off', 'open', 'closed'
 
+    # Anti-rebond (optionnel, None = désactivé)
+    hysteresis = Column(Float, nullable=True)
+    # Largeur de la bande centrée sur condition_value (opérateurs <, <=, >, >=)
+    min_hold_seconds = Column(Integer, nullable=True)
+    # Durée pendant laquelle la condition doit rester vraie avant déclenchement
+    cooldown_seconds = Column(Integer, nullable=True)
+    # Délai minimal entre deux déclenchements de la règle
+    priority = Column(Integer, default=0, server_default="0", nullable=False)
+    # Conflit sur un même équipement: la priorité la plus haute l'emporte
+
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     last_triggered = Column(DateTime, nullable=True)
 
     # Relations
     sensor = relationship("Sensor")
     equipment = relationship("Equipment")
+    conditions = relationship(
+        "AutomationCondition",
+        back_populates="rule",
+        cascade="all, delete-orphan",
+        order_by="AutomationCondition.position",
+    )
 
 
 # 6
@@ -173,16 +202,20 @@ class EventHistory(Base):
     """Event History model - journalisation des événements."""
 
     __tablename__ = "event_history"
+    __table_args__ = (
+        # Dernier événement d'une maison (version des snapshots), rattrapage
+        Index("ix_event_history_house_id", "house_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     house_id = Column(Integer, ForeignKey("houses.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     event_type = Column(String(50), nullable=False)
     # Types: 'equipment_control', 'sensor_reading', 'member_action',
-    #        'automation_triggered', 'house_modified'
+    #        'automation_triggered', 'automation_modified', 'house_modified'
     entity_type = Column(String(50), nullable=True)
     # Types: 'equipment', 'sensor', 'member', 'automation_rule',
-    #        'house', 'room'
+    #        'automation_schedule', 'house', 'room'
     entity_id = Column(Integer, nullable=True)
     description = Column(String, nullable=False)
     event_metadata = Column(JSONB, nullable=True)
@@ -212,3 +245,131 @@ class UserPosition(Base):
     # Relations
     house = relationship("House")
     user = relationship("User")
+
+
+# 9
+class AutomationCondition(Base):
+    """Automation Condition model - noeud d'un arbre de conditions ET/OU.
+
+    Les noeuds 'and'/'or' combinent leurs enfants, les noeuds 'leaf'
+    comparent la valeur d'un capteur à un seuil.
+    """
+
+    __tablename__ = "automation_conditions"
+
+    id = Column(Integer, primary_key=True)
+    rule_id = Column(
+        Integer, ForeignKey("automation_rules.id", ondelete="CASCADE"), nullable=False
+    )
+    parent_id = Column(
+        Integer, ForeignKey("automation_conditions.id", ondelete="CASCADE"), nullable=True
+    )
+    node_type = Column(String(10), nullable=False)
+    # Types: 'and', 'or', 'leaf'
+    sensor_id = Column(Integer, ForeignKey("sensors.id"), nullable=True)
+    operator = Column(String(10), nullable=True)
+    value = Column(Float, nullable=True)
+    position = Column(Integer, default=0, nullable=False)  # Ordre parmi les frères
+
+    # Relations
+    rule = relationship("AutomationRule", back_populates="conditions")
+    parent = relationship("AutomationCondition", remote_side=[id])
+
+
+# 10
+class AutomationSchedule(Base):
+    """Automation Schedule model - déclencheurs horaires et temporisés.
+
+    - 'cron': action à heure fixe (expression cron, heure locale du serveur)
+    - 'delay': action N secondes après que la condition capteur devient vraie
+      (annulée si la condition redevient fausse avant l'échéance)
+    """
+
+    __tablename__ = "automation_schedules"
+
+    id = Column(Integer, primary_key=True)
+    house_id = Column(Integer, ForeignKey("houses.id"), nullable=False)
+    name = Column(String(200), nullable=False)
+    is_active = Column(Boolean, default=True, nullable=False)
+    trigger_type = Column(String(10), nullable=False)
+    # Types: 'cron', 'delay'
+
+    # Déclencheur 'cron': "minute heure jour mois jour_semaine"
+    cron_expression = Column(String(100), nullable=True)
+
+    # Déclencheur 'delay'
+    sensor_id = Column(Integer, ForeignKey("sensors.id"), nullable=True)
+    condition_operator = Column(String(10), nullable=True)
+    condition_value = Column(Float, nullable=True)
+    delay_seconds = Column(Integer, nullable=True)
+
+    # Action (équipement)
+    equipment_id = Column(Integer, ForeignKey("equipments.id"), nullable=False)
+    action_state = Column(String(50), nullable=False)
+
+    # Échéance en attente (UTC), persistée pour survivre aux redémarrages
+    next_run_at = Column(DateTime, nullable=True)
+    last_run_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Relations
+    sensor = relationship("Sensor")
+    equipment = relationship("Equipment")
+
+
+# 11
+class PositionVisit(Base):
+    """Position Visit model - historique des cases occupées.
+
+    Une ligne par séjour d'un utilisateur sur une case (entrée, sortie).
+    Écrites par lots avec les positions en direct (voir LivePositions).
+    """
+
+    __tablename__ = "position_visits"
+    __table_args__ = (
+        Index("ix_position_visits_house_entered", "house_id", "entered_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    house_id = Column(
+        Integer, ForeignKey("houses.id", ondelete="CASCADE"), nullable=False
+    )
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    x = Column(Integer, nullable=False)
+    y = Column(Integer, nullable=False)
+    entered_at = Column(DateTime, nullable=False)
+    left_at = Column(DateTime, nullable=False)
+
+
+# 12
+class CellPlacement(Base):
+    """Cell Placement model - cases couvertes par un capteur ou un équipement.
+
+    Copie indexée des couches sensors/equipments de houses.grid, tenue à
+    jour à chaque écriture de la grille (voir utils/cell_placements.py).
+    Une ligne par (case, capteur) ou (case, équipement).
+    """
+
+    __tablename__ = "cell_placements"
+    __table_args__ = (
+        Index("ix_cell_placements_house_cell", "house_id", "row", "col"),
+        Index("ix_cell_placements_sensor", "sensor_id"),
+        Index("ix_cell_placements_equipment", "equipment_id"),
+        CheckConstraint(
+            "(sensor_id IS NULL) <> (equipment_id IS NULL)",
+            name="ck_cell_placements_target",
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    house_id = Column(
+        Integer, ForeignKey("houses.id", ondelete="CASCADE"), nullable=False
+    )
+    row = Column(Integer, nullable=False)
+    col = Column(Integer, nullable=False)
+    sensor_id = Column(
+        Integer, ForeignKey("sensors.id", ondelete="CASCADE"), nullable=True
+    )
+    equipment_id = Column(
+        Integer, ForeignKey("equipments.id", ondelete="CASCADE"), nullable=True
+    )
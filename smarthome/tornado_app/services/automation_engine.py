@@ -0,0 +1,646 @@
+"""
+Moteur d'automatisation: évaluation des règles capteur → équipement.
+
+L'état anti-rebond de chaque règle (hystérésis, temps de maintien,
+cooldown) et les réseaux de conditions composées de chaque maison sont
+conservés en mémoire, par processus.
+
+Les actions d'une évaluation sont regroupées dans un ActionBatch, qui
+arbitre les conflits entre règles visant le même équipement.
+
+Une règle dont la condition est vraie mais qui attend encore (temps de
+maintien, cooldown) est réévaluée par un timer à la fin de l'attente, sans
+attendre une nouvelle lecture de capteur.
+"""
+
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import tornado.ioloop
+from sqlalchemy import select, and_, case, event, insert, update
+from sqlalchemy.orm import selectinload
+
+from ..database import async_session_maker
+from ..models import AutomationRule, Equipment, EventHistory, Sensor
+from .automation_metrics import AutomationMetrics
+from .condition_network import ConditionNetwork, compare, rows_to_tree
+
+# Opérateurs auxquels s'applique la bande d'hystérésis
+ORDERED_OPERATORS = (">", ">=", "<", "<=")
+
+
+class RuleState:
+    """
+    État en mémoire d'une règle.
+
+    - active: condition vraie (après application de l'hystérésis)
+    - since: instant où la condition est devenue vraie
+    - last_fired: dernier déclenchement effectif
+    """
+
+    __slots__ = ("active", "since", "last_fired")
+
+    def __init__(self, last_fired: Optional[datetime] = None):
+        self.active = False
+        self.since: Optional[datetime] = None
+        self.last_fired = last_fired
+
+    def update(self, rule, value: float, now: datetime) -> bool:
+        """
+        Met à jour l'état avec une nouvelle valeur de capteur.
+
+        Avec une hystérésis h, une condition `> T` devient vraie au-dessus
+        de T + h/2 et ne redevient fausse qu'en dessous de T - h/2
+        (symétrique pour `<`). `==` et `!=` ignorent l'hystérésis.
+
+        Returns:
+            True si la condition est vraie depuis au moins min_hold_seconds
+        """
+        threshold = rule.condition_value
+        band = rule.hysteresis or 0
+        if band > 0 and rule.condition_operator in ORDERED_OPERATORS:
+            half = band / 2
+            if rule.condition_operator in (">", ">="):
+                threshold += -half if self.active else half
+            else:
+                threshold += half if self.active else -half
+
+        condition_met = compare(rule.condition_operator, value, threshold)
+        return self.update_condition(rule, condition_met, now)
+
+    def update_condition(self, rule, condition_met: bool, now: datetime) -> bool:
+        """Comme update(), pour une condition déjà évaluée (règle composée)."""
+        if condition_met and not self.active:
+            self.since = now
+        elif not condition_met:
+            self.since = None
+        self.active = condition_met
+
+        if not condition_met:
+            return False
+        hold = rule.min_hold_seconds or 0
+        return now - self.since >= timedelta(seconds=hold)
+
+    def cooling_down(self, rule, now: datetime) -> bool:
+        """True si la règle a été déclenchée il y a moins de cooldown_seconds."""
+        if not rule.cooldown_seconds or self.last_fired is None:
+            return False
+        return now - self.last_fired < timedelta(seconds=rule.cooldown_seconds)
+
+    def ready_at(self, rule) -> Optional[datetime]:
+        """
+        Instant où une condition vraie pourra déclencher (fin du temps de
+        maintien et du cooldown), ou None si la condition est fausse.
+        """
+        if not self.active:
+            return None
+        ready = self.since + timedelta(seconds=rule.min_hold_seconds or 0)
+        if rule.cooldown_seconds and self.last_fired is not None:
+            ready = max(
+                ready, self.last_fired + timedelta(seconds=rule.cooldown_seconds)
+            )
+        return ready
+
+    def should_fire(self, rule, value: float, now: datetime) -> bool:
+        """Condition satisfaite, maintenue assez longtemps et hors cooldown."""
+        ready = self.update(rule, value, now)
+        return ready and not self.cooling_down(rule, now)
+
+    def should_fire_condition(self, rule, condition_met: bool, now: datetime) -> bool:
+        """Comme should_fire(), pour une condition déjà évaluée."""
+        ready = self.update_condition(rule, condition_met, now)
+        return ready and not self.cooling_down(rule, now)
+
+
+class ActionBatch:
+    """
+    Actions proposées pendant une évaluation (un 'tick').
+
+    Les conflits sont résolus par équipement: la priorité la plus haute
+    gagne, puis l'identifiant le plus petit. Les gagnants sont appliqués
+    en une seule UPDATE, l'historique en un INSERT multi-lignes et la
+    diffusion temps réel en un message par maison.
+    """
+
+    # Hors du processus web (workers), les changements écrits sont confiés
+    # à cette fonction (batch, changes) au lieu d'être diffusés
+    publisher: Optional[Callable[["ActionBatch", List[dict]], None]] = None
+
+    def __init__(self, now: datetime, written_at: Optional[float] = None):
+        self.now = now
+        # Horodatage (time.time()) de l'écriture du capteur à l'origine
+        # de l'évaluation, pour la latence bout en bout
+        self.written_at = written_at
+        # equipment_id -> (clé de tri, proposition)
+        self._winners: Dict[int, Tuple[tuple, dict]] = {}
+
+    def __len__(self):
+        return len(self._winners)
+
+    def propose(
+        self,
+        equipment_id: int,
+        new_state: str,
+        priority: int,
+        entity_type: str,
+        entity_id: int,
+        label: str,
+        metadata: dict,
+        info: dict,
+        rule_state: Optional[RuleState] = None,
+    ):
+        """Proposer un état pour un équipement (conservé s'il est prioritaire)."""
+        key = (-(priority or 0), entity_type, entity_id)
+        current = self._winners.get(equipment_id)
+        if current is not None and current[0] <= key:
+            return
+        self._winners[equipment_id] = (
+            key,
+            {
+                "new_state": new_state,
+                "entity_type": entity_type,
+                "entity_id": entity_id,
+                "label": label,
+                "metadata": metadata,
+                "info": info,
+                "rule_state": rule_state,
+            },
+        )
+
+    async def flush(self, session) -> List[dict]:
+        """
+        Appliquer les propositions gagnantes. Elles sont diffusées au commit
+        de `session` (rien si la transaction est annulée).
+
+        Returns:
+            Description des actions effectuées
+        """
+        changes = await self.resolve(session)
+        actions = await self.write(session, changes)
+        if changes:
+            # Diffusion au commit de l'appelant: jamais d'état qui peut
+            # encore être annulé, ni de relecture qui verrait l'ancien
+            event.listen(
+                session.sync_session,
+                "after_commit",
+                lambda _session: self.publish(changes),
+                once=True,
+            )
+        return actions
+
+    async def resolve(self, session) -> List[dict]:
+        """
+        Écarter les propositions sans effet (équipement absent, inactif ou
+        déjà dans l'état voulu) et marquer les règles retenues comme
+        déclenchées. Les équipements lus restent verrouillés (FOR UPDATE)
+        jusqu'à la fin de la transaction: write() doit suivre dans la même.
+
+        Returns:
+            Changements à appliquer (dicts sérialisables, triés par équipement)
+        """
+        if not self._winners:
+            return []
+        winners = self._winners
+        self._winners = {}
+
+        result = await session.execute(
+            select(
+                Equipment.id,
+                Equipment.name,
+                Equipment.type,
+                Equipment.state,
+                Equipment.is_active,
+                Equipment.house_id,
+            )
+            .where(Equipment.id.in_(list(winners)))
+            .order_by(Equipment.id)
+            .with_for_update()
+        )
+        changes = []
+        for equipment in result.all():
+            proposal = winners[equipment.id][1]
+            if not equipment.is_active or equipment.state == proposal["new_state"]:
+                continue
+            rule_state = proposal.pop("rule_state")
+            if rule_state is not None:
+                rule_state.last_fired = self.now
+            changes.append(
+                {
+                    **proposal,
+                    "equipment_id": equipment.id,
+                    "equipment_name": equipment.name,
+                    "equipment_type": equipment.type,
+                    "house_id": equipment.house_id,
+                    "old_state": equipment.state,
+                }
+            )
+        changes.sort(key=lambda change: change["equipment_id"])
+        return changes
+
+    async def write(self, session, changes: List[dict]) -> List[dict]:
+        """
+        Écrire les changements résolus: une UPDATE des équipements et un
+        INSERT multi-lignes dans l'historique.
+
+        Returns:
+            Description des actions effectuées
+        """
+        if not changes:
+            return []
+        now = self.now
+
+        new_states = {c["equipment_id"]: c["new_state"] for c in changes}
+        await session.execute(
+            update(Equipment)
+            .where(Equipment.id.in_(list(new_states)))
+            .values(state=case(new_states, value=Equipment.id), last_update=now)
+            .execution_options(synchronize_session=False)
+        )
+
+        # Enregistrer dans l'historique
+        events = []
+        actions = []
+        rule_ids = []
+        for c in changes:
+            old_state, new_state = c["old_state"], c["new_state"]
+            print(
+                f"[Automation] {c['label']} triggered: "
+                f"{c['equipment_name']} {old_state} → {new_state}"
+            )
+            events.append(
+                {
+                    "house_id": c["house_id"],
+                    "user_id": None,  # Action automatique
+                    "event_type": "automation_triggered",
+                    "entity_type": c["entity_type"],
+                    "entity_id": c["entity_id"],
+                    "description": (
+                        f"{c['label']} déclenchée: "
+                        f"{c['equipment_name']} {old_state} → {new_state}"
+                    ),
+                    "event_metadata": {
+                        **c["metadata"],
+                        "equipment_id": c["equipment_id"],
+                        "equipment_name": c["equipment_name"],
+                        "old_state": old_state,
+                        "new_state": new_state,
+                    },
+                    "created_at": now,
+                }
+            )
+            actions.append(
+                {
+                    "action": f"set_{new_state}",
+                    "equipment_id": c["equipment_id"],
+                    "equipment_name": c["equipment_name"],
+                    **c["info"],
+                }
+            )
+            if c["entity_type"] == "automation_rule":
+                rule_ids.append(c["entity_id"])
+        await session.execute(insert(EventHistory), events)
+
+        if rule_ids:
+            await session.execute(
+                update(AutomationRule)
+                .where(AutomationRule.id.in_(rule_ids))
+                .values(last_triggered=now)
+                .execution_options(synchronize_session=False)
+            )
+        return actions
+
+    def publish(self, changes: List[dict]):
+        """Diffuser les changements écrits (un message par maison) et les compter."""
+        if not changes:
+            return
+        if ActionBatch.publisher is not None:
+            ActionBatch.publisher(self, changes)
+            return
+
+        # WEBSOCKET BROADCAST: un message par maison
+        from ..handlers.websocket import RealtimeHandler
+
+        by_house: Dict[int, list] = {}
+        for c in changes:
+            by_house.setdefault(c["house_id"], []).append(
+                {
+                    "id": c["equipment_id"],
+                    "type": c["equipment_type"],
+                    "state": c["new_state"],
+                    "is_active": True,
+                }
+            )
+        for house_id, items in by_house.items():
+            RealtimeHandler.broadcast_equipment_batch_update(house_id, items)
+
+        for c in changes:
+            if c["entity_type"] == "automation_rule":
+                AutomationMetrics.record_trigger(c["entity_id"])
+        if self.written_at is not None:
+            AutomationMetrics.record_latency(self.written_at)
+
+
+class AutomationEngine:
+    """Évalue les règles actives et applique les actions sur les équipements."""
+
+    # rule_id -> RuleState (état partagé par toutes les requêtes du processus)
+    _states: Dict[int, RuleState] = {}
+    # house_id -> réseau des règles composées de la maison
+    _networks: Dict[int, ConditionNetwork] = {}
+    # Réévaluations programmées (clé: rule_id), voir schedule_recheck()
+    _rechecks = None
+
+    @classmethod
+    def get_state(cls, rule) -> RuleState:
+        state = cls._states.get(rule.id)
+        if state is None:
+            state = RuleState(last_fired=rule.last_triggered)
+            cls._states[rule.id] = state
+        return state
+
+    @classmethod
+    def rechecks(cls):
+        if cls._rechecks is None:
+            from .scheduler import TimerHeap
+
+            cls._rechecks = TimerHeap(cls._on_recheck)
+        return cls._rechecks
+
+    @classmethod
+    def schedule_recheck(cls, rule, state: RuleState):
+        """
+        Condition vraie mais pas encore prête (maintien ou cooldown):
+        réévaluer la règle à la fin de l'attente, même si le capteur ne
+        produit plus de nouvelle lecture.
+        """
+        ready = state.ready_at(rule)
+        if ready is not None:
+            cls.rechecks().schedule(rule.id, ready)
+
+    @classmethod
+    def _on_recheck(cls, rule_id: int):
+        tornado.ioloop.IOLoop.current().add_callback(cls.recheck_rule, rule_id)
+
+    @classmethod
+    async def recheck_rule(cls, rule_id: int):
+        """Réévaluer une règle arrivée à la fin de son attente."""
+        try:
+            # DATABASE QUERY: règle, capteur et équipement visé
+            async with async_session_maker() as session:
+                rule = await session.get(AutomationRule, rule_id)
+                if not rule or not rule.is_active:
+                    return
+                batch = ActionBatch(datetime.utcnow())
+                if rule.sensor_id is not None:
+                    sensor = await session.get(Sensor, rule.sensor_id)
+                    cls.evaluate_rule(rule, sensor, batch)
+                else:
+                    # Règle composée: valeur courante de sa racine
+                    network, _ = await cls._load_network(session, rule.house_id)
+                    cls.evaluate_compound_rule(
+                        rule, network, network.is_true(rule.id), batch
+                    )
+                await batch.flush(session)
+                await session.commit()
+        except Exception as e:
+            print(f"[Automation] Error rechecking rule {rule_id}: {e}")
+
+    @classmethod
+    def reset_rule(cls, rule_id: int, house_id: Optional[int] = None):
+        """Oublier l'état d'une règle (modifiée ou supprimée)."""
+        cls._states.pop(rule_id, None)
+        if cls._rechecks is not None:
+            cls._rechecks.cancel(rule_id)
+        if house_id is not None:
+            cls._networks.pop(house_id, None)
+
+        # L'état de la règle vit dans le worker de sa maison
+        from .automation_workers import AutomationWorkerPool
+
+        if AutomationWorkerPool.enabled():
+            AutomationWorkerPool.reset_rule(rule_id, house_id)
+
+    @classmethod
+    async def _load_network(cls, session, house_id) -> Tuple[ConditionNetwork, Dict[int, bool]]:
+        """
+        Réseau des règles composées d'une maison (construit au premier accès).
+
+        Returns:
+            (réseau, racines devenues vraies/fausses lors de la construction)
+        """
+        network = cls._networks.get(house_id)
+        if network is not None:
+            return network, {}
+
+        result = await session.execute(
+            select(AutomationRule)
+            .options(selectinload(AutomationRule.conditions))
+            .where(
+                and_(
+                    AutomationRule.house_id == house_id,
+                    AutomationRule.is_active == True,  # noqa: E712
+                    AutomationRule.sensor_id.is_(None),
+                )
+            )
+        )
+        network = ConditionNetwork()
+        for rule in result.scalars().all():
+            tree = rows_to_tree(rule.conditions)
+            if tree:
+                network.add_rule(rule.id, tree)
+        cls._networks[house_id] = network
+
+        return network, await cls._sync_network(session, network)
+
+    @staticmethod
+    async def _sync_network(session, network) -> Dict[int, bool]:
+        """Recharger depuis la base les valeurs des capteurs du réseau."""
+        if not network.leaves_by_sensor:
+            return {}
+        result = await session.execute(
+            select(Sensor.id, Sensor.value, Sensor.is_active).where(
+                Sensor.id.in_(list(network.leaves_by_sensor))
+            )
+        )
+        changed = {}
+        for sensor_id, value, is_active in result.all():
+            changed.update(
+                network.set_sensor_value(sensor_id, value if is_active else None)
+            )
+        return changed
+
+    @classmethod
+    def evaluate_rule(cls, rule, sensor, batch: ActionBatch):
+        """Évalue une règle simple et propose son action si nécessaire."""
+        if not sensor or not sensor.is_active or sensor.value is None:
+            return
+
+        started = time.perf_counter()
+        state = cls.get_state(rule)
+        fire = state.should_fire(rule, sensor.value, batch.now)
+        AutomationMetrics.record_evaluation(rule.id, time.perf_counter() - started)
+        if not fire:
+            cls.schedule_recheck(rule, state)
+            return
+
+        cls._propose(
+            batch,
+            rule,
+            condition=f"{rule.condition_operator} {rule.condition_value}",
+            reason=(
+                f"{sensor.name} {sensor.value} "
+                f"{rule.condition_operator} {rule.condition_value}"
+            ),
+            metadata={
+                "sensor_id": sensor.id,
+                "sensor_name": sensor.name,
+                "sensor_value": sensor.value,
+            },
+        )
+
+    @classmethod
+    def evaluate_compound_rule(cls, rule, network, condition_met: bool, batch):
+        """Évalue une règle composée à partir de la valeur de sa racine."""
+        started = time.perf_counter()
+        state = cls.get_state(rule)
+        fire = state.should_fire_condition(rule, condition_met, batch.now)
+        AutomationMetrics.record_evaluation(rule.id, time.perf_counter() - started)
+        if not fire:
+            # La racine ne bascule plus tant qu'elle reste vraie: sans timer,
+            # la fin du maintien ou du cooldown ne serait jamais vue
+            cls.schedule_recheck(rule, state)
+            return
+
+        condition = network.descriptions.get(rule.id, "")
+        cls._propose(
+            batch,
+            rule,
+            condition=condition,
+            reason=condition,
+            metadata={
+                "sensor_values": {
+                    str(sensor_id): value
+                    for sensor_id, value in network.sensor_values.items()
+                    if sensor_id in network.rule_sensors.get(rule.id, ())
+                },
+            },
+        )
+
+    @classmethod
+    def _propose(cls, batch, rule, condition, reason, metadata):
+        """Proposer l'action d'une règle déclenchée."""
+        batch.propose(
+            rule.equipment_id,
+            rule.action_state,
+            rule.priority,
+            entity_type="automation_rule",
+            entity_id=rule.id,
+            label=f"Règle '{rule.name}'",
+            metadata={"rule_name": rule.name, **metadata, "condition": condition},
+            info={
+                "reason": f"Rule: {rule.name} ({reason})",
+                "rule_id": rule.id,
+                "rule_name": rule.name,
+            },
+            rule_state=cls.get_state(rule),
+        )
+
+    @classmethod
+    async def evaluate_all(cls, session) -> List[dict]:
+        """Évalue toutes les règles actives (simples et composées)."""
+        from .automation_workers import AutomationWorkerPool
+
+        if AutomationWorkerPool.enabled():
+            return await AutomationWorkerPool.evaluate_all()
+
+        batch = ActionBatch(datetime.utcnow())
+        await cls.collect_all(session, batch)
+        return await batch.flush(session)
+
+    @classmethod
+    async def collect_all(cls, session, batch, shard: Optional[Tuple[int, int]] = None):
+        """
+        Proposer les actions de toutes les règles actives.
+
+        Args:
+            shard: (index, nombre) pour ne traiter que les maisons
+                   dont house_id % nombre == index
+        """
+        query = select(AutomationRule).where(AutomationRule.is_active == True)  # noqa
+        if shard is not None:
+            index, count = shard
+            query = query.where(AutomationRule.house_id % count == index)
+        result = await session.execute(query)
+
+        compound_by_house: Dict[int, list] = {}
+        for rule in result.scalars().all():
+            if rule.sensor_id is None:
+                compound_by_house.setdefault(rule.house_id, []).append(rule)
+                continue
+            sensor = await session.get(Sensor, rule.sensor_id)
+            cls.evaluate_rule(rule, sensor, batch)
+
+        for house_id, rules in compound_by_house.items():
+            network, _ = await cls._load_network(session, house_id)
+            await cls._sync_network(session, network)
+            for rule in rules:
+                cls.evaluate_compound_rule(
+                    rule, network, network.is_true(rule.id), batch
+                )
+
+    @classmethod
+    async def evaluate_sensor(cls, session, sensor) -> List[dict]:
+        """
+        Évalue les règles actives liées à un capteur.
+
+        En mode workers, l'évaluation est confiée au worker de la maison
+        au commit de `session` (liste vide ici).
+        """
+        written_at = time.time()
+
+        # Temporisations ('delay') qui surveillent ce capteur
+        from .scheduler import AutomationScheduler
+        from .automation_workers import AutomationWorkerPool
+
+        await AutomationScheduler.on_sensor_value(session, sensor)
+
+        if AutomationWorkerPool.enabled():
+            AutomationWorkerPool.submit_sensor(session, sensor, written_at)
+            return []
+
+        AutomationMetrics.enqueue(sensor.house_id)
+        try:
+            batch = ActionBatch(datetime.utcnow(), written_at)
+            await cls.collect_sensor(session, sensor, batch)
+            return await batch.flush(session)
+        finally:
+            AutomationMetrics.dequeue(sensor.house_id)
+
+    @classmethod
+    async def collect_sensor(cls, session, sensor, batch):
+        """
+        Proposer les actions des règles qui lisent ce capteur.
+
+        Les règles composées ne sont réévaluées que si leur racine change;
+        celles qui attendent (maintien, cooldown) le sont par schedule_recheck().
+        """
+        result = await session.execute(
+            select(AutomationRule).where(
+                and_(
+                    AutomationRule.sensor_id == sensor.id,
+                    AutomationRule.is_active == True,  # noqa: E712
+                )
+            )
+        )
+        for rule in result.scalars().all():
+            cls.evaluate_rule(rule, sensor, batch)
+
+        network, changed = await cls._load_network(session, sensor.house_id)
+        value = sensor.value if sensor.is_active else None
+        changed.update(network.set_sensor_value(sensor.id, value))
+        for rule_id, condition_met in changed.items():
+            rule = await session.get(AutomationRule, rule_id)
+            if not rule or not rule.is_active:
+                continue
+            cls.evaluate_compound_rule(rule, network, condition_met, batch)
@@ -0,0 +1,189 @@
+"""
+Métriques du moteur d'automatisation (en mémoire, par processus).
+
+- par règle: nombre d'évaluations, de déclenchements, temps cumulé
+- par maison: évaluations en attente (profondeur de file)
+- latence bout en bout: écriture du capteur → diffusion de l'équipement
+
+En mode workers, les compteurs d'évaluation sont accumulés dans chaque
+worker et renvoyés avec ses résultats (voir drain_rules / merge_rules).
+"""
+
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+# Nombre de latences conservées pour les percentiles
+LATENCY_WINDOW = 1000
+
+SORT_KEYS = {
+    "time": "total_seconds",
+    "evaluations": "evaluations",
+    "triggers": "triggers",
+}
+
+
+class RuleMetrics:
+    """Compteurs d'une règle."""
+
+    __slots__ = ("evaluations", "triggers", "total_seconds")
+
+    def __init__(self):
+        self.evaluations = 0
+        self.triggers = 0
+        self.total_seconds = 0.0
+
+
+class AutomationMetrics:
+    """Collecte des métriques du moteur."""
+
+    _rules: Dict[int, RuleMetrics] = {}
+    # Compteurs non encore renvoyés au processus web (mode workers)
+    _unsent: Dict[int, list] = {}
+    # house_id -> évaluations en cours ou en attente
+    _queue_depth: Dict[int, int] = {}
+    _latencies: deque = deque(maxlen=LATENCY_WINDOW)
+    _latency_count = 0
+    _latency_max = 0.0
+
+    @classmethod
+    def rule(cls, rule_id: int) -> RuleMetrics:
+        metrics = cls._rules.get(rule_id)
+        if metrics is None:
+            metrics = cls._rules[rule_id] = RuleMetrics()
+        return metrics
+
+    @classmethod
+    def record_evaluation(cls, rule_id: int, seconds: float):
+        metrics = cls.rule(rule_id)
+        metrics.evaluations += 1
+        metrics.total_seconds += seconds
+        unsent = cls._unsent.get(rule_id)
+        if unsent is None:
+            cls._unsent[rule_id] = [1, seconds]
+        else:
+            unsent[0] += 1
+            unsent[1] += seconds
+
+    @classmethod
+    def record_trigger(cls, rule_id: int):
+        cls.rule(rule_id).triggers += 1
+
+    @classmethod
+    def drain_rules(cls) -> Dict[int, list]:
+        """Compteurs d'évaluation accumulés depuis le dernier appel."""
+        unsent = cls._unsent
+        cls._unsent = {}
+        return unsent
+
+    @classmethod
+    def merge_rules(cls, deltas: Dict[int, list]):
+        """Intégrer les compteurs renvoyés par un worker."""
+        for rule_id, (evaluations, seconds) in deltas.items():
+            metrics = cls.rule(rule_id)
+            metrics.evaluations += evaluations
+            metrics.total_seconds += seconds
+
+    @classmethod
+    def enqueue(cls, house_id: int):
+        cls._queue_depth[house_id] = cls._queue_depth.get(house_id, 0) + 1
+
+    @classmethod
+    def dequeue(cls, house_id: int):
+        depth = cls._queue_depth.get(house_id, 0) - 1
+        if depth > 0:
+            cls._queue_depth[house_id] = depth
+        else:
+            cls._queue_depth.pop(house_id, None)
+
+    @classmethod
+    def record_latency(cls, written_at: float):
+        """Latence depuis l'écriture du capteur (horodatage time.time())."""
+        seconds = max(time.time() - written_at, 0.0)
+        cls._latencies.append(seconds)
+        cls._latency_count += 1
+        cls._latency_max = max(cls._latency_max, seconds)
+
+    @classmethod
+    def hottest_rules(cls, limit: int = 10, sort: str = "time") -> List[dict]:
+        """Les `limit` règles les plus coûteuses selon `sort`."""
+        attribute = SORT_KEYS[sort]
+        ranked = sorted(
+            cls._rules.items(),
+            key=lambda item: getattr(item[1], attribute),
+            reverse=True,
+        )[:limit]
+        return [
+            {
+                "rule_id": rule_id,
+                "evaluations": m.evaluations,
+                "triggers": m.triggers,
+                "total_ms": round(m.total_seconds * 1000, 3),
+                "avg_us": (
+                    round(m.total_seconds * 1e6 / m.evaluations, 1)
+                    if m.evaluations
+                    else None
+                ),
+            }
+            for rule_id, m in ranked
+        ]
+
+    @classmethod
+    def latency_summary(cls) -> dict:
+        samples = sorted(cls._latencies)
+
+        def percentile(p) -> Optional[float]:
+            if not samples:
+                return None
+            index = min(int(p * len(samples)), len(samples) - 1)
+            return round(samples[index] * 1000, 3)
+
+        return {
+            "count": cls._latency_count,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(cls._latency_max * 1000, 3),
+        }
+
+    @classmethod
+    def snapshot(cls, limit: int = 10, sort: str = "time") -> dict:
+        return {
+            "rules_tracked": len(cls._rules),
+            "evaluations": sum(m.evaluations for m in cls._rules.values()),
+            "triggers": sum(m.triggers for m in cls._rules.values()),
+            "hottest_rules": cls.hottest_rules(limit, sort),
+            "queue_depth": dict(cls._queue_depth),
+            "latency": cls.latency_summary(),
+        }
+
+    @classmethod
+    def prometheus(cls) -> str:
+        """Exposition au format texte Prometheus."""
+        lines = [
+            "# TYPE smarthome_rule_evaluations_total counter",
+            "# TYPE smarthome_rule_triggers_total counter",
+            "# TYPE smarthome_rule_evaluation_seconds_total counter",
+        ]
+        for rule_id, m in sorted(cls._rules.items()):
+            label = f'{{rule_id="{rule_id}"}}'
+            lines.append(f"smarthome_rule_evaluations_total{label} {m.evaluations}")
+            lines.append(f"smarthome_rule_triggers_total{label} {m.triggers}")
+            lines.append(
+                f"smarthome_rule_evaluation_seconds_total{label} {m.total_seconds:.6f}"
+            )
+        lines.append("# TYPE smarthome_automation_queue_depth gauge")
+        for house_id, depth in sorted(cls._queue_depth.items()):
+            lines.append(
+                f'smarthome_automation_queue_depth{{house_id="{house_id}"}} {depth}'
+            )
+        latency = cls.latency_summary()
+        lines.append("# TYPE smarthome_automation_latency_seconds summary")
+        for quantile, key in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+            if latency[key] is not None:
+                lines.append(
+                    f'smarthome_automation_latency_seconds{{quantile="{quantile}"}} '
+                    f"{latency[key] / 1000:.6f}"
+                )
+        lines.append(f"smarthome_automation_latency_seconds_count {latency['count']}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,251 @@
+"""
+Workers d'automatisation (processus séparés, optionnels).
+
+Activés par AUTOMATION_WORKERS=N: chaque changement de capteur est routé
+vers le worker de sa maison (house_id % N). Un worker possède l'état des
+règles de ses maisons (RuleState, réseaux de conditions): il lit la base,
+évalue les règles, arbitre les conflits et écrit les changements retenus
+dans la transaction qui les a résolus (équipements verrouillés jusqu'au
+commit). Les changements écrits reviennent au processus web, qui les
+diffuse aux clients WebSocket. L'évaluation n'entre plus en concurrence
+avec HTTP/WebSocket et profite de tous les coeurs.
+"""
+
+import asyncio
+import itertools
+import multiprocessing
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import tornado.ioloop
+from sqlalchemy import event
+
+from ..database import async_session_maker
+from .automation_engine import ActionBatch, AutomationEngine
+from .automation_metrics import AutomationMetrics
+
+# Attente maximale des résultats d'une évaluation complète
+RESULT_TIMEOUT_SECONDS = 30
+
+
+def worker_main(index: int, count: int, inbox, outbox):
+    """Point d'entrée d'un processus worker."""
+    asyncio.run(_worker_loop(index, count, inbox, outbox))
+
+
+async def _worker_loop(index: int, count: int, inbox, outbox):
+    loop = asyncio.get_running_loop()
+    print(f"[AutomationWorker {index}] Démarré ({index + 1}/{count})")
+
+    def publish(batch, changes):
+        # Réévaluations à la fin d'une attente (timers du worker)
+        outbox.put(
+            {
+                "job": None,
+                "now": batch.now,
+                "house_id": None,
+                "written_at": batch.written_at,
+                "changes": changes,
+                "actions": [],
+                "rule_metrics": AutomationMetrics.drain_rules(),
+            }
+        )
+
+    ActionBatch.publisher = publish
+
+    while True:
+        message = await loop.run_in_executor(None, inbox.get)
+        if message is None:
+            break
+
+        kind = message["kind"]
+        if kind == "reset":
+            AutomationEngine.reset_rule(message["rule_id"], message["house_id"])
+            continue
+
+        batch = ActionBatch(message["now"])
+        changes = []
+        actions = []
+        try:
+            # DATABASE QUERY: règles, capteurs, puis écriture des équipements
+            # dans la même transaction que leur lecture
+            async with async_session_maker() as session:
+                if kind == "sensor":
+                    sensor = SimpleNamespace(**message["sensor"])
+                    await AutomationEngine.collect_sensor(session, sensor, batch)
+                else:
+                    await AutomationEngine.collect_all(
+                        session, batch, shard=(index, count)
+                    )
+                changes = await batch.resolve(session)
+                actions = await batch.write(session, changes)
+                await session.commit()
+        except Exception as e:
+            print(f"[AutomationWorker {index}] Error evaluating {kind}: {e}")
+            changes = []
+            actions = []
+
+        outbox.put(
+            {
+                "job": message.get("job"),
+                "now": message["now"],
+                "house_id": message.get("house_id"),
+                "written_at": message.get("written_at"),
+                "changes": changes,
+                "actions": actions,
+                "rule_metrics": AutomationMetrics.drain_rules(),
+            }
+        )
+
+
+class AutomationWorkerPool:
+    """Processus workers et routage des évaluations par maison."""
+
+    _inboxes: List = []
+    _processes: List = []
+    _outbox = None
+    _loop: Optional[tornado.ioloop.IOLoop] = None
+    # job -> Future des évaluations dont l'appelant attend le résultat
+    _pending: Dict[int, asyncio.Future] = {}
+    _jobs = itertools.count(1)
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return bool(cls._inboxes)
+
+    @classmethod
+    def start(cls, count: int):
+        """Lancer `count` workers (appelé depuis l'IOLoop du processus web)."""
+        context = multiprocessing.get_context("spawn")
+        cls._outbox = context.Queue()
+        cls._loop = tornado.ioloop.IOLoop.current()
+
+        for index in range(count):
+            inbox = context.Queue()
+            process = context.Process(
+                target=worker_main,
+                args=(index, count, inbox, cls._outbox),
+                name=f"automation-worker-{index}",
+                daemon=True,
+            )
+            process.start()
+            cls._inboxes.append(inbox)
+            cls._processes.append(process)
+
+        # Les résultats sont lus dans un thread puis traités dans l'IOLoop
+        threading.Thread(
+            target=cls._read_results, name="automation-results", daemon=True
+        ).start()
+        print(f"[Automation] {count} worker(s) démarré(s)")
+
+    @classmethod
+    def stop(cls):
+        """Arrêter les workers."""
+        for inbox in cls._inboxes:
+            inbox.put(None)
+        for process in cls._processes:
+            process.join(timeout=5)
+        cls._inboxes = []
+        cls._processes = []
+
+    @classmethod
+    def shard(cls, house_id: int) -> int:
+        return house_id % len(cls._inboxes)
+
+    @classmethod
+    def submit_sensor(cls, session, sensor, written_at: Optional[float] = None):
+        """
+        Confier l'évaluation d'un changement de capteur à son worker.
+
+        Le worker relit la base: le message part au commit de `session`
+        (rien n'est envoyé si la transaction est annulée).
+        """
+        house_id = sensor.house_id
+        message = {
+            "kind": "sensor",
+            "job": next(cls._jobs),
+            "now": datetime.utcnow(),
+            "house_id": house_id,
+            "written_at": written_at,
+            "sensor": {
+                "id": sensor.id,
+                "house_id": house_id,
+                "name": sensor.name,
+                "value": sensor.value,
+                "is_active": sensor.is_active,
+            },
+        }
+
+        def submit(_session):
+            AutomationMetrics.enqueue(house_id)
+            cls._inboxes[cls.shard(house_id)].put(message)
+
+        event.listen(session.sync_session, "after_commit", submit, once=True)
+
+    @classmethod
+    def reset_rule(cls, rule_id: int, house_id: Optional[int]):
+        """Invalider l'état d'une règle dans le(s) worker(s) concerné(s)."""
+        message = {"kind": "reset", "rule_id": rule_id, "house_id": house_id}
+        if house_id is None:
+            for inbox in cls._inboxes:
+                inbox.put(message)
+        else:
+            cls._inboxes[cls.shard(house_id)].put(message)
+
+    @classmethod
+    async def evaluate_all(cls) -> List[dict]:
+        """
+        Évaluer toutes les règles (chaque worker traite ses maisons).
+
+        Un worker qui ne répond pas avant RESULT_TIMEOUT_SECONDS est
+        signalé et ignoré: les actions des autres sont retournées.
+        """
+        loop = asyncio.get_running_loop()
+        now = datetime.utcnow()
+        jobs = {}  # job -> (index du worker, Future)
+        for index, inbox in enumerate(cls._inboxes):
+            job = next(cls._jobs)
+            future = loop.create_future()
+            cls._pending[job] = future
+            jobs[job] = (index, future)
+            inbox.put({"kind": "all", "job": job, "now": now})
+
+        await asyncio.wait(
+            [future for _index, future in jobs.values()],
+            timeout=RESULT_TIMEOUT_SECONDS,
+        )
+        actions = []
+        for job, (index, future) in jobs.items():
+            if future.done():
+                actions.extend(future.result())
+                continue
+            # Réponse tardive ignorée par _on_result (job inconnu)
+            cls._pending.pop(job, None)
+            future.cancel()
+            print(
+                f"[Automation] Worker {index} did not answer within "
+                f"{RESULT_TIMEOUT_SECONDS}s (job {job})"
+            )
+        return actions
+
+    @classmethod
+    def _read_results(cls):
+        while True:
+            message = cls._outbox.get()
+            cls._loop.add_callback(cls._on_result, message)
+
+    @classmethod
+    def _on_result(cls, message):
+        """Diffuser les changements écrits par un worker."""
+        AutomationMetrics.merge_rules(message["rule_metrics"])
+        if message["house_id"] is not None:
+            AutomationMetrics.dequeue(message["house_id"])
+
+        batch = ActionBatch(message["now"], message["written_at"])
+        batch.publish(message["changes"])
+
+        future = cls._pending.pop(message["job"], None)
+        if future is not None and not future.done():
+            future.set_result(message["actions"])
@@ -0,0 +1,196 @@
+"""
+Backtest d'une règle d'automatisation sur l'historique des capteurs.
+
+Les relevés sont lus dans event_history (événements 'sensor_reading') avec
+un curseur côté serveur, puis rejoués dans les mêmes RuleState /
+ConditionNetwork que le moteur, sans toucher aux équipements ni à la base.
+Comme les réévaluations programmées du moteur, une règle dont la condition
+est vraie mais en attente (maintien, cooldown) se déclenche à la fin de
+l'attente, sans attendre le relevé suivant.
+La mémoire utilisée ne dépend pas de la taille de la période: seules les
+premières échéances (max_events) sont conservées dans la réponse.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, and_
+
+from ..models import EventHistory
+from .automation_engine import RuleState
+from .condition_network import ConditionNetwork, rows_to_tree, tree_sensor_ids
+
+STREAM_BATCH_SIZE = 500
+
+
+def reading_value(metadata) -> Optional[float]:
+    """Extraire la valeur d'un événement 'sensor_reading' (None si absente)."""
+    if not metadata:
+        return None
+    action = metadata.get("action")
+    if action == "value_update":
+        value = metadata.get("new_value")
+    elif action == "update":
+        value = (metadata.get("changes") or {}).get("value", {}).get("new")
+    elif action == "create":
+        value = metadata.get("initial_value")
+    else:
+        return None
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def rule_sensor_ids(rule) -> set:
+    """Capteurs lus par une règle (simple ou composée)."""
+    if rule.sensor_id is not None:
+        return {rule.sensor_id}
+    tree = rows_to_tree(rule.conditions)
+    return tree_sensor_ids(tree) if tree else set()
+
+
+async def backtest_rule(
+    session,
+    rule,
+    companions,
+    start: datetime,
+    end: datetime,
+    initial_state: Optional[str],
+    max_events: int = 1000,
+) -> dict:
+    """
+    Rejouer `rule` (et les règles `companions` qui pilotent le même
+    équipement) sur les relevés de [start, end].
+
+    Returns:
+        dict avec le nombre de déclenchements, leurs instants et la
+        chronologie simulée de l'état de l'équipement
+    """
+    rules = [rule] + list(companions)
+    sensor_ids = set()
+    for r in rules:
+        sensor_ids |= rule_sensor_ids(r)
+
+    states = {r.id: RuleState() for r in rules}
+    simple_by_sensor = {}
+    network = ConditionNetwork()
+    rules_by_id = {}
+    for r in rules:
+        rules_by_id[r.id] = r
+        if r.sensor_id is not None:
+            simple_by_sensor.setdefault(r.sensor_id, []).append(r)
+        else:
+            tree = rows_to_tree(r.conditions)
+            if tree:
+                network.add_rule(r.id, tree)
+
+    # Dernière valeur lue par capteur (réévaluation des règles simples)
+    last_values = {}
+    # rule_id -> instant où une condition vraie pourra déclencher
+    pending = {}
+
+    equipment_state = initial_state
+    readings = 0
+    trigger_count = 0
+    trigger_timestamps = []
+    timeline = []
+    truncated = False
+
+    def fire(r, timestamp):
+        nonlocal equipment_state, trigger_count, truncated
+        if equipment_state == r.action_state:
+            return
+        equipment_state = r.action_state
+        states[r.id].last_fired = timestamp
+        if len(timeline) < max_events:
+            timeline.append(
+                {"timestamp": timestamp, "state": equipment_state, "rule_id": r.id}
+            )
+        else:
+            truncated = True
+        if r.id == rule.id:
+            trigger_count += 1
+            if len(trigger_timestamps) < max_events:
+                trigger_timestamps.append(timestamp)
+
+    def check(r, fired, timestamp):
+        if fired:
+            pending.pop(r.id, None)
+            fire(r, timestamp)
+            return
+        ready = states[r.id].ready_at(r)
+        if ready is None:
+            pending.pop(r.id, None)
+        else:
+            pending[r.id] = ready
+
+    def recheck_due(until):
+        """Réévaluer, dans l'ordre, les règles dont l'attente finit avant `until`."""
+        while pending:
+            # Peu de règles (la règle et ses compagnes): un min() suffit
+            rule_id, when = min(pending.items(), key=lambda item: (item[1], item[0]))
+            if when > until:
+                return
+            r = rules_by_id[rule_id]
+            state = states[rule_id]
+            if r.sensor_id is not None:
+                fired = state.should_fire(r, last_values[r.sensor_id], when)
+            else:
+                fired = state.should_fire_condition(r, network.is_true(rule_id), when)
+            check(r, fired, when)
+
+    query = (
+        select(EventHistory.entity_id, EventHistory.created_at, EventHistory.event_metadata)
+        .where(
+            and_(
+                EventHistory.event_type == "sensor_reading",
+                EventHistory.entity_type == "sensor",
+                EventHistory.entity_id.in_(sensor_ids),
+                EventHistory.created_at >= start,
+                EventHistory.created_at <= end,
+            )
+        )
+        .order_by(EventHistory.created_at, EventHistory.id)
+        .execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+
+    # Curseur côté serveur: les lignes arrivent par lots de STREAM_BATCH_SIZE
+    stream = await session.stream(query)
+    async for sensor_id, timestamp, metadata in stream:
+        value = reading_value(metadata)
+        if value is None:
+            continue
+        readings += 1
+        recheck_due(timestamp)
+        last_values[sensor_id] = value
+
+        for r in simple_by_sensor.get(sensor_id, ()):
+            check(r, states[r.id].should_fire(r, value, timestamp), timestamp)
+
+        changed = network.set_sensor_value(sensor_id, value)
+        for rule_id, condition_met in changed.items():
+            r = rules_by_id[rule_id]
+            check(
+                r,
+                states[rule_id].should_fire_condition(r, condition_met, timestamp),
+                timestamp,
+            )
+
+    # Attentes terminées après le dernier relevé mais avant la fin
+    recheck_due(end)
+
+    return {
+        "rule_id": rule.id,
+        "from": start,
+        "to": end,
+        "sensor_ids": sorted(sensor_ids),
+        "companion_rule_ids": [r.id for r in companions],
+        "readings": readings,
+        "initial_state": initial_state,
+        "final_state": equipment_state,
+        "trigger_count": trigger_count,
+        "trigger_timestamps": trigger_timestamps,
+        "timeline": timeline,
+        "truncated": truncated or trigger_count > len(trigger_timestamps),
+    }
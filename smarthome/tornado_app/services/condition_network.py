@@ -0,0 +1,237 @@
+"""
+Conditions composées (ET/OU) des règles d'automatisation.
+
+Chaque maison possède un réseau de conditions: les feuilles sont indexées
+par capteur et gardent leur dernière valeur de vérité, les noeuds ET/OU
+comptent leurs enfants vrais. Quand un capteur change, seules ses feuilles
+et leurs ancêtres sont réévalués (propagation façon Rete), et la propagation
+s'arrête dès qu'un noeud ne change plus.
+"""
+
+import operator
+from typing import Dict, List, Optional
+
+from ..models import AutomationCondition
+
+OPERATORS = {
+    ">": operator.gt,
+    "<": operator.lt,
+    ">=": operator.ge,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+COMPOSITE_TYPES = ("and", "or")
+MAX_TREE_DEPTH = 8
+
+
+def compare(condition_operator: str, value: float, threshold: float) -> bool:
+    """Évalue `value <op> threshold` (False si opérateur inconnu)."""
+    func = OPERATORS.get(condition_operator)
+    if func is None:
+        return False
+    return func(value, threshold)
+
+
+def validate_condition_tree(tree, depth: int = 0):
+    """
+    Valider un arbre de conditions au format JSON.
+
+    Format:
+        {"type": "and"|"or", "children": [<noeud>, ...]}
+        {"sensor_id": int, "operator": ">", "value": float}
+
+    Raises:
+        ValueError: si l'arbre est mal formé
+    """
+    if depth > MAX_TREE_DEPTH:
+        raise ValueError(f"Arbre de conditions trop profond (max {MAX_TREE_DEPTH})")
+    if not isinstance(tree, dict):
+        raise ValueError("Chaque condition doit être un objet")
+
+    node_type = tree.get("type", "leaf")
+    if node_type in COMPOSITE_TYPES:
+        children = tree.get("children")
+        if not isinstance(children, list) or not children:
+            raise ValueError(f"Le noeud '{node_type}' doit avoir des enfants")
+        for child in children:
+            validate_condition_tree(child, depth + 1)
+        return
+
+    if node_type != "leaf":
+        raise ValueError(f"Type de condition inconnu: {node_type}")
+    for field in ("sensor_id", "operator", "value"):
+        if field not in tree:
+            raise ValueError(f"Champ requis dans la condition: {field}")
+    if tree["operator"] not in OPERATORS:
+        raise ValueError(f"Opérateur invalide: {tree['operator']}")
+    try:
+        int(tree["sensor_id"])
+        float(tree["value"])
+    except (TypeError, ValueError):
+        raise ValueError("sensor_id et value doivent être numériques")
+
+
+def tree_sensor_ids(tree) -> set:
+    """Ensemble des capteurs référencés par un arbre JSON."""
+    if tree.get("type", "leaf") in COMPOSITE_TYPES:
+        ids = set()
+        for child in tree["children"]:
+            ids |= tree_sensor_ids(child)
+        return ids
+    return {int(tree["sensor_id"])}
+
+
+def build_condition_rows(tree, parent=None, position=0) -> List[AutomationCondition]:
+    """Convertir un arbre JSON (validé) en lignes AutomationCondition."""
+    node_type = tree.get("type", "leaf")
+    if node_type in COMPOSITE_TYPES:
+        node = AutomationCondition(node_type=node_type, parent=parent, position=position)
+        rows = [node]
+        for index, child in enumerate(tree["children"]):
+            rows.extend(build_condition_rows(child, node, index))
+        return rows
+
+    node = AutomationCondition(
+        node_type="leaf",
+        parent=parent,
+        position=position,
+        sensor_id=int(tree["sensor_id"]),
+        operator=tree["operator"],
+        value=float(tree["value"]),
+    )
+    return [node]
+
+
+def rows_to_tree(rows) -> Optional[dict]:
+    """Reconstruire l'arbre JSON depuis les lignes (liste à plat)."""
+    if not rows:
+        return None
+
+    children_of: Dict[Optional[int], list] = {}
+    for row in rows:
+        children_of.setdefault(row.parent_id, []).append(row)
+
+    def to_json(row):
+        if row.node_type in COMPOSITE_TYPES:
+            children = sorted(children_of.get(row.id, []), key=lambda r: r.position)
+            return {"type": row.node_type, "children": [to_json(c) for c in children]}
+        return {"sensor_id": row.sensor_id, "operator": row.operator, "value": row.value}
+
+    roots = children_of.get(None, [])
+    return to_json(roots[0]) if roots else None
+
+
+def describe_tree(tree) -> str:
+    """Représentation lisible d'un arbre JSON (historique, logs)."""
+    node_type = tree.get("type", "leaf")
+    if node_type in COMPOSITE_TYPES:
+        joiner = f" {node_type.upper()} "
+        return "(" + joiner.join(describe_tree(c) for c in tree["children"]) + ")"
+    return f"capteur#{tree['sensor_id']} {tree['operator']} {tree['value']}"
+
+
+class ConditionNode:
+    """Noeud du réseau (feuille ou combinaison ET/OU)."""
+
+    __slots__ = (
+        "node_type",
+        "rule_id",
+        "parent",
+        "children_count",
+        "true_count",
+        "value",
+        "sensor_id",
+        "operator",
+        "threshold",
+    )
+
+    def __init__(self, node_type, rule_id, parent=None):
+        self.node_type = node_type
+        self.rule_id = rule_id
+        self.parent = parent
+        self.children_count = 0
+        self.true_count = 0
+        self.value = False
+        self.sensor_id = None
+        self.operator = None
+        self.threshold = None
+
+
+class ConditionNetwork:
+    """Réseau de conditions composées d'une maison."""
+
+    def __init__(self):
+        # sensor_id -> feuilles qui lisent ce capteur
+        self.leaves_by_sensor: Dict[int, List[ConditionNode]] = {}
+        # rule_id -> noeud racine
+        self.roots: Dict[int, ConditionNode] = {}
+        # sensor_id -> dernière valeur connue (None si inactif)
+        self.sensor_values: Dict[int, Optional[float]] = {}
+        # rule_id -> capteurs lus / description lisible
+        self.rule_sensors: Dict[int, set] = {}
+        self.descriptions: Dict[int, str] = {}
+
+    def add_rule(self, rule_id: int, tree):
+        """Compiler l'arbre JSON d'une règle dans le réseau."""
+        self.roots[rule_id] = self._compile(tree, rule_id, None)
+        self.rule_sensors[rule_id] = tree_sensor_ids(tree)
+        self.descriptions[rule_id] = describe_tree(tree)
+
+    def _compile(self, tree, rule_id, parent):
+        node_type = tree.get("type", "leaf")
+        node = ConditionNode(node_type, rule_id, parent)
+        if node_type in COMPOSITE_TYPES:
+            node.children_count = len(tree["children"])
+            for child in tree["children"]:
+                self._compile(child, rule_id, node)
+        else:
+            node.sensor_id = int(tree["sensor_id"])
+            node.operator = tree["operator"]
+            node.threshold = float(tree["value"])
+            self.leaves_by_sensor.setdefault(node.sensor_id, []).append(node)
+        return node
+
+    def is_true(self, rule_id: int) -> bool:
+        root = self.roots.get(rule_id)
+        return bool(root and root.value)
+
+    def set_sensor_value(self, sensor_id: int, value: Optional[float]) -> Dict[int, bool]:
+        """
+        Appliquer une nouvelle valeur de capteur.
+
+        Returns:
+            dict rule_id -> nouvelle valeur, pour les racines qui ont changé
+        """
+        changed_roots: Dict[int, bool] = {}
+        leaves = self.leaves_by_sensor.get(sensor_id)
+        if not leaves:
+            return changed_roots
+        if sensor_id in self.sensor_values and self.sensor_values[sensor_id] == value:
+            return changed_roots
+        self.sensor_values[sensor_id] = value
+
+        for leaf in leaves:
+            new_value = value is not None and compare(leaf.operator, value, leaf.threshold)
+            if new_value != leaf.value:
+                leaf.value = new_value
+                self._propagate(leaf, changed_roots)
+        return changed_roots
+
+    def _propagate(self, node, changed_roots):
+        """Remonter un changement de valeur vers la racine."""
+        while True:
+            parent = node.parent
+            if parent is None:
+                changed_roots[node.rule_id] = node.value
+                return
+            parent.true_count += 1 if node.value else -1
+            if parent.node_type == "and":
+                new_value = parent.true_count == parent.children_count
+            else:
+                new_value = parent.true_count > 0
+            if new_value == parent.value:
+                return
+            parent.value = new_value
+            node = parent
@@ -0,0 +1,219 @@
+"""
+Positions en direct des utilisateurs, tenues en mémoire par maison.
+
+Les déplacements ne modifient que la mémoire; la table user_positions
+reçoit un instantané des positions modifiées toutes les
+PERSIST_INTERVAL_MS, lors d'un départ et à l'arrêt du serveur. Le nombre
+d'écritures ne dépend plus de la fréquence des déplacements.
+
+Chaque séjour terminé sur une case (changement de case ou départ) est
+gardé en attente et écrit au même moment dans position_visits.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+import tornado.ioloop
+from sqlalchemy import select, and_, insert
+
+from ..database import async_session_maker
+from ..models import PositionVisit, UserPosition
+
+# Intervalle d'écriture des positions modifiées
+PERSIST_INTERVAL_MS = 30000
+
+
+class LivePosition:
+    """Position courante d'un utilisateur (since: arrivée sur la case)."""
+
+    __slots__ = ("x", "y", "last_update", "since")
+
+    def __init__(
+        self,
+        x: int,
+        y: int,
+        last_update: Optional[datetime] = None,
+        since: Optional[datetime] = None,
+    ):
+        self.x = x
+        self.y = y
+        self.last_update = last_update or datetime.utcnow()
+        self.since = since or self.last_update
+
+
+class LivePositions:
+    """Positions actives par maison et suivi des écritures en attente."""
+
+    # house_id -> {user_id: LivePosition} (utilisateurs présents)
+    _houses: Dict[int, Dict[int, LivePosition]] = {}
+    # house_id -> utilisateurs dont la position (ou le départ) reste à écrire
+    _dirty: Dict[int, Set[int]] = {}
+    # house_id -> séjours terminés pas encore écrits dans position_visits
+    _visits: Dict[int, List[dict]] = {}
+    # Séjours en cours d'écriture par flush_all (encore visibles en lecture)
+    _flushing: Dict[int, List[dict]] = {}
+    _timer: Optional[tornado.ioloop.PeriodicCallback] = None
+
+    @classmethod
+    async def house(cls, session, house_id: int) -> Dict[int, LivePosition]:
+        """Positions actives d'une maison (chargées depuis la base au premier accès)."""
+        positions = cls._houses.get(house_id)
+        if positions is not None:
+            return positions
+
+        result = await session.execute(
+            select(
+                UserPosition.user_id,
+                UserPosition.x,
+                UserPosition.y,
+                UserPosition.last_update,
+            ).where(
+                and_(
+                    UserPosition.house_id == house_id,
+                    UserPosition.is_active == True,  # noqa: E712
+                )
+            )
+        )
+        # Une maison a pu être chargée pendant la requête
+        positions = cls._houses.setdefault(house_id, {})
+        for user_id, x, y, last_update in result.all():
+            positions.setdefault(user_id, LivePosition(x, y, last_update))
+        return positions
+
+    @classmethod
+    async def update_many(
+        cls, session, house_id: int, moves: Dict[int, Optional[Tuple[int, int]]]
+    ):
+        """Appliquer des positions: user_id -> (x, y), ou None pour un départ."""
+        positions = await cls.house(session, house_id)
+        dirty = cls._dirty.setdefault(house_id, set())
+        now = datetime.utcnow()
+        for user_id, xy in moves.items():
+            previous = positions.get(user_id)
+            if xy is None:
+                if previous is None:
+                    continue
+                del positions[user_id]
+            elif previous is not None and (previous.x, previous.y) == xy:
+                previous.last_update = now
+                dirty.add(user_id)
+                continue
+            else:
+                positions[user_id] = LivePosition(xy[0], xy[1], now)
+            if previous is not None:
+                cls._record_visit(house_id, user_id, previous, now)
+            dirty.add(user_id)
+        cls._ensure_timer()
+
+    @classmethod
+    def _record_visit(cls, house_id: int, user_id: int, live: LivePosition, now):
+        cls._visits.setdefault(house_id, []).append(
+            {
+                "house_id": house_id,
+                "user_id": user_id,
+                "x": live.x,
+                "y": live.y,
+                "entered_at": live.since,
+                "left_at": now,
+            }
+        )
+
+    @classmethod
+    def pending_visits(cls, house_id: int) -> List[dict]:
+        """Séjours terminés d'une maison pas encore écrits en base."""
+        return list(cls._flushing.get(house_id, ())) + list(
+            cls._visits.get(house_id, ())
+        )
+
+    @classmethod
+    async def persist(cls, session, house_id: int):
+        """Écrire dans la session les positions et séjours d'une maison."""
+        await cls._write(
+            session,
+            house_id,
+            cls._dirty.pop(house_id, None),
+            cls._visits.pop(house_id, None),
+        )
+
+    @classmethod
+    async def _write(cls, session, house_id: int, dirty, visits):
+        if visits:
+            # Une seule insertion multi-lignes pour les séjours
+            await session.execute(insert(PositionVisit), visits)
+        if not dirty:
+            return
+        positions = cls._houses.get(house_id, {})
+
+        result = await session.execute(
+            select(UserPosition).where(
+                and_(
+                    UserPosition.house_id == house_id,
+                    UserPosition.user_id.in_(list(dirty)),
+                )
+            )
+        )
+        existing = {p.user_id: p for p in result.scalars().all()}
+        for user_id in dirty:
+            live = positions.get(user_id)
+            row = existing.get(user_id)
+            if live is None:
+                # Départ
+                if row:
+                    row.is_active = False
+            elif row:
+                row.x = live.x
+                row.y = live.y
+                row.is_active = True
+                row.last_update = live.last_update
+            else:
+                session.add(
+                    UserPosition(
+                        house_id=house_id,
+                        user_id=user_id,
+                        x=live.x,
+                        y=live.y,
+                        is_active=True,
+                        last_update=live.last_update,
+                    )
+                )
+
+    @classmethod
+    async def flush_all(cls):
+        """Écrire toutes les positions modifiées (périodique et arrêt)."""
+        if not cls._dirty and not cls._visits:
+            return
+        pending, cls._dirty = cls._dirty, {}
+        visits, cls._visits = cls._visits, {}
+        cls._flushing = visits
+        try:
+            # DATABASE QUERY: Opération sur la base de données
+            async with async_session_maker() as session:
+                for house_id in set(pending) | set(visits):
+                    await cls._write(
+                        session, house_id, pending.get(house_id), visits.get(house_id)
+                    )
+                await session.commit()
+        except Exception as e:
+            print(f"[Positions] Error persisting positions: {e}")
+            # Réessayer au prochain passage
+            for house_id, users in pending.items():
+                cls._dirty.setdefault(house_id, set()).update(users)
+            for house_id, items in visits.items():
+                cls._visits[house_id] = items + cls._visits.get(house_id, [])
+        finally:
+            cls._flushing = {}
+
+    @classmethod
+    def _ensure_timer(cls):
+        if cls._timer is None:
+            cls._timer = tornado.ioloop.PeriodicCallback(
+                cls.flush_all, PERSIST_INTERVAL_MS
+            )
+            cls._timer.start()
+
+    @classmethod
+    def forget_house(cls, house_id: int):
+        """Oublier une maison supprimée."""
+        cls._houses.pop(house_id, None)
+        cls._dirty.pop(house_id, None)
+        cls._visits.pop(house_id, None)
@@ -0,0 +1,183 @@
+"""
+Carte de chaleur d'occupation d'une maison sur une période.
+
+Le temps passé sur chaque case est accumulé dans une matrice NumPy à partir
+des séjours (position_visits, séjours pas encore écrits et positions en
+cours), puis agrégé par pièce grâce aux codes de la couche de base
+(2000 + room.id). Le calcul tourne dans un thread pour ne pas bloquer
+l'IOLoop; le résultat est gardé en cache par maison et par période.
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+import tornado.ioloop
+from sqlalchemy import select, and_
+
+from ..models import PositionVisit, Room
+from ..utils.grid_layers import as_compact_grid
+from .live_positions import LivePositions
+
+HEATMAP_CACHE_SIZE = 128
+# Une période qui n'est pas terminée change encore: cache court
+OPEN_PERIOD_TTL_SECONDS = 60
+ROOM_MIN = 2000
+ROOM_MAX = 3000
+
+Visit = Tuple[int, int, datetime, datetime]
+
+
+def base_layer(grid) -> np.ndarray:
+    """Couche de base de la grille en matrice d'entiers (rows x cols)."""
+    if isinstance(grid, list) and (not grid or not grid[0]):
+        return np.zeros((0, 0), dtype=np.int32)
+    return as_compact_grid(grid).base
+
+
+def compute_heatmap(grid, visits: List[Visit], start: datetime, end: datetime) -> dict:
+    """
+    Secondes passées par case et par pièce entre `start` et `end`.
+
+    Exécuté hors de l'IOLoop (run_in_executor).
+    """
+    base = base_layer(grid)
+    rows, cols = base.shape
+    heat = np.zeros(rows * cols, dtype=np.float64)
+
+    if visits and rows and cols:
+        xs, ys, entered, left = zip(*visits)
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        period_start = np.datetime64(start, "us")
+        period_end = np.datetime64(end, "us")
+        entered = np.clip(
+            np.asarray(entered, dtype="datetime64[us]"), period_start, period_end
+        )
+        left = np.clip(
+            np.asarray(left, dtype="datetime64[us]"), period_start, period_end
+        )
+        dwell = (left - entered) / np.timedelta64(1, "s")
+
+        inside = (xs >= 0) & (xs < cols) & (ys >= 0) & (ys < rows) & (dwell > 0)
+        heat = np.bincount(
+            ys[inside] * cols + xs[inside],
+            weights=dwell[inside],
+            minlength=rows * cols,
+        )
+
+    heat = heat.reshape(rows, cols)
+    flat_base = base.ravel()
+    in_room = (flat_base >= ROOM_MIN) & (flat_base < ROOM_MAX)
+    room_codes = flat_base[in_room] - ROOM_MIN
+    room_seconds = np.bincount(room_codes, weights=heat.ravel()[in_room])
+    room_cells = np.bincount(room_codes)
+
+    return {
+        "rows": int(rows),
+        "cols": int(cols),
+        "total_seconds": round(float(heat.sum()), 1),
+        "max_seconds": round(float(heat.max()), 1) if heat.size else 0.0,
+        # Matrice compacte: secondes entières, une liste par ligne
+        "cells": np.rint(heat).astype(np.int64).tolist(),
+        "rooms": {
+            int(room_id): {
+                "seconds": round(float(room_seconds[room_id]), 1),
+                "cells": int(room_cells[room_id]),
+            }
+            for room_id in np.flatnonzero(room_cells)
+        },
+    }
+
+
+class OccupancyHeatmap:
+    """Cartes de chaleur calculées, par (maison, grid_version, période)."""
+
+    # clé -> (expiration ou None si la période est terminée, résultat)
+    _cache: "OrderedDict[tuple, Tuple[Optional[datetime], dict]]" = OrderedDict()
+
+    @classmethod
+    async def get(cls, session, house, start: datetime, end: datetime) -> dict:
+        now = datetime.utcnow()
+        key = (house.id, house.grid_version, start, end)
+        cached = cls._cache.get(key)
+        if cached is not None and (cached[0] is None or cached[0] > now):
+            cls._cache.move_to_end(key)
+            return cached[1]
+
+        visits = await cls._visits(session, house.id, start, end, now)
+        heatmap = await tornado.ioloop.IOLoop.current().run_in_executor(
+            None, compute_heatmap, house.grid, visits, start, end
+        )
+
+        # Noms des pièces
+        result = await session.execute(
+            select(Room.id, Room.name).where(Room.house_id == house.id)
+        )
+        names = dict(result.all())
+        total = heatmap["total_seconds"]
+        heatmap["rooms"] = sorted(
+            (
+                {
+                    "room_id": room_id,
+                    "name": names.get(room_id),
+                    "seconds": room["seconds"],
+                    "cells": room["cells"],
+                    "share": round(room["seconds"] / total, 4) if total else 0.0,
+                }
+                for room_id, room in heatmap["rooms"].items()
+            ),
+            key=lambda room: room["seconds"],
+            reverse=True,
+        )
+        heatmap["from"] = start.isoformat()
+        heatmap["to"] = end.isoformat()
+
+        expires = None
+        if end > now:
+            expires = now + timedelta(seconds=OPEN_PERIOD_TTL_SECONDS)
+        cls._cache[key] = (expires, heatmap)
+        while len(cls._cache) > HEATMAP_CACHE_SIZE:
+            cls._cache.popitem(last=False)
+        return heatmap
+
+    @staticmethod
+    async def _visits(session, house_id: int, start, end, now) -> List[Visit]:
+        """Séjours qui recoupent la période (base, attente, en cours)."""
+        # DATABASE QUERY: séjours enregistrés qui recoupent la période
+        result = await session.execute(
+            select(
+                PositionVisit.x,
+                PositionVisit.y,
+                PositionVisit.entered_at,
+                PositionVisit.left_at,
+            ).where(
+                and_(
+                    PositionVisit.house_id == house_id,
+                    PositionVisit.entered_at < end,
+                    PositionVisit.left_at > start,
+                )
+            )
+        )
+        visits = [tuple(row) for row in result.all()]
+
+        # Séjours terminés pas encore écrits
+        visits.extend(
+            (v["x"], v["y"], v["entered_at"], v["left_at"])
+            for v in LivePositions.pending_visits(house_id)
+            if v["entered_at"] < end and v["left_at"] > start
+        )
+        # Séjours en cours
+        positions = await LivePositions.house(session, house_id)
+        visits.extend(
+            (live.x, live.y, live.since, now)
+            for live in positions.values()
+            if live.since < end
+        )
+        return visits
+
+    @classmethod
+    def invalidate(cls, house_id: int):
+        for key in [key for key in cls._cache if key[0] == house_id]:
+            del cls._cache[key]
@@ -0,0 +1,291 @@
+"""
+Simulation d'occupants côté serveur (démonstrations, tests de charge).
+
+Des occupants virtuels marchent de pièce en pièce en suivant les champs de
+distance de la grille (utils.grid_paths), s'arrêtent un moment dans chaque
+pièce puis repartent. À chaque tick, leurs positions passent par le même
+chemin que celles des utilisateurs: PresenceTracker puis
+apply_presence_flips (capteurs de présence, automatisations).
+
+Les occupants virtuels ont des identifiants négatifs (-1, -2, ...): ils ne
+sont jamais écrits dans user_positions.
+"""
+
+import random
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import tornado.ioloop
+from sqlalchemy import select
+
+from ..database import async_session_maker
+from ..models import House
+from ..utils.grid_index import cached_grid_index
+from ..utils.grid_paths import cached_grid_paths, get_grid_paths
+from .presence import PresenceTracker, apply_presence_flips
+
+# Période de la simulation
+SIMULATION_TICK_MS = 200
+MAX_OCCUPANTS = 5000
+# Vitesse de marche en cases par seconde
+DEFAULT_SPEED = 2.0
+MIN_SPEED = 0.1
+MAX_SPEED = 20.0
+# Temps passé dans une pièce avant de repartir (secondes)
+DWELL_SECONDS = (3.0, 30.0)
+
+
+class Occupant:
+    """Occupant virtuel: case courante, pièce visée, attente restante."""
+
+    __slots__ = ("id", "cell", "target", "dwell", "progress")
+
+    def __init__(self, occupant_id: int, cell: int):
+        self.id = occupant_id
+        self.cell = cell
+        self.target: Optional[int] = None
+        self.dwell = 0.0
+        self.progress = 0.0
+
+
+class Simulation:
+    """Simulation d'une maison."""
+
+    def __init__(self, house_id: int, speed: float, broadcast: bool, seed=None):
+        self.house_id = house_id
+        self.speed = speed
+        self.broadcast = broadcast
+        self.rng = random.Random(seed)
+        self.occupants: List[Occupant] = []
+        self.grid_version = None
+        self.ticks = 0
+        self.timer: Optional[tornado.ioloop.PeriodicCallback] = None
+
+    def status(self) -> dict:
+        return {
+            "house_id": self.house_id,
+            "running": self.timer is not None,
+            "occupants": len(self.occupants),
+            "speed": self.speed,
+            "broadcast": self.broadcast,
+            "ticks": self.ticks,
+        }
+
+    def _pick_target(self, paths, occupant: Occupant):
+        """Choisir une autre pièce accessible depuis la case courante."""
+        rooms = [
+            room
+            for room in paths.room_cells
+            if room != occupant.target and paths.reachable(occupant.cell, room)
+        ]
+        occupant.target = self.rng.choice(rooms) if rooms else occupant.target
+
+    def spawn(self, paths, count: int):
+        """Placer `count` occupants sur des cases de pièces au hasard."""
+        cells = [cell for room_cells in paths.room_cells.values() for cell in room_cells]
+        self.occupants = [
+            Occupant(-(i + 1), self.rng.choice(cells)) for i in range(count)
+        ]
+        for occupant in self.occupants:
+            occupant.dwell = self.rng.uniform(0, DWELL_SECONDS[1])
+            self._pick_target(paths, occupant)
+
+    def relocate(self, paths):
+        """Grille modifiée: replacer les occupants sur des cases praticables."""
+        cells = [cell for room_cells in paths.room_cells.values() for cell in room_cells]
+        size = paths.rows * paths.cols
+        for occupant in self.occupants:
+            if occupant.cell >= size or not paths.walkable[occupant.cell]:
+                occupant.cell = self.rng.choice(cells)
+            occupant.target = None
+            self._pick_target(paths, occupant)
+
+    def advance(self, paths, seconds: float) -> List[Occupant]:
+        """Faire avancer les occupants; retourne ceux qui ont changé de case."""
+        moved = []
+        steps = self.speed * seconds
+        for occupant in self.occupants:
+            if occupant.dwell > 0:
+                occupant.dwell -= seconds
+                continue
+            occupant.progress += steps
+            start = occupant.cell
+            while occupant.progress >= 1:
+                occupant.progress -= 1
+                cell = paths.step(occupant.cell, occupant.target, self.rng)
+                if cell == occupant.cell:
+                    # Arrivé (ou bloqué): attendre puis viser une autre pièce
+                    occupant.progress = 0.0
+                    occupant.dwell = self.rng.uniform(*DWELL_SECONDS)
+                    self._pick_target(paths, occupant)
+                    break
+                occupant.cell = cell
+            if occupant.cell != start:
+                moved.append(occupant)
+        return moved
+
+
+class OccupantSimulator:
+    """Simulations en cours, une par maison (par processus)."""
+
+    _simulations: Dict[int, Simulation] = {}
+
+    @classmethod
+    def status(cls, house_id: int) -> Optional[dict]:
+        simulation = cls._simulations.get(house_id)
+        return simulation.status() if simulation else None
+
+    @classmethod
+    async def start(
+        cls,
+        session,
+        house,
+        occupants: int,
+        speed: float = DEFAULT_SPEED,
+        broadcast: bool = True,
+        seed=None,
+    ) -> dict:
+        """
+        Démarrer (ou redémarrer) la simulation d'une maison.
+
+        Raises:
+            ValueError: si la grille n'a aucune pièce
+        """
+        paths = get_grid_paths(house)
+        if not paths.room_cells:
+            raise ValueError("La grille ne contient aucune pièce")
+
+        await cls.stop(session, house.id)
+        simulation = Simulation(house.id, speed, broadcast, seed)
+        simulation.grid_version = house.grid_version
+        simulation.spawn(paths, occupants)
+        cls._simulations[house.id] = simulation
+
+        # Première présence immédiate, puis un tick toutes les SIMULATION_TICK_MS
+        await cls._publish(session, house, simulation, simulation.occupants)
+        simulation.timer = tornado.ioloop.PeriodicCallback(
+            lambda: cls._tick(house.id), SIMULATION_TICK_MS
+        )
+        simulation.timer.start()
+        return simulation.status()
+
+    @classmethod
+    def set_speed(cls, house_id: int, speed: float) -> Optional[dict]:
+        simulation = cls._simulations.get(house_id)
+        if simulation is None:
+            return None
+        simulation.speed = speed
+        return simulation.status()
+
+    @classmethod
+    async def stop(cls, session, house_id: int) -> Optional[dict]:
+        """Arrêter la simulation: les occupants quittent la maison."""
+        simulation = cls._simulations.pop(house_id, None)
+        if simulation is None:
+            return None
+        if simulation.timer is not None:
+            simulation.timer.stop()
+            simulation.timer = None
+
+        house = await cls._load_house(session, house_id, simulation)
+        if house is not None:
+            left = {occupant.id: None for occupant in simulation.occupants}
+            flips = await PresenceTracker.move_many(session, house, left)
+            await apply_presence_flips(session, flips)
+            if simulation.broadcast:
+                from ..handlers.websocket import RealtimeHandler
+
+                RealtimeHandler.broadcast_positions_batch(house_id, [], list(left))
+        return simulation.status()
+
+    @classmethod
+    def forget_house(cls, house_id: int):
+        """Maison supprimée: arrêter sans toucher à la base."""
+        simulation = cls._simulations.pop(house_id, None)
+        if simulation is not None and simulation.timer is not None:
+            simulation.timer.stop()
+
+    @classmethod
+    async def _load_house(cls, session, house_id: int, simulation: Simulation):
+        """Maison pour le tick: la grille n'est lue que si elle a changé."""
+        result = await session.execute(
+            select(House.id, House.grid_version).where(House.id == house_id)
+        )
+        row = result.one_or_none()
+        if row is None:
+            return None
+        if (
+            row.grid_version == simulation.grid_version
+            and cached_grid_index(row.id, row.grid_version) is not None
+            and cached_grid_paths(row.id, row.grid_version) is not None
+        ):
+            return SimpleNamespace(id=row.id, grid_version=row.grid_version, grid=None)
+        return await session.get(House, house_id)
+
+    @classmethod
+    async def _tick(cls, house_id: int):
+        simulation = cls._simulations.get(house_id)
+        if simulation is None:
+            return
+        try:
+            # DATABASE QUERY: Opération sur la base de données
+            async with async_session_maker() as session:
+                house = await cls._load_house(session, house_id, simulation)
+                if house is None:
+                    cls.forget_house(house_id)
+                    return
+                paths = get_grid_paths(house)
+                if simulation.grid_version != house.grid_version:
+                    simulation.grid_version = house.grid_version
+                    if not paths.room_cells:
+                        await cls.stop(session, house_id)
+                        await session.commit()
+                        return
+                    simulation.relocate(paths)
+
+                moved = simulation.advance(paths, SIMULATION_TICK_MS / 1000)
+                simulation.ticks += 1
+                await cls._publish(session, house, simulation, moved)
+        except Exception as e:
+            print(f"[Simulation] Error in house {house_id}: {e}")
+
+    @classmethod
+    async def _publish(cls, session, house, simulation: Simulation, moved):
+        """Présence pour tous les occupants, diffusion des déplacements."""
+        cols = get_grid_paths(house).cols
+        # Tous les occupants sont transmis: l'occupation peut avoir été
+        # reconstruite (grille modifiée) sans eux; les cases inchangées
+        # ne coûtent rien au tracker.
+        positions = {
+            occupant.id: (occupant.cell % cols, occupant.cell // cols)
+            for occupant in simulation.occupants
+        }
+        flips = await PresenceTracker.move_many(session, house, positions)
+        if cls._simulations.get(simulation.house_id) is not simulation:
+            # Arrêtée pendant le tick: retirer les occupants replacés
+            left = {occupant_id: None for occupant_id in positions}
+            flips.update(await PresenceTracker.move_many(session, house, left))
+            await apply_presence_flips(session, flips)
+            await session.commit()
+            return
+        await apply_presence_flips(session, flips)
+        await session.commit()
+
+        if simulation.broadcast and moved:
+            # WEBSOCKET BROADCAST: un message par maison et par tick
+            from ..handlers.websocket import RealtimeHandler
+
+            RealtimeHandler.broadcast_positions_batch(
+                simulation.house_id,
+                [
+                    {
+                        "user_id": occupant.id,
+                        "username": f"Occupant {-occupant.id}",
+                        "profile_image": None,
+                        "x": positions[occupant.id][0],
+                        "y": positions[occupant.id][1],
+                    }
+                    for occupant in moved
+                ],
+                [],
+            )
@@ -0,0 +1,139 @@
+"""
+Positions reçues par WebSocket, traitées par lots.
+
+Les clients envoient {"type": "position", "house_id", "x", "y"} sur le
+socket temps réel. Les positions sont mises en attente par maison et par
+utilisateur (la dernière position d'un tick remplace les précédentes).
+À chaque tick, chaque maison est traitée en un seul lot: une mise à jour
+des positions en mémoire, un calcul de présence et un message de diffusion.
+"""
+
+from types import SimpleNamespace
+from typing import Dict, Optional, Tuple
+
+import tornado.ioloop
+from sqlalchemy import select
+
+from ..database import async_session_maker
+from ..models import House, User
+from ..utils.grid_index import cached_grid_index, get_grid_index
+from .live_positions import LivePositions
+from .presence import PresenceTracker, apply_presence_flips
+
+# Période de traitement des positions en attente
+POSITION_TICK_MS = 200
+
+
+class PositionStream:
+    """File des positions par maison, vidée à chaque tick."""
+
+    # house_id -> {user_id: (x, y), ou None pour un départ}
+    _pending: Dict[int, Dict[int, Optional[Tuple[int, int]]]] = {}
+    _ticker: Optional[tornado.ioloop.PeriodicCallback] = None
+
+    @classmethod
+    def submit(cls, house_id: int, user_id: int, x: int, y: int):
+        """Mettre en attente la position d'un utilisateur."""
+        cls._pending.setdefault(house_id, {})[user_id] = (x, y)
+        cls._ensure_ticker()
+
+    @classmethod
+    def leave(cls, house_id: int, user_id: int):
+        """Mettre en attente le départ d'un utilisateur."""
+        cls._pending.setdefault(house_id, {})[user_id] = None
+        cls._ensure_ticker()
+
+    @classmethod
+    def _ensure_ticker(cls):
+        if cls._ticker is None:
+            cls._ticker = tornado.ioloop.PeriodicCallback(cls._tick, POSITION_TICK_MS)
+            cls._ticker.start()
+
+    @classmethod
+    async def _tick(cls):
+        if not cls._pending:
+            return
+        pending = cls._pending
+        cls._pending = {}
+        for house_id, positions in pending.items():
+            try:
+                await cls._process_house(house_id, positions)
+            except Exception as e:
+                print(f"[Positions] Error processing house {house_id}: {e}")
+
+    @classmethod
+    async def _load_house(cls, session, house_id: int):
+        """
+        Maison pour le calcul de présence: la grille (JSONB) n'est chargée
+        que si l'index en cache ne correspond plus à grid_version.
+        """
+        result = await session.execute(
+            select(House.id, House.grid_version).where(House.id == house_id)
+        )
+        row = result.one_or_none()
+        if row is None:
+            return None
+        if cached_grid_index(row.id, row.grid_version) is not None:
+            return SimpleNamespace(id=row.id, grid_version=row.grid_version, grid=None)
+        return await session.get(House, house_id)
+
+    @staticmethod
+    async def _user_info(session, user_ids):
+        """user_id -> (username, profile_image)"""
+        result = await session.execute(
+            select(User.id, User.username, User.profile_image).where(
+                User.id.in_(user_ids)
+            )
+        )
+        return {user_id: (username, image) for user_id, username, image in result.all()}
+
+    @classmethod
+    async def _process_house(cls, house_id: int, positions):
+        """Traiter en un lot les positions d'une maison."""
+        # DATABASE QUERY: Opération sur la base de données
+        async with async_session_maker() as session:
+            house = await cls._load_house(session, house_id)
+            if house is None:
+                return
+
+            # Ignorer les positions hors de la grille
+            index = get_grid_index(house)
+            positions = {
+                user_id: xy
+                for user_id, xy in positions.items()
+                if xy is None or (0 <= xy[0] < index.cols and 0 <= xy[1] < index.rows)
+            }
+            if not positions:
+                return
+
+            # Positions en mémoire; les départs sont écrits tout de suite
+            await LivePositions.update_many(session, house_id, positions)
+            if None in positions.values():
+                await LivePositions.persist(session, house_id)
+
+            # Un seul calcul de présence pour tout le lot
+            flips = await PresenceTracker.move_many(session, house, positions)
+            await apply_presence_flips(session, flips)
+            users = await cls._user_info(session, list(positions))
+            await session.commit()
+
+        # WEBSOCKET BROADCAST: un message par maison et par tick
+        from ..handlers.websocket import RealtimeHandler
+
+        moved = []
+        left = []
+        for user_id, xy in positions.items():
+            if xy is None:
+                left.append(user_id)
+                continue
+            username, profile_image = users.get(user_id, (None, None))
+            moved.append(
+                {
+                    "user_id": user_id,
+                    "username": username,
+                    "profile_image": profile_image,
+                    "x": xy[0],
+                    "y": xy[1],
+                }
+            )
+        RealtimeHandler.broadcast_positions_batch(house_id, moved, left)
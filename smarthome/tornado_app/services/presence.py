@@ -0,0 +1,235 @@
+"""
+Présence incrémentale à partir des positions des utilisateurs.
+
+Pour chaque maison, un compteur d'occupants par case et un compteur par
+capteur (occupants sur ses cases) sont tenus en mémoire. Un déplacement de
+A vers B ne touche que les capteurs qui couvrent A ou B (index de la
+grille); seuls les capteurs qui basculent (0 ↔ ≥1 occupant) sont renvoyés
+à l'appelant pour être écrits en base.
+
+L'état est reconstruit depuis les positions en direct (LivePositions) au
+premier accès et quand la grille de la maison change (grid_version).
+"""
+
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select, and_, insert
+
+from ..models import EventHistory, Sensor
+from ..utils.grid_index import get_grid_index
+from .automation_engine import AutomationEngine
+from .live_positions import LivePositions
+
+Cell = Tuple[int, int]
+
+
+class HouseOccupancy:
+    """Occupation d'une maison: cases et capteurs."""
+
+    __slots__ = ("grid_version", "user_cells", "cell_counts", "sensor_counts")
+
+    def __init__(self, grid_version):
+        self.grid_version = grid_version
+        # user_id -> case (row, col)
+        self.user_cells: Dict[int, Cell] = {}
+        # case -> nombre d'occupants
+        self.cell_counts: Dict[Cell, int] = {}
+        # sensor_id -> nombre d'occupants sur ses cases
+        self.sensor_counts: Dict[int, int] = {}
+
+    def _shift(self, index, cell: Cell, delta: int):
+        """Ajouter (+1) ou retirer (-1) un occupant sur une case."""
+        counters = [(self.cell_counts, cell)]
+        counters.extend((self.sensor_counts, s) for s in index.sensors_at(*cell))
+        for counts, key in counters:
+            count = counts.get(key, 0) + delta
+            if count > 0:
+                counts[key] = count
+            else:
+                counts.pop(key, None)
+
+    def move(self, index, user_id: int, cell: Optional[Cell]) -> Dict[int, float]:
+        """
+        Déplacer un utilisateur (cell=None: il quitte la maison).
+
+        Returns:
+            sensor_id -> nouvelle valeur, pour les capteurs qui basculent
+        """
+        return self.move_many(index, {user_id: cell})
+
+    def move_many(self, index, moves: Dict[int, Optional[Cell]]) -> Dict[int, float]:
+        """
+        Appliquer plusieurs déplacements d'un coup (un tick).
+
+        Un capteur qui bascule puis revient dans le même lot n'est pas renvoyé.
+        """
+        # Seuls les capteurs des cases quittées et atteintes peuvent basculer
+        touched = set()
+        changed = []
+        for user_id, cell in moves.items():
+            old_cell = self.user_cells.get(user_id)
+            if old_cell == cell:
+                continue
+            changed.append((user_id, old_cell, cell))
+            if old_cell is not None:
+                touched |= index.sensors_at(*old_cell)
+            if cell is not None:
+                touched |= index.sensors_at(*cell)
+        before = {s: s in self.sensor_counts for s in touched}
+
+        for user_id, old_cell, cell in changed:
+            if old_cell is not None:
+                self._shift(index, old_cell, -1)
+                del self.user_cells[user_id]
+            if cell is not None:
+                self._shift(index, cell, +1)
+                self.user_cells[user_id] = cell
+
+        return {
+            s: 1.0 if s in self.sensor_counts else 0.0
+            for s in touched
+            if (s in self.sensor_counts) != before[s]
+        }
+
+
+class PresenceTracker:
+    """Occupation en mémoire de chaque maison (par processus)."""
+
+    _houses: Dict[int, HouseOccupancy] = {}
+
+    @classmethod
+    async def _occupancy(cls, session, house) -> Tuple[HouseOccupancy, Dict[int, float]]:
+        """
+        Occupation de la maison, rechargée si absente ou si la grille a changé.
+
+        Returns:
+            (occupation, capteurs de présence dont la valeur en base
+            ne correspond pas à l'occupation rechargée)
+        """
+        occupancy = cls._houses.get(house.id)
+        if occupancy is not None and occupancy.grid_version == house.grid_version:
+            return occupancy, {}
+
+        index = get_grid_index(house)
+        occupancy = HouseOccupancy(house.grid_version)
+        positions = await LivePositions.house(session, house.id)
+        for user_id, live in positions.items():
+            occupancy.move(index, user_id, (live.y, live.x))
+        cls._houses[house.id] = occupancy
+
+        # Réconcilier les valeurs en base avec l'occupation rechargée
+        result = await session.execute(
+            select(Sensor.id, Sensor.value).where(
+                and_(Sensor.house_id == house.id, Sensor.type == "presence")
+            )
+        )
+        mismatches = {}
+        for sensor_id, value in result.all():
+            expected = 1.0 if occupancy.sensor_counts.get(sensor_id) else 0.0
+            if value != expected:
+                mismatches[sensor_id] = expected
+        return occupancy, mismatches
+
+    @classmethod
+    async def move(cls, session, house, user_id: int, x: int, y: int) -> Dict[int, float]:
+        """
+        Enregistrer la position (x, y) d'un utilisateur.
+
+        Returns:
+            sensor_id -> nouvelle valeur, pour les capteurs qui basculent
+            (tous types; l'appelant ne garde que les capteurs de présence)
+        """
+        return await cls.move_many(session, house, {user_id: (x, y)})
+
+    @classmethod
+    async def leave(cls, session, house, user_id: int) -> Dict[int, float]:
+        """Retirer un utilisateur de la maison (voir move)."""
+        return await cls.move_many(session, house, {user_id: None})
+
+    @classmethod
+    async def move_many(cls, session, house, positions) -> Dict[int, float]:
+        """
+        Appliquer les positions d'un lot: user_id -> (x, y), ou None
+        pour un départ. Voir move().
+        """
+        occupancy, flips = await cls._occupancy(session, house)
+        moves = {
+            user_id: (xy[1], xy[0]) if xy is not None else None
+            for user_id, xy in positions.items()
+        }
+        flips.update(occupancy.move_many(get_grid_index(house), moves))
+        return flips
+
+    @classmethod
+    def occupants(cls, house_id: int) -> Dict[Cell, int]:
+        """Nombre d'occupants par case (vide si la maison n'est pas chargée)."""
+        occupancy = cls._houses.get(house_id)
+        return dict(occupancy.cell_counts) if occupancy else {}
+
+    @classmethod
+    def invalidate(cls, house_id: int):
+        cls._houses.pop(house_id, None)
+
+
+async def apply_presence_flips(session, flips: Dict[int, float]):
+    """
+    Écrire uniquement les capteurs de présence qui ont basculé, les
+    historiser (relevés rejoués par le backtest), diffuser leur nouvelle
+    valeur et déclencher les automatisations.
+    """
+    if not flips:
+        return
+
+    result = await session.execute(
+        select(Sensor).where(and_(Sensor.id.in_(list(flips)), Sensor.type == "presence"))
+    )
+    now = datetime.utcnow()
+    flipped = []
+    events = []
+    for sensor in result.scalars().all():
+        new_value = flips[sensor.id]
+        if sensor.value == new_value:
+            continue
+
+        flipped.append(sensor)
+        old_value = sensor.value
+        sensor.value = new_value
+        sensor.last_update = now
+        events.append(
+            {
+                "house_id": sensor.house_id,
+                "user_id": None,  # Bascule automatique (positions)
+                "event_type": "sensor_reading",
+                "entity_type": "sensor",
+                "entity_id": sensor.id,
+                "description": f"Capteur {sensor.name}: {old_value} → {new_value}",
+                "event_metadata": {
+                    "action": "value_update",
+                    "sensor_type": sensor.type,
+                    "old_value": old_value,
+                    "new_value": new_value,
+                },
+                "created_at": now,
+            }
+        )
+        print(
+            f"[Presence] Sensor {sensor.id} ({sensor.name}): "
+            f"{old_value} → {new_value}"
+        )
+
+    if not events:
+        return
+    # Historique avant les actions qu'il déclenche (un INSERT multi-lignes)
+    await session.execute(insert(EventHistory), events)
+
+    for sensor in flipped:
+        # WEBSOCKET BROADCAST: Diffusion temps réel aux clients WebSocket
+        from ..handlers.websocket import RealtimeHandler
+
+        RealtimeHandler.broadcast_sensor_update(
+            sensor.id, sensor.value, sensor.is_active, sensor.house_id
+        )
+
+        # Déclencher les règles d'automatisation pour ce capteur
+        await AutomationEngine.evaluate_sensor(session, sensor)
@@ -0,0 +1,381 @@
+"""
+Planificateur d'automatisations (déclencheurs horaires et temporisés).
+
+Toutes les échéances vivent dans un seul tas (heapq) partagé par toutes les
+maisons; un unique timeout IOLoop est armé sur l'échéance la plus proche.
+Les annulations sont paresseuses (l'entrée reste dans le tas et est ignorée),
+le tas est compacté quand les entrées mortes deviennent majoritaires.
+"""
+
+import heapq
+import itertools
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional
+
+import tornado.ioloop
+from sqlalchemy import select, update
+
+from ..database import async_session_maker
+from ..models import AutomationSchedule, Sensor
+from .automation_engine import ActionBatch
+from .condition_network import compare
+
+# Durée maximale d'un sommeil: borne la dérive entre l'horloge murale
+# et l'horloge monotone de l'IOLoop (changement d'heure, NTP)
+MAX_SLEEP_SECONDS = 300
+
+
+def local_to_utc(value: datetime) -> datetime:
+    """Heure locale naïve → UTC naïve."""
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def utc_to_local(value: datetime) -> datetime:
+    """UTC naïve → heure locale naïve."""
+    return value.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+
+class CronExpression:
+    """
+    Expression cron à 5 champs: minute heure jour mois jour_semaine.
+
+    Chaque champ accepte `*`, des valeurs, des listes (`1,15`), des plages
+    (`8-18`) et des pas (`*/15`, `0-30/10`). Jour de semaine: 0 ou 7 = dimanche.
+    Comme cron, si jour et jour_semaine sont restreints, l'un OU l'autre suffit.
+    """
+
+    FIELDS = (
+        ("minute", 0, 59),
+        ("heure", 0, 23),
+        ("jour", 1, 31),
+        ("mois", 1, 12),
+        ("jour_semaine", 0, 7),
+    )
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError("L'expression cron doit avoir 5 champs")
+
+        values = [
+            self._parse_field(part, name, low, high)
+            for part, (name, low, high) in zip(parts, self.FIELDS)
+        ]
+        self.minutes, self.hours, self.days, self.months, weekdays = values
+        # 7 = dimanche, comme 0
+        self.weekdays = frozenset(d % 7 for d in weekdays)
+        self.any_day = parts[2] == "*"
+        self.any_weekday = parts[4] == "*"
+        self.expression = expression
+
+    @staticmethod
+    def _parse_field(field: str, name: str, low: int, high: int) -> frozenset:
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step_text = part.split("/", 1)
+                step = int(step_text)
+                if step < 1:
+                    raise ValueError(f"Pas invalide pour {name}")
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = (int(v) for v in part.split("-", 1))
+            else:
+                start = int(part)
+                end = high if step > 1 else start
+            if not (low <= start <= end <= high):
+                raise ValueError(f"Valeur hors limites pour {name}: {part}")
+            values.update(range(start, end + 1, step))
+        return frozenset(values)
+
+    def _day_matches(self, value: datetime) -> bool:
+        day_ok = value.day in self.days
+        # datetime.weekday(): lundi=0 ; cron: dimanche=0
+        weekday_ok = (value.weekday() + 1) % 7 in self.weekdays
+        if self.any_day and self.any_weekday:
+            return True
+        if self.any_day:
+            return weekday_ok
+        if self.any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, after: datetime) -> datetime:
+        """Prochaine occurrence strictement après `after` (heure locale)."""
+        value = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = value + timedelta(days=366 * 5)
+        while value < limit:
+            if value.month not in self.months:
+                first_day = value.replace(day=1, hour=0, minute=0)
+                value = (first_day + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_matches(value):
+                value = value.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if value.hour not in self.hours:
+                value = value.replace(minute=0) + timedelta(hours=1)
+                continue
+            if value.minute not in self.minutes:
+                value += timedelta(minutes=1)
+                continue
+            return value
+        raise ValueError(f"Aucune occurrence pour '{self.expression}'")
+
+
+def next_cron_run(expression: str, after_utc: datetime) -> datetime:
+    """Prochaine échéance (UTC) d'une expression cron en heure locale."""
+    local = CronExpression(expression).next_after(utc_to_local(after_utc))
+    return local_to_utc(local)
+
+
+class TimerHeap:
+    """Tas d'échéances (UTC) avec un seul timeout IOLoop actif."""
+
+    def __init__(self, callback: Callable[[int], None]):
+        self._heap = []  # (when, seq, key)
+        self._pending: Dict[int, int] = {}  # key -> seq de l'entrée valide
+        self._seq = itertools.count()
+        self._timeout = None
+        self._next_when: Optional[datetime] = None
+        self._callback = callback
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __contains__(self, key):
+        return key in self._pending
+
+    def schedule(self, key: int, when: datetime):
+        """Programmer (ou reprogrammer) `key` à l'instant `when`."""
+        seq = next(self._seq)
+        self._pending[key] = seq
+        heapq.heappush(self._heap, (when, seq, key))
+        if self._next_when is None or when < self._next_when:
+            self._rearm()
+
+    def cancel(self, key: int):
+        """Annuler `key` (suppression paresseuse)."""
+        if self._pending.pop(key, None) is None:
+            return
+        if len(self._heap) > 2 * len(self._pending) + 64:
+            self._heap = [e for e in self._heap if self._pending.get(e[2]) == e[1]]
+            heapq.heapify(self._heap)
+
+    def _rearm(self):
+        loop = tornado.ioloop.IOLoop.current()
+        if self._timeout is not None:
+            loop.remove_timeout(self._timeout)
+            self._timeout = None
+
+        heap = self._heap
+        while heap and self._pending.get(heap[0][2]) != heap[0][1]:
+            heapq.heappop(heap)
+        if not heap:
+            self._next_when = None
+            return
+
+        self._next_when = heap[0][0]
+        delay = (self._next_when - datetime.utcnow()).total_seconds()
+        delay = min(max(delay, 0), MAX_SLEEP_SECONDS)
+        self._timeout = loop.call_later(delay, self._run)
+
+    def _run(self):
+        self._timeout = None
+        self._next_when = None
+        now = datetime.utcnow()
+        due = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, seq, key = heapq.heappop(heap)
+            if self._pending.get(key) == seq:
+                del self._pending[key]
+                due.append(key)
+        self._rearm()
+        for key in due:
+            self._callback(key)
+
+
+class AutomationScheduler:
+    """Programme et exécute les AutomationSchedule actifs."""
+
+    _timers: Optional[TimerHeap] = None
+    # sensor_id -> {schedule_id: (operator, value, delay_seconds)}
+    _delay_by_sensor: Dict[int, Dict[int, tuple]] = {}
+    # schedule_id -> sensor_id (retrait sans parcourir _delay_by_sensor)
+    _delay_sensor: Dict[int, int] = {}
+    # schedule_id -> dernière valeur de la condition (déclencheurs 'delay')
+    _conditions: Dict[int, bool] = {}
+
+    @classmethod
+    def timers(cls) -> TimerHeap:
+        if cls._timers is None:
+            cls._timers = TimerHeap(cls._on_timer)
+        return cls._timers
+
+    @classmethod
+    async def start(cls):
+        """Charger tous les déclencheurs actifs (appelé au démarrage)."""
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(AutomationSchedule).where(
+                    AutomationSchedule.is_active == True  # noqa: E712
+                )
+            )
+            schedules = result.scalars().all()
+
+            # Valeur courante des capteurs surveillés par les temporisations
+            sensor_ids = {s.sensor_id for s in schedules if s.trigger_type == "delay"}
+            sensors = {}
+            if sensor_ids:
+                rows = await session.execute(
+                    select(Sensor.id, Sensor.value, Sensor.is_active).where(
+                        Sensor.id.in_(sensor_ids)
+                    )
+                )
+                sensors = {row.id: row for row in rows.all()}
+
+            for schedule in schedules:
+                cls.register(schedule)
+                sensor = sensors.get(schedule.sensor_id)
+                if (
+                    schedule.trigger_type == "delay"
+                    and schedule.next_run_at is None
+                    and sensor is not None
+                ):
+                    # Condition déjà vraie (temporisation écoulée avant l'arrêt):
+                    # pas de nouveau déclenchement avant qu'elle repasse à faux
+                    cls._conditions[schedule.id] = cls._condition_met(
+                        schedule.condition_operator, schedule.condition_value, sensor
+                    )
+            await session.commit()
+        print(f"[Scheduler] {len(schedules)} déclencheur(s) chargé(s)")
+
+    @classmethod
+    def register(cls, schedule):
+        """
+        Programmer un déclencheur. Met à jour schedule.next_run_at
+        (à persister par l'appelant).
+        """
+        cls.unregister(schedule.id)
+        if not schedule.is_active:
+            schedule.next_run_at = None
+            return
+
+        if schedule.trigger_type == "cron":
+            # Une échéance passée (serveur arrêté) est rattrapée une fois
+            if schedule.next_run_at is None:
+                schedule.next_run_at = next_cron_run(
+                    schedule.cron_expression, datetime.utcnow()
+                )
+            cls.timers().schedule(schedule.id, schedule.next_run_at)
+            return
+
+        cls._delay_sensor[schedule.id] = schedule.sensor_id
+        cls._delay_by_sensor.setdefault(schedule.sensor_id, {})[schedule.id] = (
+            schedule.condition_operator,
+            schedule.condition_value,
+            schedule.delay_seconds,
+        )
+        if schedule.next_run_at is not None:
+            # Temporisation en cours avant le redémarrage
+            cls._conditions[schedule.id] = True
+            cls.timers().schedule(schedule.id, schedule.next_run_at)
+
+    @classmethod
+    def unregister(cls, schedule_id: int):
+        """Retirer un déclencheur (modifié ou supprimé)."""
+        if cls._timers is not None:
+            cls._timers.cancel(schedule_id)
+        cls._conditions.pop(schedule_id, None)
+        sensor_id = cls._delay_sensor.pop(schedule_id, None)
+        if sensor_id is None:
+            return
+        watchers = cls._delay_by_sensor.get(sensor_id)
+        if watchers is not None:
+            watchers.pop(schedule_id, None)
+            if not watchers:
+                del cls._delay_by_sensor[sensor_id]
+
+    @staticmethod
+    def _condition_met(op, threshold, sensor) -> bool:
+        return bool(
+            sensor.is_active
+            and sensor.value is not None
+            and compare(op, sensor.value, threshold)
+        )
+
+    @classmethod
+    async def on_sensor_value(cls, session, sensor):
+        """
+        Armer ou annuler les temporisations qui surveillent ce capteur.
+        Les échéances sont écrites dans la session (commit par l'appelant).
+        """
+        watchers = cls._delay_by_sensor.get(sensor.id)
+        if not watchers:
+            return
+
+        now = datetime.utcnow()
+        for schedule_id, (op, threshold, delay) in watchers.items():
+            condition_met = cls._condition_met(op, threshold, sensor)
+            if condition_met == cls._conditions.get(schedule_id, False):
+                continue
+            cls._conditions[schedule_id] = condition_met
+
+            if condition_met:
+                next_run_at = now + timedelta(seconds=delay or 0)
+                cls.timers().schedule(schedule_id, next_run_at)
+            else:
+                next_run_at = None
+                cls.timers().cancel(schedule_id)
+            await session.execute(
+                update(AutomationSchedule)
+                .where(AutomationSchedule.id == schedule_id)
+                .values(next_run_at=next_run_at)
+            )
+
+    @classmethod
+    def _on_timer(cls, schedule_id: int):
+        tornado.ioloop.IOLoop.current().add_callback(cls._fire, schedule_id)
+
+    @classmethod
+    async def _fire(cls, schedule_id: int):
+        """Exécuter l'action d'un déclencheur arrivé à échéance."""
+        try:
+            async with async_session_maker() as session:
+                schedule = await session.get(AutomationSchedule, schedule_id)
+                if not schedule or not schedule.is_active:
+                    return
+
+                now = datetime.utcnow()
+                batch = ActionBatch(now)
+                batch.propose(
+                    schedule.equipment_id,
+                    schedule.action_state,
+                    0,
+                    entity_type="automation_schedule",
+                    entity_id=schedule.id,
+                    label=f"Programmation '{schedule.name}'",
+                    metadata={
+                        "schedule_name": schedule.name,
+                        "trigger_type": schedule.trigger_type,
+                        "cron_expression": schedule.cron_expression,
+                        "delay_seconds": schedule.delay_seconds,
+                    },
+                    info={"schedule_id": schedule.id, "schedule_name": schedule.name},
+                )
+                await batch.flush(session)
+                schedule.last_run_at = now
+
+                if schedule.trigger_type == "cron":
+                    schedule.next_run_at = next_cron_run(schedule.cron_expression, now)
+                    cls.timers().schedule(schedule.id, schedule.next_run_at)
+                else:
+                    # La condition reste vraie: pas de nouveau déclenchement
+                    # avant qu'elle ne repasse à faux
+                    schedule.next_run_at = None
+
+                await session.commit()
+        except Exception as e:
+            print(f"[Scheduler] Error running schedule {schedule_id}: {e}")
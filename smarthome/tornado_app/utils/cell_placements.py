@@ -0,0 +1,225 @@
+"""
+Placements des capteurs et équipements sur les cases de la grille.
+
+La table cell_placements est une copie indexée des couches sensors et
+equipments de house.grid, tenue à jour à chaque écriture de la grille
+(PUT, éditeur, PATCH). Elle répond en SQL indexé à "quelles cases couvre ce
+capteur ?" et permet de retirer un capteur de la grille en ne réécrivant
+que ses cases (jsonb_set), sans lire ni parcourir la grille.
+"""
+
+import json
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Text, cast, delete, func, insert, literal, select, tuple_, update
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+
+from ..models import CellPlacement, Equipment, House, Sensor
+from .grid_layers import CompactGrid, apply_cell_changes
+
+Cell = Tuple[int, int]
+
+# Au-delà, la grille est relue et réécrite en entier plutôt que par jsonb_set
+MAX_PATCH_CELLS = 256
+
+# Couche de la grille -> (colonne de cell_placements, modèle référencé)
+PLACEMENT_FIELDS = {
+    "sensors": (CellPlacement.sensor_id, Sensor),
+    "equipments": (CellPlacement.equipment_id, Equipment),
+}
+
+
+def grid_patch_expression(cells: Dict[Cell, dict]):
+    """
+    Expression SQL qui applique les modifications à houses.grid avec
+    jsonb_set: chaque case est fusionnée (||) avec ses nouveaux champs.
+    """
+    expression = House.grid
+    for (row, col), fields in cells.items():
+        path = cast(literal(f"{{{row},{col}}}"), ARRAY(Text))
+        patch = cast(literal(json.dumps(fields)), JSONB)
+        expression = func.jsonb_set(
+            expression, path, House.grid[row][col].op("||")(patch)
+        )
+    return expression
+
+
+async def _known_ids(session, house_id: int, model, ids) -> set:
+    """Ids de `ids` qui existent bien dans la maison (clé étrangère)."""
+    if not ids:
+        return set()
+    result = await session.execute(
+        select(model.id).where(model.house_id == house_id, model.id.in_(ids))
+    )
+    return set(result.scalars().all())
+
+
+def grid_overlays(grid: CompactGrid) -> Dict[str, dict]:
+    """Couches {couche: {(row, col): ids}} d'une grille complète."""
+    return {"sensors": grid.sensors, "equipments": grid.equipments}
+
+
+def cell_overlays(cells: Dict[Cell, dict]) -> Dict[str, dict]:
+    """Couches {couche: {(row, col): ids}} des cases modifiées."""
+    return {
+        field: {cell: fields[field] for cell, fields in cells.items() if field in fields}
+        for field in PLACEMENT_FIELDS
+    }
+
+
+async def check_overlay_ids(session, house_id: int, overlays: Dict[str, dict]):
+    """
+    Vérifier que les capteurs et équipements cités par les couches
+    appartiennent à la maison (à appeler avant d'écrire la grille).
+
+    Raises:
+        ValueError: ids inconnus (supprimés ou d'une autre maison)
+    """
+    for field, cells in overlays.items():
+        _column, model = PLACEMENT_FIELDS[field]
+        wanted = {item_id for ids in cells.values() for item_id in ids}
+        unknown = wanted - await _known_ids(session, house_id, model, wanted)
+        if unknown:
+            raise ValueError(
+                f"Unknown {field} ids: {', '.join(map(str, sorted(unknown)))}"
+            )
+
+
+async def _insert_placements(
+    session, house_id: int, overlays: Dict[str, dict], skip_unknown: bool = False
+):
+    """
+    Insérer en un lot les placements {couche: {(row, col): ids}}. Les ids
+    sont vérifiés par l'appelant (check_overlay_ids), ou écartés ici si
+    `skip_unknown`.
+    """
+    rows = []
+    for field, cells in overlays.items():
+        column, model = PLACEMENT_FIELDS[field]
+        if skip_unknown:
+            wanted = {item_id for ids in cells.values() for item_id in ids}
+            known = await _known_ids(session, house_id, model, wanted)
+            cells = {
+                cell: [item_id for item_id in ids if item_id in known]
+                for cell, ids in cells.items()
+            }
+        rows.extend(
+            {
+                "house_id": house_id,
+                "row": row,
+                "col": col,
+                "sensor_id": None,
+                "equipment_id": None,
+                column.key: item_id,
+            }
+            for (row, col), ids in cells.items()
+            for item_id in dict.fromkeys(ids)
+        )
+    if rows:
+        await session.execute(insert(CellPlacement), rows)
+
+
+async def replace_placements(
+    session, house_id: int, grid: CompactGrid, skip_unknown: bool = False
+):
+    """
+    Remplacer tous les placements de la maison par ceux de `grid`.
+    `skip_unknown`: ignorer les ids supprimés (grilles déjà en base,
+    migrate_grids) au lieu de les faire vérifier par check_overlay_ids.
+    """
+    # DATABASE QUERY: placements reconstruits depuis les couches de la grille
+    await session.execute(
+        delete(CellPlacement).where(CellPlacement.house_id == house_id)
+    )
+    await _insert_placements(session, house_id, grid_overlays(grid), skip_unknown)
+
+
+async def update_cell_placements(session, house_id: int, cells: Dict[Cell, dict]):
+    """
+    Reporter les cases modifiées (voir normalize_cell_changes): seules les
+    couches présentes dans une case sont remplacées.
+    """
+    overlays = {}
+    for field, changed in cell_overlays(cells).items():
+        if not changed:
+            continue
+        column, _model = PLACEMENT_FIELDS[field]
+        # DATABASE QUERY: anciens placements de ces cases pour cette couche
+        await session.execute(
+            delete(CellPlacement).where(
+                CellPlacement.house_id == house_id,
+                column.is_not(None),
+                tuple_(CellPlacement.row, CellPlacement.col).in_(list(changed)),
+            )
+        )
+        overlays[field] = changed
+    if overlays:
+        await _insert_placements(session, house_id, overlays)
+
+
+async def placement_cells(session, field: str, item_id: int) -> List[Cell]:
+    """Cases (row, col) couvertes par le capteur ou l'équipement `item_id`."""
+    column, _model = PLACEMENT_FIELDS[field]
+    # DATABASE QUERY: lecture indexée (ix_cell_placements_sensor/_equipment)
+    result = await session.execute(
+        select(CellPlacement.row, CellPlacement.col)
+        .where(column == item_id)
+        .order_by(CellPlacement.row, CellPlacement.col)
+    )
+    return [tuple(cell) for cell in result.all()]
+
+
+async def detach_from_grid(
+    session, house_id: int, field: str, item_id: int
+) -> Optional[Tuple[int, List[dict]]]:
+    """
+    Retirer un capteur ou un équipement de la grille avant sa suppression:
+    ses placements sont supprimés et seules ses cases sont réécrites, avec
+    les ids restants. La transaction n'est pas validée.
+
+    Returns:
+        (nouvelle grid_version, cases modifiées) pour la diffusion
+        grid_patch, ou None si l'élément n'était placé nulle part
+    """
+    column, _model = PLACEMENT_FIELDS[field]
+    cells = await placement_cells(session, field, item_id)
+    if not cells:
+        return None
+
+    await session.execute(delete(CellPlacement).where(column == item_id))
+    # DATABASE QUERY: ce qui reste sur ces cases pour la même couche
+    result = await session.execute(
+        select(CellPlacement.row, CellPlacement.col, column)
+        .where(
+            CellPlacement.house_id == house_id,
+            column.is_not(None),
+            tuple_(CellPlacement.row, CellPlacement.col).in_(cells),
+        )
+        .order_by(CellPlacement.id)
+    )
+    remaining = {cell: [] for cell in cells}
+    for row, col, other_id in result.all():
+        remaining[(row, col)].append(other_id)
+    patch = {cell: {field: ids} for cell, ids in remaining.items()}
+
+    if len(patch) <= MAX_PATCH_CELLS:
+        grid = grid_patch_expression(patch)
+    else:
+        current = await session.scalar(select(House.grid).where(House.id == house_id))
+        grid = apply_cell_changes(CompactGrid.from_json(current), patch).to_layers()
+
+    version = await session.scalar(
+        update(House)
+        .where(
+            House.id == house_id,
+            # Une grille legacy n'a pas de couches
+            func.jsonb_typeof(House.grid[0][0]) == "object",
+        )
+        .values(grid=grid, grid_version=House.grid_version + 1)
+        .returning(House.grid_version)
+        .execution_options(synchronize_session=False)
+    )
+    if version is None:
+        return None
+    changes = [{"row": r, "col": c, **fields} for (r, c), fields in patch.items()]
+    return version, changes
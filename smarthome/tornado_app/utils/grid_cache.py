@@ -0,0 +1,124 @@
+"""
+Grilles déjà sérialisées en JSON, par maison.
+
+La grille ne change qu'à chaque incrément de house.grid_version: sa forme
+JSON est calculée une fois par version puis réutilisée telle quelle dans
+les réponses (sans repasser par json.dumps). Le format compact (rle) est
+sérialisé à la première demande et gardé de la même façon. Chaque chemin
+d'écriture de la grille appelle invalidate_grid_json.
+"""
+
+import hashlib
+import json
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select
+
+from ..models import House
+from .grid_layers import GRID_FORMAT_FULL, GRID_FORMAT_RLE, encode_grid
+
+
+class SerializedGrid:
+    """JSON d'une version de grille."""
+
+    __slots__ = ("version", "json", "rle")
+
+    def __init__(self, version, grid):
+        self.version = version
+        self.json = json.dumps(grid, separators=(",", ":"))
+        self.rle = None
+
+    def encoded(self, grid_format: str, grid=None) -> str:
+        """JSON de la grille dans le format de transport `grid_format`."""
+        if grid_format != GRID_FORMAT_RLE:
+            return self.json
+        if self.rle is None:
+            if grid is None:
+                grid = json.loads(self.json)
+            self.rle = json.dumps(
+                encode_grid(grid, GRID_FORMAT_RLE), separators=(",", ":")
+            )
+        return self.rle
+
+
+# house_id -> grille sérialisée de la dernière version vue
+_grids: Dict[int, SerializedGrid] = {}
+
+
+def cached_grid_json(house_id: int, version) -> Optional[SerializedGrid]:
+    """Grille sérialisée en cache si elle correspond à `version` (sinon None)."""
+    serialized = _grids.get(house_id)
+    if serialized is not None and serialized.version == version:
+        return serialized
+    return None
+
+
+def store_grid_json(house_id: int, version, grid) -> SerializedGrid:
+    """Sérialiser et garder la grille d'une version."""
+    serialized = SerializedGrid(version, grid)
+    _grids[house_id] = serialized
+    return serialized
+
+
+def invalidate_grid_json(house_id: int):
+    """Oublier la grille sérialisée (grille modifiée ou maison supprimée)."""
+    _grids.pop(house_id, None)
+
+
+def grid_marker(house_id: int) -> str:
+    """Valeur provisoire de "grid" dans une réponse (voir json_with_grids)."""
+    # Un octet nul ne peut pas figurer dans un texte PostgreSQL
+    return f"\x00grid:{house_id}"
+
+
+async def load_grid_jsons(
+    session, houses: Iterable[Tuple[int, int]], grid_format: str = GRID_FORMAT_FULL
+) -> Dict[str, str]:
+    """
+    Grilles sérialisées des maisons (house_id, grid_version) dans le format
+    `grid_format`, lues en base en une seule requête pour celles qui ne
+    sont pas en cache.
+
+    Returns:
+        marqueur (grid_marker) -> JSON de la grille
+    """
+    grids = {}
+    missing = []
+    for house_id, version in houses:
+        serialized = cached_grid_json(house_id, version)
+        if serialized is None:
+            missing.append(house_id)
+        else:
+            grids[grid_marker(house_id)] = serialized.encoded(grid_format)
+    if missing:
+        result = await session.execute(
+            select(House.id, House.grid, House.grid_version).where(
+                House.id.in_(missing)
+            )
+        )
+        for house_id, grid, version in result.all():
+            serialized = store_grid_json(house_id, version, grid)
+            grids[grid_marker(house_id)] = serialized.encoded(grid_format, grid)
+    return grids
+
+
+def grid_etag(*parts) -> str:
+    """
+    ETag fort d'une réponse: empreinte de ses parties (données sans la
+    grille, puis (house_id, grid_version) de chaque grille incluse).
+    """
+    digest = hashlib.sha1(
+        json.dumps(parts, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+def json_with_grids(data: dict, grids: Dict[str, str]) -> str:
+    """
+    JSON de `data` dans lequel chaque valeur égale à une clé de `grids`
+    (marqueur) est remplacée par le JSON pré-sérialisé correspondant.
+    """
+    body = json.dumps(data, default=str)
+    for marker, grid_json in grids.items():
+        body = body.replace(json.dumps(marker), grid_json, 1)
+    return body
@@ -0,0 +1,114 @@
+"""
+Index de couverture de la grille d'une maison.
+
+Construit en un seul parcours de la grille, il répond en O(1) aux questions
+"quelles cases couvre ce capteur ?" et "quels capteurs/équipements sont sur
+cette case ?". Un index par maison est gardé en mémoire et reconstruit
+uniquement quand house.grid_version change.
+
+Les cases sont des tuples (row, col), soit (y, x) pour une position.
+"""
+
+from typing import Dict, List, Set, Tuple
+
+Cell = Tuple[int, int]
+
+
+class GridCoverageIndex:
+    """Capteurs et équipements indexés par case, et inversement."""
+
+    __slots__ = (
+        "version",
+        "rows",
+        "cols",
+        "sensor_cells",
+        "equipment_cells",
+        "cell_sensors",
+        "cell_equipments",
+    )
+
+    def __init__(self, version=None):
+        self.version = version
+        self.rows = 0
+        self.cols = 0
+        self.sensor_cells: Dict[int, List[Cell]] = {}
+        self.equipment_cells: Dict[int, List[Cell]] = {}
+        self.cell_sensors: Dict[Cell, Set[int]] = {}
+        self.cell_equipments: Dict[Cell, Set[int]] = {}
+
+    @classmethod
+    def build(cls, grid, version=None) -> "GridCoverageIndex":
+        """Parcourir la grille une fois (grille legacy: index vide)."""
+        from .grid_layers import CompactGrid
+
+        index = cls(version)
+        if isinstance(grid, CompactGrid):
+            # Couches creuses: seules les cases occupées sont parcourues
+            index.rows, index.cols = grid.rows, grid.cols
+            for key, sensors in grid.sensors.items():
+                for sensor_id in sensors:
+                    index.sensor_cells.setdefault(sensor_id, []).append(key)
+                index.cell_sensors[key] = set(sensors)
+            for key, equipments in grid.equipments.items():
+                for equipment_id in equipments:
+                    index.equipment_cells.setdefault(equipment_id, []).append(key)
+                index.cell_equipments[key] = set(equipments)
+            return index
+        if not grid:
+            return index
+        index.rows = len(grid)
+        index.cols = len(grid[0]) if grid[0] else 0
+        for row_idx, row in enumerate(grid):
+            for col_idx, cell in enumerate(row):
+                if not isinstance(cell, dict):
+                    continue
+                sensors = cell.get("sensors")
+                equipments = cell.get("equipments")
+                if not sensors and not equipments:
+                    continue
+                key = (row_idx, col_idx)
+                for sensor_id in sensors or ():
+                    index.sensor_cells.setdefault(sensor_id, []).append(key)
+                    index.cell_sensors.setdefault(key, set()).add(sensor_id)
+                for equipment_id in equipments or ():
+                    index.equipment_cells.setdefault(equipment_id, []).append(key)
+                    index.cell_equipments.setdefault(key, set()).add(equipment_id)
+        return index
+
+    def sensors_at(self, row: int, col: int) -> Set[int]:
+        return self.cell_sensors.get((row, col), set())
+
+    def equipments_at(self, row: int, col: int) -> Set[int]:
+        return self.cell_equipments.get((row, col), set())
+
+    def cells_of_sensor(self, sensor_id: int) -> List[Cell]:
+        return self.sensor_cells.get(sensor_id, [])
+
+    def cells_of_equipment(self, equipment_id: int) -> List[Cell]:
+        return self.equipment_cells.get(equipment_id, [])
+
+
+# house_id -> index de la dernière version de grille vue
+_indexes: Dict[int, GridCoverageIndex] = {}
+
+
+def get_grid_index(house) -> GridCoverageIndex:
+    """Index de la grille de `house`, reconstruit si grid_version a changé."""
+    index = _indexes.get(house.id)
+    if index is None or index.version != house.grid_version:
+        index = GridCoverageIndex.build(house.grid, house.grid_version)
+        _indexes[house.id] = index
+    return index
+
+
+def cached_grid_index(house_id: int, version):
+    """Index en cache s'il correspond à `version` (sinon None)."""
+    index = _indexes.get(house_id)
+    if index is not None and index.version == version:
+        return index
+    return None
+
+
+def invalidate_grid_index(house_id: int):
+    """Oublier l'index d'une maison (grille modifiée ou maison supprimée)."""
+    _indexes.pop(house_id, None)
@@ -1,11 +1,209 @@
 """
 Utilitaires pour gérer la grille en couches (layered grid system).
 Permet le chevauchement de pièces, capteurs et équipements.
+
+Les recherches "quelles cases couvre ce capteur ?" passent par l'index en
+cache (grid_index.get_grid_index) ou par cell_placements, jamais par un
+parcours de la grille.
+
+En mémoire, une grille peut être une CompactGrid: la couche de base est une
+matrice NumPy et les capteurs/équipements sont des dictionnaires creux
+(seules les cases occupées y figurent). Les formats JSON (legacy et couches)
+ne servent qu'aux frontières: base de données, API et WebSocket. Toutes les
+fonctions de ce module acceptent les trois représentations.
+
+Avec GRID_STRICT_LAYERS=true (une fois toutes les grilles converties par
+migrate_grids), is_legacy_grid répond False sans inspecter la grille: les
+chemins legacy ne sont plus jamais empruntés.
 """
 
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from ..config import get_grid_strict_layers
+
+STRICT_LAYERS = get_grid_strict_layers()
+
+# Formats de transport de la grille (API et WebSocket)
+GRID_FORMAT_FULL = "full"
+GRID_FORMAT_RLE = "rle"
+GRID_FORMATS = (GRID_FORMAT_FULL, GRID_FORMAT_RLE)
+
+Cell = Tuple[int, int]
+
+
+class CompactGrid:
+    """Grille compacte: base NumPy (rows x cols) + couches creuses."""
+
+    __slots__ = ("base", "sensors", "equipments")
+
+    def __init__(self, base, sensors=None, equipments=None):
+        self.base = np.asarray(base, dtype=np.int32)
+        # (row, col) -> ids, uniquement pour les cases non vides
+        self.sensors: Dict[Cell, List[int]] = sensors or {}
+        self.equipments: Dict[Cell, List[int]] = equipments or {}
+
+    @property
+    def rows(self) -> int:
+        return int(self.base.shape[0])
+
+    @property
+    def cols(self) -> int:
+        return int(self.base.shape[1])
+
+    @classmethod
+    def walled(cls, rows: int, cols: int) -> "CompactGrid":
+        """Grille vide (0) entourée de murs (1)."""
+        base = np.ones((rows, cols), dtype=np.int32)
+        base[1:-1, 1:-1] = 0
+        return cls(base)
+
+    @classmethod
+    def from_json(cls, grid) -> "CompactGrid":
+        """
+        Lire une grille JSON (legacy ou en couches).
+
+        Raises:
+            ValueError: grille vide, non rectangulaire ou cellule invalide
+        """
+        if isinstance(grid, CompactGrid):
+            return grid
+        if not grid or not isinstance(grid, list) or not isinstance(grid[0], list):
+            raise ValueError("La grille doit être un tableau 2D non vide")
+        cols = len(grid[0])
+        if cols == 0 or any(
+            not isinstance(row, list) or len(row) != cols for row in grid
+        ):
+            raise ValueError("La grille doit être rectangulaire")
+
+        if is_legacy_grid(grid):
+            try:
+                return cls(np.array(grid, dtype=np.int32))
+            except (TypeError, ValueError):
+                raise ValueError("Cellule de grille invalide")
+
+        compact = cls(np.zeros((len(grid), cols), dtype=np.int32))
+        for row_idx, row in enumerate(grid):
+            for col_idx, cell in enumerate(row):
+                try:
+                    compact.base[row_idx, col_idx] = int(cell.get("base", 0))
+                    if cell.get("sensors"):
+                        compact.sensors[(row_idx, col_idx)] = [
+                            int(s) for s in cell["sensors"]
+                        ]
+                    if cell.get("equipments"):
+                        compact.equipments[(row_idx, col_idx)] = [
+                            int(e) for e in cell["equipments"]
+                        ]
+                except (AttributeError, TypeError, ValueError):
+                    raise ValueError(f"Cellule invalide en ({row_idx}, {col_idx})")
+        return compact
+
+    def to_layers(self, simplified=False) -> list:
+        """Grille JSON en couches (simplified: sans listes vides)."""
+        grid = []
+        for row_idx, row in enumerate(self.base.tolist()):
+            json_row = []
+            for col_idx, base in enumerate(row):
+                sensors = self.sensors.get((row_idx, col_idx))
+                equipments = self.equipments.get((row_idx, col_idx))
+                if simplified:
+                    cell = {"base": base}
+                    if sensors:
+                        cell["sensors"] = list(sensors)
+                    if equipments:
+                        cell["equipments"] = list(equipments)
+                else:
+                    cell = {
+                        "base": base,
+                        "sensors": list(sensors or ()),
+                        "equipments": list(equipments or ()),
+                    }
+                json_row.append(cell)
+            grid.append(json_row)
+        return grid
+
+    def to_legacy(self) -> list:
+        """Grille JSON legacy (couche de base seule)."""
+        return self.base.tolist()
+
+    def to_rle(self) -> dict:
+        """
+        Format de transport compact: couche de base encodée par plages, ligne
+        par ligne ([valeur, longueur, valeur, longueur, ...]), et couches
+        creuses en liste [row, col, ids].
+        """
+        runs = []
+        for values in self.base:
+            # Début de chaque plage: première case et cases qui changent de valeur
+            starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+            lengths = np.diff(np.r_[starts, values.size])
+            runs.append(np.column_stack((values[starts], lengths)).ravel().tolist())
+        return {
+            "encoding": GRID_FORMAT_RLE,
+            "rows": self.rows,
+            "cols": self.cols,
+            "base": runs,
+            "sensors": [
+                [row, col, list(ids)]
+                for (row, col), ids in sorted(self.sensors.items())
+            ],
+            "equipments": [
+                [row, col, list(ids)]
+                for (row, col), ids in sorted(self.equipments.items())
+            ],
+        }
+
+    def copy(self) -> "CompactGrid":
+        return CompactGrid(
+            self.base.copy(),
+            {cell: list(ids) for cell, ids in self.sensors.items()},
+            {cell: list(ids) for cell, ids in self.equipments.items()},
+        )
+
+    def cell(self, row: int, col: int) -> dict:
+        return {
+            "base": int(self.base[row, col]),
+            "sensors": list(self.sensors.get((row, col), ())),
+            "equipments": list(self.equipments.get((row, col), ())),
+        }
+
+
+def as_compact_grid(grid) -> CompactGrid:
+    """Grille en mémoire compacte (accepte déjà une CompactGrid)."""
+    return CompactGrid.from_json(grid)
+
+
+def encode_grid(grid, grid_format: str):
+    """Grille JSON dans le format de transport demandé (GRID_FORMATS)."""
+    if grid_format != GRID_FORMAT_RLE:
+        return grid
+    try:
+        return as_compact_grid(grid).to_rle()
+    except ValueError:
+        # Grille vide ou invalide: transmise telle quelle
+        return grid
+
+
+def _add_to_overlay(overlay, row, col, item_id):
+    ids = overlay.setdefault((row, col), [])
+    if item_id not in ids:
+        ids.append(item_id)
+
+
+def _remove_from_overlay(overlay, row, col, item_id):
+    ids = overlay.get((row, col))
+    if ids and item_id in ids:
+        ids.remove(item_id)
+        if not ids:
+            del overlay[(row, col)]
+
 
 def is_legacy_grid(grid):
     """Vérifie si la grille est au format legacy (tableau 2D d'entiers)."""
+    if STRICT_LAYERS:
+        return False
     if not grid or not isinstance(grid, list):
         return False
     if not grid[0] or not isinstance(grid[0], list):
@@ -39,6 +237,8 @@ def migrate_grid_to_layers(grid):
 
 def get_cell_base(grid, row, col):
     """Obtenir la valeur de base d'une cellule (pièce/mur/vide)."""
+    if isinstance(grid, CompactGrid):
+        return int(grid.base[row, col])
     if is_legacy_grid(grid):
         return grid[row][col]
     return grid[row][col].get("base", 0)
@@ -46,7 +246,9 @@ def get_cell_base(grid, row, col):
 
 def set_cell_base(grid, row, col, value):
     """Définir la valeur de base d'une cellule."""
-    if is_legacy_grid(grid):
+    if isinstance(grid, CompactGrid):
+        grid.base[row, col] = value
+    elif is_legacy_grid(grid):
         grid[row][col] = value
     else:
         grid[row][col]["base"] = value
@@ -54,6 +256,9 @@ def set_cell_base(grid, row, col, value):
 
 def add_sensor_to_cell(grid, row, col, sensor_id):
     """Ajouter un capteur à une cellule."""
+    if isinstance(grid, CompactGrid):
+        _add_to_overlay(grid.sensors, row, col, sensor_id)
+        return grid
     if is_legacy_grid(grid):
         grid = migrate_grid_to_layers(grid)
 
@@ -65,6 +270,9 @@ def add_sensor_to_cell(grid, row, col, sensor_id):
 
 def remove_sensor_from_cell(grid, row, col, sensor_id):
     """Retirer un capteur d'une cellule."""
+    if isinstance(grid, CompactGrid):
+        _remove_from_overlay(grid.sensors, row, col, sensor_id)
+        return grid
     if is_legacy_grid(grid):
         return grid
 
@@ -76,6 +284,9 @@ def remove_sensor_from_cell(grid, row, col, sensor_id):
 
 def add_equipment_to_cell(grid, row, col, equipment_id):
     """Ajouter un équipement à une cellule."""
+    if isinstance(grid, CompactGrid):
+        _add_to_overlay(grid.equipments, row, col, equipment_id)
+        return grid
     if is_legacy_grid(grid):
         grid = migrate_grid_to_layers(grid)
 
@@ -87,6 +298,9 @@ def add_equipment_to_cell(grid, row, col, equipment_id):
 
 def remove_equipment_from_cell(grid, row, col, equipment_id):
     """Retirer un équipement d'une cellule."""
+    if isinstance(grid, CompactGrid):
+        _remove_from_overlay(grid.equipments, row, col, equipment_id)
+        return grid
     if is_legacy_grid(grid):
         return grid
 
@@ -96,51 +310,6 @@ def remove_equipment_from_cell(grid, row, col, equipment_id):
     return grid
 
 
-def get_sensor_coverage(grid, sensor_id):
-    """
-    Obtenir toutes les cellules couvertes par un capteur.
-
-    Returns:
-        List[tuple]: Liste de (row, col) couverts par le capteur
-    """
-    if is_legacy_grid(grid):
-        return []
-
-    coverage = []
-    for row_idx, row in enumerate(grid):
-        for col_idx, cell in enumerate(row):
-            if sensor_id in cell.get("sensors", []):
-                coverage.append((row_idx, col_idx))
-
-    return coverage
-
-
-def clear_sensor_from_grid(grid, sensor_id):
-    """Retirer complètement un capteur de toute la grille."""
-    if is_legacy_grid(grid):
-        return grid
-
-    for row in grid:
-        for cell in row:
-            if sensor_id in cell.get("sensors", []):
-                cell["sensors"].remove(sensor_id)
-
-    return grid
-
-
-def clear_equipment_from_grid(grid, equipment_id):
-    """Retirer complètement un équipement de toute la grille."""
-    if is_legacy_grid(grid):
-        return grid
-
-    for row in grid:
-        for cell in row:
-            if equipment_id in cell.get("equipments", []):
-                cell["equipments"].remove(equipment_id)
-
-    return grid
-
-
 def paint_sensor_area(grid, sensor_id, cells):
     """
     Peindre une zone pour un capteur (étendre sa portée).
@@ -170,6 +339,8 @@ def get_cell_info(grid, row, col):
             "equipments": List[int]
         }
     """
+    if isinstance(grid, CompactGrid):
+        return grid.cell(row, col)
     if is_legacy_grid(grid):
         return {"base": grid[row][col], "sensors": [], "equipments": []}
 
@@ -180,6 +351,8 @@ def simplify_grid_for_export(grid):
     """
     Simplifie la grille pour l'export (retire les listes vides).
     """
+    if isinstance(grid, CompactGrid):
+        return grid.to_layers(simplified=True)
     if is_legacy_grid(grid):
         return grid
 
@@ -199,3 +372,60 @@ def simplify_grid_for_export(grid):
         simplified.append(simplified_row)
 
     return simplified
+
+
+CELL_FIELDS = ("base", "sensors", "equipments")
+
+
+def normalize_cell_changes(changes, rows: int, cols: int) -> Dict[Cell, dict]:
+    """
+    Valider une liste de modifications de cases.
+
+    Chaque modification: {"row", "col"} et au moins un champ parmi "base"
+    (entier), "sensors" et "equipments" (listes d'entiers). Les
+    modifications d'une même case sont fusionnées (la dernière l'emporte).
+
+    Returns:
+        (row, col) -> champs à remplacer
+
+    Raises:
+        ValueError: modification invalide ou hors de la grille
+    """
+    if not isinstance(changes, list) or not changes:
+        raise ValueError("changes doit être une liste non vide")
+
+    cells: Dict[Cell, dict] = {}
+    for position, change in enumerate(changes):
+        try:
+            row, col = int(change["row"]), int(change["col"])
+            fields = {}
+            if "base" in change:
+                fields["base"] = int(change["base"])
+            for name in ("sensors", "equipments"):
+                if name in change:
+                    if not isinstance(change[name], list):
+                        raise TypeError
+                    fields[name] = [int(item) for item in change[name]]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"Modification invalide (index {position})")
+        if not fields:
+            raise ValueError(f"Modification sans champ (index {position})")
+        if not (0 <= row < rows and 0 <= col < cols):
+            raise ValueError(f"Case ({row}, {col}) hors de la grille")
+        cells.setdefault((row, col), {}).update(fields)
+    return cells
+
+
+def apply_cell_changes(grid: CompactGrid, cells: Dict[Cell, dict]) -> CompactGrid:
+    """Appliquer des modifications normalisées à une CompactGrid."""
+    for (row, col), fields in cells.items():
+        if "base" in fields:
+            grid.base[row, col] = fields["base"]
+        for name in ("sensors", "equipments"):
+            if name in fields:
+                overlay = getattr(grid, name)
+                if fields[name]:
+                    overlay[(row, col)] = list(fields[name])
+                else:
+                    overlay.pop((row, col), None)
+    return grid
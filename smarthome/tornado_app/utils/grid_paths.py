@@ -0,0 +1,136 @@
+"""
+Champs de distance sur la couche de base de la grille (murs).
+
+Pour chaque pièce cible, un parcours en largeur depuis toutes ses cases
+donne la distance de chaque case praticable à la pièce. Un occupant
+rejoint la pièce en passant à chaque pas sur une case voisine plus proche:
+aucun calcul de chemin par occupant. Les champs sont calculés à la demande
+et gardés en mémoire par maison jusqu'au changement de grid_version.
+
+Les cases sont indexées à plat: index = row * cols + col.
+"""
+
+from array import array
+from collections import deque
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .grid_layers import as_compact_grid
+
+WALL = 1
+ROOM_MIN = 2000
+ROOM_MAX = 3000
+UNREACHABLE = -1
+
+
+class GridPaths:
+    """Cases praticables, cases des pièces et champs de distance."""
+
+    __slots__ = ("version", "rows", "cols", "walkable", "room_cells", "_fields")
+
+    def __init__(self, version=None):
+        self.version = version
+        self.rows = 0
+        self.cols = 0
+        self.walkable = bytearray()
+        # code de pièce (2000 + room.id) -> cases (index à plat)
+        self.room_cells: Dict[int, List[int]] = {}
+        self._fields: Dict[int, array] = {}
+
+    @classmethod
+    def build(cls, grid, version=None) -> "GridPaths":
+        """Lire la couche de base (mur: 1, pièce: 2xxx, vide: 0)."""
+        paths = cls(version)
+        if isinstance(grid, list) and (not grid or not grid[0]):
+            return paths
+        compact = as_compact_grid(grid)
+        paths.rows, paths.cols = compact.rows, compact.cols
+        base = compact.base.ravel()
+        paths.walkable = bytearray((base != WALL).astype(np.uint8).tobytes())
+        rooms = np.flatnonzero((base >= ROOM_MIN) & (base < ROOM_MAX))
+        for room in np.unique(base[rooms]).tolist():
+            paths.room_cells[room] = rooms[base[rooms] == room].tolist()
+        return paths
+
+    def neighbors(self, cell: int) -> List[int]:
+        """Cases praticables adjacentes (4-connexité)."""
+        cols = self.cols
+        row, col = divmod(cell, cols)
+        result = []
+        if row > 0 and self.walkable[cell - cols]:
+            result.append(cell - cols)
+        if row < self.rows - 1 and self.walkable[cell + cols]:
+            result.append(cell + cols)
+        if col > 0 and self.walkable[cell - 1]:
+            result.append(cell - 1)
+        if col < cols - 1 and self.walkable[cell + 1]:
+            result.append(cell + 1)
+        return result
+
+    def field(self, room: int) -> Optional[array]:
+        """Distance de chaque case à la pièce `room` (calculée une fois)."""
+        distances = self._fields.get(room)
+        if distances is not None:
+            return distances
+        sources = self.room_cells.get(room)
+        if not sources:
+            return None
+
+        distances = array("i", [UNREACHABLE]) * (self.rows * self.cols)
+        queue = deque(sources)
+        for cell in sources:
+            distances[cell] = 0
+        while queue:
+            cell = queue.popleft()
+            next_distance = distances[cell] + 1
+            for neighbor in self.neighbors(cell):
+                if distances[neighbor] == UNREACHABLE:
+                    distances[neighbor] = next_distance
+                    queue.append(neighbor)
+        self._fields[room] = distances
+        return distances
+
+    def step(self, cell: int, room: int, rng) -> int:
+        """
+        Case suivante vers `room` (la case elle-même si elle est dans la
+        pièce ou si la pièce est inaccessible).
+        """
+        distances = self.field(room)
+        if distances is None:
+            return cell
+        distance = distances[cell]
+        if distance <= 0:
+            return cell
+        closer = [n for n in self.neighbors(cell) if distances[n] == distance - 1]
+        return rng.choice(closer) if closer else cell
+
+    def reachable(self, cell: int, room: int) -> bool:
+        distances = self.field(room)
+        return distances is not None and distances[cell] != UNREACHABLE
+
+
+# house_id -> champs de la dernière version de grille vue
+_paths: Dict[int, GridPaths] = {}
+
+
+def get_grid_paths(house) -> GridPaths:
+    """Champs de la grille de `house`, recalculés si grid_version a changé."""
+    paths = _paths.get(house.id)
+    if paths is None or paths.version != house.grid_version:
+        paths = GridPaths.build(house.grid, house.grid_version)
+        _paths[house.id] = paths
+    return paths
+
+
+def cached_grid_paths(house_id: int, version) -> Optional[GridPaths]:
+    """Champs en cache s'ils correspondent à `version` (sinon None)."""
+    paths = _paths.get(house_id)
+    if paths is not None and paths.version == version:
+        return paths
+    return None
+
+
+def invalidate_grid_paths(house_id: int):
+    """Oublier les champs d'une maison (grille modifiée ou maison supprimée)."""
+    _paths.pop(house_id, None)
@@ -0,0 +1,189 @@
+"""
+Tuiles de la grille pour les très grands plans.
+
+La grille est découpée en tuiles carrées de TILE_SIZE cases. Au niveau z,
+une tuile couvre TILE_SIZE * 2**z cases de côté, sous-échantillonnées (une
+case sur 2**z, couche de base seule): z=0 est la pleine résolution.
+Chaque tuile est encodée comme la grille compacte (CompactGrid.to_rle) et
+porte une empreinte de son contenu: une tuile que la modification de la
+grille ne touche pas garde la même empreinte, donc le même ETag.
+
+Les tuiles sont construites à partir de house.grid, une fois par
+grid_version (lecture et conversion hors de l'IOLoop), puis encodées à la
+demande.
+"""
+
+import asyncio
+import hashlib
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import tornado.ioloop
+from sqlalchemy import select
+
+from ..models import House
+from .grid_layers import CompactGrid, as_compact_grid
+
+TILE_SIZE = 64
+MAX_ZOOM = 6
+
+Viewport = Tuple[int, int, int, int]  # row0, col0, row1, col1 (exclus)
+
+
+class GridTiles:
+    """Tuiles d'une version de grille, encodées à la première demande."""
+
+    __slots__ = ("version", "grid", "_tiles")
+
+    def __init__(self, grid: CompactGrid, version):
+        self.version = version
+        self.grid = grid
+        self._tiles: Dict[Tuple[int, int, int], dict] = {}
+
+    @property
+    def rows(self) -> int:
+        return self.grid.rows
+
+    @property
+    def cols(self) -> int:
+        return self.grid.cols
+
+    def count(self, z: int = 0) -> Tuple[int, int]:
+        """Nombre de tuiles (en x, en y) au niveau z."""
+        span = TILE_SIZE << z
+        return -(-self.cols // span), -(-self.rows // span)
+
+    def tile(self, x: int, y: int, z: int = 0) -> Optional[dict]:
+        """Tuile (x, y) du niveau z, ou None si elle sort de la grille."""
+        tiles_x, tiles_y = self.count(z)
+        if not (0 <= x < tiles_x and 0 <= y < tiles_y and 0 <= z <= MAX_ZOOM):
+            return None
+        key = (z, x, y)
+        tile = self._tiles.get(key)
+        if tile is None:
+            tile = self._tiles[key] = self._build(x, y, z)
+        return tile
+
+    def _build(self, x: int, y: int, z: int) -> dict:
+        span = TILE_SIZE << z
+        step = 1 << z
+        row0, col0 = y * span, x * span
+        row1, col1 = row0 + span, col0 + span
+
+        base = self.grid.base[row0:row1:step, col0:col1:step]
+        sensors, equipments = {}, {}
+        if z == 0:
+            # Couches creuses: seulement à pleine résolution
+            for overlay, target in (
+                (self.grid.sensors, sensors),
+                (self.grid.equipments, equipments),
+            ):
+                for (row, col), ids in overlay.items():
+                    if row0 <= row < row1 and col0 <= col < col1:
+                        target[(row - row0, col - col0)] = ids
+
+        grid = CompactGrid(base, sensors, equipments).to_rle()
+        digest = hashlib.sha1(
+            json.dumps(grid, separators=(",", ":")).encode()
+        ).hexdigest()[:20]
+        return {
+            "x": x,
+            "y": y,
+            "z": z,
+            "row": row0,
+            "col": col0,
+            "step": step,
+            "hash": digest,
+            "grid": grid,
+        }
+
+
+def tile_of(row: int, col: int) -> Tuple[int, int]:
+    """Tuile (x, y) de niveau 0 qui contient la case (row, col)."""
+    return col // TILE_SIZE, row // TILE_SIZE
+
+
+def tiles_in_viewport(viewport: Viewport) -> List[Tuple[int, int]]:
+    """Tuiles (x, y) de niveau 0 qui recoupent la zone (row0, col0, row1, col1)."""
+    row0, col0, row1, col1 = viewport
+    if row1 <= row0 or col1 <= col0:
+        return []
+    return [
+        (x, y)
+        for y in range(row0 // TILE_SIZE, (row1 - 1) // TILE_SIZE + 1)
+        for x in range(col0 // TILE_SIZE, (col1 - 1) // TILE_SIZE + 1)
+    ]
+
+
+def changes_by_tile(changes: Iterable[dict], viewport: Viewport) -> List[dict]:
+    """
+    Cases modifiées (row, col, ...) qui tombent dans la zone, regroupées
+    par tuile de niveau 0.
+    """
+    row0, col0, row1, col1 = viewport
+    tiles: Dict[Tuple[int, int], List[dict]] = {}
+    for change in changes:
+        row, col = change["row"], change["col"]
+        if row0 <= row < row1 and col0 <= col < col1:
+            tiles.setdefault(tile_of(row, col), []).append(change)
+    return [{"x": x, "y": y, "changes": cells} for (x, y), cells in tiles.items()]
+
+
+# house_id -> tuiles de la dernière version vue
+_tiles: Dict[int, GridTiles] = {}
+# (house_id, version) -> construction en cours (une seule par version)
+_building: Dict[Tuple[int, int], asyncio.Future] = {}
+
+
+def cached_grid_tiles(house_id: int, version) -> Optional[GridTiles]:
+    """Tuiles en cache si elles correspondent à `version` (sinon None)."""
+    tiles = _tiles.get(house_id)
+    if tiles is not None and tiles.version == version:
+        return tiles
+    return None
+
+
+async def load_grid_tiles(session, house_id: int, version) -> GridTiles:
+    """
+    Tuiles de la maison à `version`, construites depuis house.grid si besoin.
+
+    Raises:
+        ValueError: grille vide ou invalide
+    """
+    tiles = cached_grid_tiles(house_id, version)
+    if tiles is not None:
+        return tiles
+
+    key = (house_id, version)
+    pending = _building.get(key)
+    if pending is not None:
+        return await pending
+
+    future = asyncio.get_running_loop().create_future()
+    _building[key] = future
+    try:
+        # DATABASE QUERY: grille complète, une fois par version
+        result = await session.execute(
+            select(House.grid, House.grid_version).where(House.id == house_id)
+        )
+        grid, current = result.one()
+        compact = await tornado.ioloop.IOLoop.current().run_in_executor(
+            None, as_compact_grid, grid
+        )
+        # Version réellement lue (la grille a pu changer entre-temps)
+        tiles = GridTiles(compact, current)
+        _tiles[house_id] = tiles
+        future.set_result(tiles)
+        return tiles
+    except Exception as e:
+        future.set_exception(e)
+        # Déjà signalée à l'appelant: ne pas la rapporter comme non récupérée
+        future.exception()
+        raise
+    finally:
+        del _building[key]
+
+
+def invalidate_grid_tiles(house_id: int):
+    """Oublier les tuiles d'une maison (maison supprimée)."""
+    _tiles.pop(house_id, None)
@@ -0,0 +1,50 @@
+"""
+Pagination par curseur (keyset) des endpoints de liste.
+
+Les lignes sont triées par id; une page lit `limit + 1` lignes après le
+dernier id de la page précédente (WHERE id > :after ORDER BY id LIMIT), ce
+qui coûte le même prix quelle que soit la page. Le curseur transmis au
+client est opaque (base64 du dernier id).
+"""
+
+import base64
+import json
+from typing import List, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(last_id: int) -> str:
+    payload = json.dumps({"after": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Raises:
+        ValueError: curseur illisible
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        after = json.loads(base64.urlsafe_b64decode(padded))["after"]
+    except (TypeError, KeyError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(after, int):
+        raise ValueError("Invalid cursor")
+    return after
+
+
+def paginate(statement, id_column, after: Optional[int], limit: int):
+    """Restreindre `statement` à la page qui suit `after` (une ligne de plus)."""
+    if after is not None:
+        statement = statement.where(id_column > after)
+    return statement.order_by(id_column).limit(limit + 1)
+
+
+def page_items(items: List[dict], limit: int) -> Tuple[List[dict], Optional[str]]:
+    """Page à renvoyer et curseur de la suivante (None sur la dernière page)."""
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor(items[-1]["id"])
@@ -21,12 +21,12 @@ async def get_user_house_permission(session, user_id, house_id):
     Returns:
         PermissionLevel: Le niveau de permission le plus élevé
     """
-    # Vérifier si propriétaire
-    house = await session.get(House, house_id)
-    if not house:
+    # Vérifier si propriétaire (sans charger la grille)
+    owner_id = await session.scalar(select(House.user_id).where(House.id == house_id))
+    if owner_id is None:
         return PermissionLevel.NONE
 
-    if house.user_id == user_id:
+    if owner_id == user_id:
         return PermissionLevel.OWNER
 
     # Vérifier le statut de membre
@@ -117,11 +117,11 @@ async def get_user_role_in_house(session, user_id, house_id):
     Returns:
         str: 'proprietaire', 'administrateur', 'occupant', ou None
     """
-    house = await session.get(House, house_id)
-    if not house:
+    owner_id = await session.scalar(select(House.user_id).where(House.id == house_id))
+    if owner_id is None:
         return None
 
-    if house.user_id == user_id:
+    if owner_id == user_id:
         return "proprietaire"
 
     query = select(HouseMember).where(
@@ -0,0 +1,93 @@
+"""
+Projections de colonnes pour les endpoints de liste (?fields=).
+
+Chaque liste décrit ses champs de réponse: les colonnes SQL à lire (et les
+jointures qu'elles demandent) et la construction de la valeur JSON. Pour
+une sélection de champs, seules leurs colonnes sont lues (SELECT a, b ...,
+sans instancier d'objets ORM) et seuls ces champs sont sérialisés.
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+
+
+def isoformat(value):
+    """Date ISO 8601 (ou None)."""
+    return value.isoformat() if value else None
+
+
+def no_value():
+    """Champ sans colonne, rempli après coup par l'endpoint."""
+    return None
+
+
+class Field:
+    """Champ de réponse: colonnes lues, jointures et valeur JSON."""
+
+    __slots__ = ("columns", "build", "joins")
+
+    def __init__(self, *columns, build: Optional[Callable] = None, joins=()):
+        self.columns = columns
+        # Valeur à partir des colonnes lues (défaut: la colonne unique)
+        self.build = build
+        # (cible, condition) des jointures externes nécessaires
+        self.joins = joins
+
+
+class ProjectedQuery:
+    """SELECT d'une sélection de champs et sérialisation de ses lignes."""
+
+    __slots__ = ("statement", "names", "_fields", "_positions")
+
+    def __init__(self, statement, names, fields, positions):
+        self.statement = statement
+        self.names = names
+        self._fields = fields
+        self._positions = positions
+
+    def to_json(self, rows: Iterable[tuple]) -> List[dict]:
+        items = []
+        for row in rows:
+            item = {}
+            for name in self.names:
+                values = [row[i] for i in self._positions[name]]
+                build = self._fields[name].build
+                item[name] = build(*values) if build else values[0]
+            items.append(item)
+        return items
+
+
+class Projection:
+    """Champs disponibles d'une liste (dans l'ordre de la réponse complète)."""
+
+    def __init__(self, entity, fields: Dict[str, Field], default=None):
+        self.entity = entity
+        self.fields = fields
+        self.names: Tuple[str, ...] = tuple(fields)
+        self.default: Tuple[str, ...] = tuple(default or self.names)
+
+    def query(self, names) -> ProjectedQuery:
+        """SELECT des seules colonnes des champs `names` (jointures externes)."""
+        columns = []
+        index: Dict[int, int] = {}
+        positions: Dict[str, List[int]] = {}
+        joins = []
+        for name in names:
+            field = self.fields[name]
+            slots = []
+            for column in field.columns:
+                # Une colonne partagée par plusieurs champs n'est lue qu'une fois
+                if id(column) not in index:
+                    index[id(column)] = len(columns)
+                    columns.append(column)
+                slots.append(index[id(column)])
+            positions[name] = slots
+            for target, onclause in field.joins:
+                if not any(target is joined for joined, _ in joins):
+                    joins.append((target, onclause))
+
+        statement = select(*columns).select_from(self.entity)
+        for target, onclause in joins:
+            statement = statement.outerjoin(target, onclause)
+        return ProjectedQuery(statement, tuple(names), self.fields, positions)
@@ -0,0 +1,26 @@
+/**
+ * Utilitaires d'appel de l'API REST partagés par les pages
+ * (page maison, éditeur d'intérieur)
+ */
+
+/**
+ * Charge toutes les pages d'une liste paginée par curseur (next_cursor)
+ * et retourne les éléments concaténés de data[key].
+ */
+async function fetchAllPages(url, key) {
+    const items = [];
+    let cursor = null;
+    do {
+        const sep = url.includes('?') ? '&' : '?';
+        const response = await fetch(
+            cursor ? `${url}${sep}cursor=${encodeURIComponent(cursor)}` : url
+        );
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}: ${await response.text()}`);
+        }
+        const data = await response.json();
+        items.push(...(data[key] || []));
+        cursor = data.next_cursor;
+    } while (cursor);
+    return items;
+}
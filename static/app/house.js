@@ -20,6 +20,7 @@ window.sensors = sensors;
 let movementMode = false;
 let userPositions = new Map(); // Map<user_id, {x, y, username}>
 let myPosition = null;
+let myUserId = null; // Connu après la première position (POST)
 
 // ==================== GRID LAYERS UTILITIES ====================
 function isLegacyGrid(grid) {
@@ -38,6 +39,37 @@ function getCellEquipments(cell) {
     return typeof cell === 'number' ? [] : (cell.equipments || []);
 }
 
+// Format de transport demandé au serveur (API et WebSocket)
+const GRID_FORMAT = 'rle';
+
+/**
+ * Décode une grille reçue au format compact (encoding: 'rle') en grille
+ * en couches. Une grille déjà en couches (ou legacy) est retournée telle quelle.
+ *   base: une liste par ligne [valeur, longueur, valeur, longueur, ...]
+ *   sensors / equipments: [[row, col, [ids]], ...]
+ */
+function decodeGrid(grid) {
+    if (!grid || grid.encoding !== 'rle') {
+        return grid;
+    }
+    const decoded = grid.base.map(runs => {
+        const row = [];
+        for (let i = 0; i < runs.length; i += 2) {
+            for (let n = 0; n < runs[i + 1]; n++) {
+                row.push({ base: runs[i], sensors: [], equipments: [] });
+            }
+        }
+        return row;
+    });
+    grid.sensors.forEach(([row, col, ids]) => {
+        decoded[row][col].sensors = ids;
+    });
+    grid.equipments.forEach(([row, col, ids]) => {
+        decoded[row][col].equipments = ids;
+    });
+    return decoded;
+}
+
 // Initialisation
 async function init() {
     const params = new URLSearchParams(window.location.search);
@@ -77,18 +109,17 @@ async function init() {
         loadWeatherFromCache(houseId);
     }
     
-    await loadHouse();
-    await loadSensors(); // Charger les capteurs AVANT la météo
-    await loadEquipments();
-    await loadAutomationRules();
-    await loadUserPositions(); // Always load positions to see other users
-    await loadAccessRequestsCount(); // Charger le nombre de demandes d'accès
+    // Maison, capteurs, équipements, règles, positions et météo en une requête
+    const snapshot = await loadSnapshot();
+    if (!snapshot) {
+        return;
+    }
     
     // Rafraîchir le plan après le chargement des pièces
     displayHouseGrid();
     
-    // Charger la météo APRÈS les capteurs pour pouvoir synchroniser
-    if (typeof loadWeather === 'function') {
+    // Météo absente du snapshot (délai dépassé): la charger APRÈS les capteurs
+    if (!snapshot.weather && typeof loadWeather === 'function') {
         await loadWeather(houseId);
     }
     
@@ -116,25 +147,106 @@ function checkGridEditorReturn() {
     }
 }
 
+// ETag du dernier snapshot chargé (grid_version + dernier événement),
+// pour le rattrapage à la reconnexion WebSocket
+let snapshotEtag = null;
+
+/**
+ * Charge l'état complet de la page (GET /api/houses/{id}/snapshot) et
+ * l'affiche. Retourne le snapshot, ou null si la maison est inaccessible.
+ */
+async function loadSnapshot() {
+    try {
+        const response = await fetch(
+            `/api/houses/${houseId}/snapshot?grid_format=${GRID_FORMAT}`
+        );
+        if (!response.ok) {
+            alert('Maison introuvable');
+            goBack();
+            return null;
+        }
+        snapshotEtag = response.headers.get('Etag');
+        const snapshot = await response.json();
+        applySnapshot(snapshot);
+        return snapshot;
+    } catch (error) {
+        alert('Erreur de chargement');
+        goBack();
+        return null;
+    }
+}
+
+// Afficher un snapshot chargé
+function applySnapshot(snapshot) {
+    applyHouse(snapshot.house);
+    sensors = snapshot.sensors;
+    // Mettre à jour la référence globale pour weather.js
+    window.sensors = sensors;
+    displaySensors();
+    equipments = snapshot.equipments;
+    displayEquipments();
+    automationRules = snapshot.rules;
+    displayAutomationRules();
+    updateRuleSelects();
+    applyUserPositions(snapshot.positions);
+    showAccessRequestsCount(snapshot.access_requests_count || 0);
+    // Météo APRÈS les capteurs pour pouvoir synchroniser
+    if (snapshot.weather && typeof applyWeather === 'function') {
+        applyWeather(houseId, snapshot.weather);
+    }
+}
+
+/**
+ * Après une (re)connexion WebSocket: si la grille ou l'historique ont
+ * changé depuis le snapshot (messages manqués), l'état complet revient
+ * dans la même requête; sinon le serveur répond 304.
+ */
+async function catchUpSnapshot() {
+    if (!snapshotEtag) {
+        return;
+    }
+    try {
+        const response = await fetch(
+            `/api/houses/${houseId}/snapshot?grid_format=${GRID_FORMAT}`,
+            // Pas de cache navigateur: le 304 doit arriver jusqu'ici
+            { headers: { 'If-None-Match': snapshotEtag }, cache: 'no-store' }
+        );
+        if (response.status !== 200) {
+            return;
+        }
+        snapshotEtag = response.headers.get('Etag');
+        applySnapshot(await response.json());
+        displayHouseGrid();
+    } catch (error) {
+        console.error('Erreur de rattrapage du snapshot', error);
+    }
+}
+
+// Afficher les détails de la maison
+function applyHouse(data) {
+    house = data;
+    house.grid = decodeGrid(house.grid);
+    userRole = house.user_role;
+    document.getElementById('house-name').textContent = house.name;
+    document.getElementById('house-title').textContent = house.name;
+    document.getElementById('house-info').textContent = 
+        `${house.address || 'Pas d\'adresse'} | ${house.length * house.width} m²`;
+    
+    // Charger les pièces
+    if (house.rooms) {
+        rooms = house.rooms;
+    }
+    
+    // Masquer les éléments selon les permissions
+    applyPermissions();
+}
+
 // Charger les détails de la maison
 async function loadHouse() {
     try {
-        const response = await fetch(`/api/houses/${houseId}`);
+        const response = await fetch(`/api/houses/${houseId}?grid_format=${GRID_FORMAT}`);
         if (response.ok) {
-            house = await response.json();
-            userRole = house.user_role;
-            document.getElementById('house-name').textContent = house.name;
-            document.getElementById('house-title').textContent = house.name;
-            document.getElementById('house-info').textContent = 
-                `${house.address || 'Pas d\'adresse'} | ${house.length * house.width} m²`;
-            
-            // Charger les pièces
-            if (house.rooms) {
-                rooms = house.rooms;
-            }
-            
-            // Masquer les éléments selon les permissions
-            applyPermissions();
+            applyHouse(await response.json());
         } else {
             alert('Maison introuvable');
             goBack();
@@ -444,17 +556,11 @@ function getEquipmentIcon(type) {
 // Charger les capteurs
 async function loadSensors() {
     try {
-        const response = await fetch('/api/sensors');
-        if (response.ok) {
-            const data = await response.json();
-            // Filtrer par house_id et trier par ID pour maintenir un ordre stable
-            sensors = data.sensors
-                .filter(s => s.house_id === parseInt(houseId))
-                .sort((a, b) => a.id - b.id);
-            // Mettre à jour la référence globale pour weather.js
-            window.sensors = sensors;
-            displaySensors();
-        }
+        // Capteurs de la maison, triés par ID (ordre stable), page par page
+        sensors = await fetchAllPages(`/api/sensors?house_id=${houseId}`, 'sensors');
+        // Mettre à jour la référence globale pour weather.js
+        window.sensors = sensors;
+        displaySensors();
     } catch (error) {
         console.error('Erreur de chargement des capteurs', error);
     }
@@ -538,15 +644,11 @@ function displaySensors() {
 // Charger les équipements
 async function loadEquipments() {
     try {
-        const response = await fetch('/api/equipments');
-        if (response.ok) {
-            const data = await response.json();
-            // Filtrer par house_id et trier par ID pour maintenir un ordre stable
-            equipments = data.equipments
-                .filter(e => e.house_id === parseInt(houseId))
-                .sort((a, b) => a.id - b.id);
-            displayEquipments();
-        }
+        // Équipements de la maison, triés par ID (ordre stable), page par page
+        equipments = await fetchAllPages(
+            `/api/equipments?house_id=${houseId}`, 'equipments'
+        );
+        displayEquipments();
     } catch (error) {
         console.error('Erreur de chargement des équipements', error);
     }
@@ -1534,14 +1636,12 @@ async function deleteHouse() {
 // Charger les règles d'automatisation
 async function loadAutomationRules() {
     try {
-        const response = await fetch(`/api/automation/rules?house_id=${houseId}`);
-        if (response.ok) {
-            const data = await response.json();
-            // Trier les règles par ID (ordre de création) pour maintenir un ordre stable
-            automationRules = data.rules.sort((a, b) => a.id - b.id);
-            displayAutomationRules();
-            updateRuleSelects();
-        }
+        // Les règles arrivent triées par ID (ordre de création), page par page
+        automationRules = await fetchAllPages(
+            `/api/automation/rules?house_id=${houseId}`, 'rules'
+        );
+        displayAutomationRules();
+        updateRuleSelects();
     } catch (error) {
         console.error('Erreur de chargement des règles', error);
     }
@@ -2020,27 +2120,32 @@ async function stopSimulation() {
     }
 }
 
-async function loadUserPositions() {
-    try {
-        const response = await fetch(`/api/houses/${houseId}/positions`);
-        if (response.ok) {
-            const data = await response.json();
-            userPositions.clear();
-            data.positions.forEach(pos => {
-                userPositions.set(pos.user_id, {
-                    x: pos.x,
-                    y: pos.y,
-                    username: pos.username,
-                    profile_image: pos.profile_image
-                });
-            });
-        }
-    } catch (error) {
-        console.error('Erreur chargement positions:', error);
-    }
+// Positions des utilisateurs (snapshot de la maison)
+function applyUserPositions(positions) {
+    userPositions.clear();
+    positions.forEach(pos => {
+        userPositions.set(pos.user_id, {
+            x: pos.x,
+            y: pos.y,
+            username: pos.username,
+            profile_image: pos.profile_image
+        });
+    });
 }
 
 async function updateMyPosition(x, y) {
+    // Déplacements suivants: envoyés sur le WebSocket, traités par lots côté serveur
+    if (myUserId !== null && typeof sendRealtimeMessage === 'function' &&
+        sendRealtimeMessage({type: 'position', house_id: parseInt(houseId), x, y})) {
+        myPosition = {x, y};
+        const me = userPositions.get(myUserId);
+        if (me) {
+            userPositions.set(myUserId, {...me, x, y});
+        }
+        activatePresenceSensors(x, y);
+        return true;
+    }
+
     try {
         const response = await fetch(`/api/houses/${houseId}/positions`, {
             method: 'POST',
@@ -2051,6 +2156,7 @@ async function updateMyPosition(x, y) {
         if (response.ok) {
             const data = await response.json();
             myPosition = {x, y};
+            myUserId = data.position.user_id;
             
             // Update local positions map
             userPositions.set(data.position.user_id, {
@@ -2073,6 +2179,13 @@ async function updateMyPosition(x, y) {
 }
 
 async function deactivateMyPosition() {
+    // Départ envoyé sur le WebSocket: traité après les déplacements en attente
+    const streamed = myUserId !== null && typeof sendRealtimeMessage === 'function' &&
+        sendRealtimeMessage({type: 'position_leave', house_id: parseInt(houseId)});
+    myUserId = null;
+    if (streamed) {
+        return;
+    }
     try {
         await fetch(`/api/houses/${houseId}/positions`, {
             method: 'DELETE'
@@ -2222,29 +2335,29 @@ function handlePositionUpdate(data) {
     } else if (data.type === 'user_position_deactivated') {
         userPositions.delete(data.user_id);
         displayHouseGrid();
+    } else if (data.type === 'user_positions_batch') {
+        // Toutes les positions d'un tick serveur: un seul rafraîchissement
+        data.data.positions.forEach(pos => {
+            userPositions.set(pos.user_id, {
+                x: pos.x,
+                y: pos.y,
+                username: pos.username,
+                profile_image: pos.profile_image
+            });
+        });
+        data.data.left.forEach(userId => userPositions.delete(userId));
+        displayHouseGrid();
     }
 }
 
 // ==================== ACCESS REQUESTS BADGE ====================
 
-async function loadAccessRequestsCount() {
-    try {
-        const response = await fetch(`/api/houses/${houseId}/access-requests`);
-        if (response.ok) {
-            const data = await response.json();
-            const count = data.requests.length;
-            const badge = document.getElementById('access-requests-badge');
-            
-            if (count > 0 && badge) {
-                badge.textContent = count;
-                badge.style.display = 'inline';
-            }
-        } else if (response.status === 403) {
-            // Pas propriétaire/admin, ne rien afficher
-            return;
-        }
-    } catch (error) {
-        console.error('Erreur lors du chargement des demandes d\'accès:', error);
+function showAccessRequestsCount(count) {
+    const badge = document.getElementById('access-requests-badge');
+    
+    if (count > 0 && badge) {
+        badge.textContent = count;
+        badge.style.display = 'inline';
     }
 }
 
@@ -13,7 +13,8 @@ const RECONNECT_BASE_DELAY = 1000; // 1 seconde
  */
 function connectWebSocket() {
     const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-    const wsUrl = `${protocol}//${window.location.host}/ws/realtime`;
+    // Grilles au format compact (décodées par decodeGrid, house.js)
+    const wsUrl = `${protocol}//${window.location.host}/ws/realtime?grid_format=${GRID_FORMAT}`;
     
     console.log('[WebSocket] Tentative de connexion...', wsUrl);
     
@@ -38,6 +39,11 @@ function handleOpen() {
     reconnectAttempts = 0;
     updateConnectionStatus(true);
     
+    // Messages manqués depuis le snapshot de la page (house.js)
+    if (typeof catchUpSnapshot === 'function') {
+        catchUpSnapshot();
+    }
+    
     // Envoyer un ping toutes les 30 secondes pour maintenir la connexion
     if (ws.pingInterval) {
         clearInterval(ws.pingInterval);
@@ -73,6 +79,10 @@ function handleMessage(event) {
             case 'equipment_update':
                 updateEquipmentInUI(message.data);
                 break;
+            case 'equipment_batch_update':
+                // Plusieurs équipements modifiés par une même évaluation
+                message.data.equipments.forEach(updateEquipmentInUI);
+                break;
             case 'grid_update':
                 // Mise à jour du plan de la maison
                 if (message.house_id && window.currentHouseId && 
@@ -80,6 +90,13 @@ function handleMessage(event) {
                     updateGridInUI(message.data);
                 }
                 break;
+            case 'grid_patch':
+                // Cases modifiées du plan (PATCH)
+                if (message.house_id && window.currentHouseId && 
+                    message.house_id === window.currentHouseId) {
+                    applyGridPatchInUI(message.data);
+                }
+                break;
             case 'equipment_crud':
                 // Ajout/modification/suppression d'équipement
                 if (message.house_id && window.currentHouseId && 
@@ -110,6 +127,7 @@ function handleMessage(event) {
                 break;
             case 'user_position_changed':
             case 'user_position_deactivated':
+            case 'user_positions_batch':
                 // Filtrer par house_id pour les positions
                 if (message.house_id && window.currentHouseId && 
                     message.house_id !== window.currentHouseId) {
@@ -352,7 +370,10 @@ function updateGridInUI(data) {
     
     // Mettre à jour l'objet house global avec la nouvelle grille
     if (typeof house !== 'undefined' && house) {
-        house.grid = data.grid;
+        house.grid = decodeGrid(data.grid);
+        if (data.grid_version !== undefined && data.grid_version !== null) {
+            house.grid_version = data.grid_version;
+        }
         console.log('[WebSocket] Grille mise à jour dans l\'objet house');
         
         // Rafraîchir l'affichage du plan
@@ -366,6 +387,40 @@ function updateGridInUI(data) {
     }
 }
 
+/**
+ * Applique les cases modifiées d'un PATCH de la grille. Si une version a
+ * été manquée, la maison est rechargée en entier.
+ */
+async function applyGridPatchInUI(data) {
+    if (typeof house === 'undefined' || !house || !house.grid) {
+        return;
+    }
+    if (house.grid_version !== data.grid_version - 1) {
+        const response = await fetch(`/api/houses/${house.id}?grid_format=${GRID_FORMAT}`);
+        if (response.ok) {
+            const fresh = await response.json();
+            updateGridInUI({ grid: fresh.grid, grid_version: fresh.grid_version });
+        }
+        return;
+    }
+    data.changes.forEach(change => {
+        let cell = house.grid[change.row][change.col];
+        if (typeof cell === 'number') {
+            cell = { base: cell, sensors: [], equipments: [] };
+            house.grid[change.row][change.col] = cell;
+        }
+        ['base', 'sensors', 'equipments'].forEach(field => {
+            if (change[field] !== undefined) {
+                cell[field] = change[field];
+            }
+        });
+    });
+    house.grid_version = data.grid_version;
+    if (typeof displayHouseGrid === 'function') {
+        displayHouseGrid();
+    }
+}
+
 /**
  * Affiche une notification discrète de mise à jour du plan
  */
@@ -552,6 +607,18 @@ function showNotification(message, color) {
     }, 3000);
 }
 
+/**
+ * Envoie un message au serveur si la connexion est ouverte
+ * @returns {boolean} true si le message a été envoyé
+ */
+function sendRealtimeMessage(message) {
+    if (ws && ws.readyState === WebSocket.OPEN) {
+        ws.send(JSON.stringify(message));
+        return true;
+    }
+    return false;
+}
+
 /**
  * Ferme proprement la connexion WebSocket
  */
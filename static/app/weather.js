@@ -61,6 +61,19 @@ async function initWeather(houseId) {
     }, 10 * 60 * 1000); // 10 minutes
 }
 
+/**
+ * Afficher des données météo reçues (API météo ou snapshot de la maison)
+ */
+function applyWeather(houseId, data) {
+    weatherData = data;
+    // Sauvegarder dans le cache
+    saveWeatherToCache(houseId, weatherData);
+    displayWeather();
+    // Synchroniser automatiquement avec les capteurs
+    syncWeatherToSensorsAuto();
+    return weatherData;
+}
+
 /**
  * Charger les données météo
  */
@@ -68,13 +81,7 @@ async function loadWeather(houseId) {
     try {
         const response = await fetch(`/api/weather/${houseId}`);
         if (response.ok) {
-            weatherData = await response.json();
-            // Sauvegarder dans le cache
-            saveWeatherToCache(houseId, weatherData);
-            displayWeather();
-            // Synchroniser automatiquement avec les capteurs
-            syncWeatherToSensorsAuto();
-            return weatherData;
+            return applyWeather(houseId, await response.json());
         } else {
             console.warn('Could not load weather data');
             hideWeatherWidget();